@@ -1,10 +1,19 @@
 from django.test import TestCase
+from django.core.cache import cache
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
+
+from housechores.testing import QueryBudgetMixin
+from tasks.models import Task
 
 
 # Create your tests here.
 class UserAccountTests(TestCase):
+    def setUp(self):
+        # rendered boards outlive the rolled back test database
+        cache.clear()
+
     def test_user_login(self):
         """
         User can log in and username is shown.
@@ -37,3 +46,48 @@ class UserAccountTests(TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'You need to be logged in.')
+
+
+# every view in accounts.views gets a query budget
+class AccountsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+    def add_tasks(self, count):
+        now = timezone.now()
+        Task.objects.bulk_create(Task(caption='task', pub_date=now, due_date=now, task_giver=self.user)
+                                 for i in range(count))
+
+    def test_login(self):
+        """
+        Login form is shown and posted within its query budget.
+        """
+        login = lambda: self.client.post(reverse('accounts:login'),
+                                         {'username': 'testuser', 'password': '12345'})
+        with self.assertQueryBudget(0):
+            self.client.get(reverse('accounts:login'))
+        with self.assertQueryBudget(5):
+            login()
+        self.assertConstantQueries(login, lambda: self.add_tasks(30))
+
+    def test_logout(self):
+        """
+        User is logged out within the query budget.
+        """
+        self.client.force_login(self.user)
+        with self.assertQueryBudget(4):
+            self.client.get(reverse('accounts:logout'))
+
+    def test_signup(self):
+        """
+        Signup form is shown and posted within its query budget.
+        """
+        usernames = iter(['first', 'second', 'third'])
+        signup = lambda: self.client.post(reverse('accounts:signup'), {
+            'username': next(usernames), 'password1': 'a-long-password', 'password2': 'a-long-password'})
+        with self.assertQueryBudget(0):
+            self.client.get(reverse('accounts:signup'))
+        with self.assertQueryBudget(3):
+            signup()
+        self.assertConstantQueries(signup, lambda: self.add_tasks(30))
@@ -0,0 +1,25 @@
+"""
+ASGI config for housechores project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Requests served through it use the async task views (housechores.async_urls),
+the task event stream is served on the event loop, and streaming responses
+such as the export are read in a worker thread.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'housechores.settings')
+os.environ.setdefault('HOUSECHORES_ASYNC_VIEWS', '1')
+
+# what get_asgi_application() does, with the handler streaming off the loop
+django.setup(set_prefix=False)
+
+from tasks.async_views import EventStreamMiddleware, StreamingASGIHandler  # noqa: E402, needs the app registry
+
+application = EventStreamMiddleware(StreamingASGIHandler())
@@ -0,0 +1,17 @@
+"""housechores URL Configuration for ASGI
+
+Same as housechores.urls, with the tasks app served by its async views.
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.urls import path, re_path, include
+
+from . import metrics, staticfiles
+
+urlpatterns = [
+    path('tasks/', include('tasks.async_urls')),
+    path('tasks/accounts/', include('accounts.urls')),
+    path('admin/', admin.site.urls),
+    path('metrics', metrics.metrics, name='metrics'),
+    re_path(r'^{}(?P<path>.+)$'.format(settings.STATIC_URL.lstrip('/')), staticfiles.serve),
+]
@@ -0,0 +1,129 @@
+"""
+Compress responses with brotli or gzip, whichever the browser accepts.
+
+Responses smaller than COMPRESSION_MIN_SIZE bytes are left alone, they
+would barely shrink. Streaming responses are compressed chunk by chunk, and
+every chunk is flushed so it reaches the browser as soon as it is produced;
+event streams are not compressed at all, proxies hold compressed data back
+until they have enough of it. CSRF tokens are masked with a new salt on every
+response, so compressing pages that include one doesn't leak it (BREACH).
+"""
+import asyncio
+import gzip
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# dynamic responses are compressed on every request, trade some size for speed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSED_TYPES = ('text/', 'application/json', 'application/x-ndjson',
+                    'application/javascript', 'application/xml', 'image/svg+xml')
+NOT_COMPRESSED_TYPES = ('text/event-stream',)
+
+
+def accepted_encodings(request):
+    """
+    Return the set of content codings in the request's Accept-Encoding header.
+    """
+    accepted = set()
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = [part.strip() for part in coding.split(';')]
+        if coding and 'q=0' not in params and 'q=0.0' not in params:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def choose_encoding(request):
+    accepted = accepted_encodings(request)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_sequence(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        # wbits 31: zlib stream with gzip header and trailer
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compress text responses of at least COMPRESSION_MIN_SIZE bytes, see the module docstring.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # ASGI then awaits this middleware rather than run it in a thread
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if response.has_header('Content-Encoding') or \
+                not content_type.startswith(COMPRESSED_TYPES) or content_type in NOT_COMPRESSED_TYPES:
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        # caches must keep the compressed and the plain response apart
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(response.streaming_content, encoding)
+            # the length of the compressed stream is not known up front
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # the bytes differ from the plain response, but the content is the same
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
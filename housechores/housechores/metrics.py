@@ -0,0 +1,184 @@
+"""
+Request, database and cache metrics in the Prometheus text format.
+
+Every thread records into a shard of its own, so recording takes no lock;
+the shards are only summed up when /metrics is scraped. Cache hit ratios
+are left to PromQL, e.g.
+    rate(housechores_cache_requests_total{result="hit"}[5m])
+      / ignoring(result) sum without(result) (rate(housechores_cache_requests_total[5m]))
+"""
+import asyncio
+import bisect
+import hmac
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from housechores import queries
+
+# upper bounds of the request duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTERS = {
+    'housechores_responses_total': 'Responses sent, by URL name and status code.',
+    'housechores_db_queries_total': 'SQL queries run while handling requests, by URL name.',
+    'housechores_db_query_seconds_total': 'Time spent in SQL queries, by URL name.',
+    'housechores_cache_requests_total': 'Cache lookups, by cache and result.',
+}
+DURATION = 'housechores_request_duration_seconds'
+DURATION_HELP = 'Time spent handling requests, by URL name.'
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+
+
+class Shard:
+    # metrics recorded by one thread, only ever written by that thread
+    def __init__(self):
+        # (name, labels) -> value
+        self.counters = {}
+        # view -> [count per bucket..., count over the last bucket, sum]
+        self.durations = {}
+
+    def add(self, name, labels, value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, view, seconds):
+        histogram = self.durations.get(view)
+        if histogram is None:
+            histogram = self.durations[view] = [0] * (len(BUCKETS) + 2)
+        histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+
+def get_shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        # the only lock taken, once per thread
+        shard = _local.shard = Shard()
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def count_cache(cache, result):
+    get_shard().add('housechores_cache_requests_total', (('cache', cache), ('result', result)))
+
+
+def collect():
+    """
+    Return (counters, durations) summed over every thread's shard.
+    """
+    with _shards_lock:
+        shards = list(_shards)
+    counters, durations = {}, {}
+    for shard in shards:
+        # dict copies are atomic, the owning thread may keep recording meanwhile
+        for key, value in shard.counters.copy().items():
+            counters[key] = counters.get(key, 0) + value
+        for view, histogram in shard.durations.copy().items():
+            total = durations.setdefault(view, [0] * (len(BUCKETS) + 2))
+            for i, value in enumerate(list(histogram)):
+                total[i] += value
+    return counters, durations
+
+
+def _format_labels(labels):
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')) for name, value in labels) + '}'
+
+
+def render():
+    counters, durations = collect()
+    lines = []
+    for name, help in COUNTERS.items():
+        lines += ['# HELP {} {}'.format(name, help), '# TYPE {} counter'.format(name)]
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append('{}{} {}'.format(name, _format_labels(labels), value))
+
+    lines += ['# HELP {} {}'.format(DURATION, DURATION_HELP), '# TYPE {} histogram'.format(DURATION)]
+    for view, histogram in sorted(durations.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), histogram):
+            cumulative += count
+            lines.append('{}_bucket{} {}'.format(
+                DURATION, _format_labels((('view', view), ('le', bound))), cumulative))
+        lines.append('{}_sum{} {}'.format(DURATION, _format_labels((('view', view),)), histogram[-1]))
+        lines.append('{}_count{} {}'.format(DURATION, _format_labels((('view', view),)), cumulative))
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status codes and SQL queries of every request by URL name.
+
+    Streaming responses are timed until the response starts, not until the
+    last chunk was sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # ASGI then awaits this middleware rather than run it in a thread
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        counts = [0, 0.0]
+        started = time.perf_counter()
+        with queries.execute_wrapper(self.counter(counts)):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, counts)
+        return response
+
+    async def __acall__(self, request):
+        counts = [0, 0.0]
+        started = time.perf_counter()
+        # also counts the queries of the worker threads the ORM runs in
+        with queries.execute_wrapper(self.counter(counts)):
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, counts)
+        return response
+
+    def counter(self, counts):
+        def count_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                counts[0] += 1
+                counts[1] += time.perf_counter() - started
+        return count_query
+
+    def record(self, request, response, elapsed, counts):
+        shard = get_shard()
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        shard.observe(view, elapsed)
+        shard.add('housechores_responses_total', (('view', view), ('status', response.status_code)))
+        shard.add('housechores_db_queries_total', (('view', view),), counts[0])
+        shard.add('housechores_db_query_seconds_total', (('view', view),), counts[1])
+
+
+def has_metrics_token(request):
+    # the Prometheus server sends `Authorization: Bearer <METRICS_TOKEN>`,
+    # its address proves nothing behind a proxy
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer' and \
+        hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+
+
+def metrics(request):
+    # for the Prometheus server and staff, not the rest of the world
+    if not has_metrics_token(request) and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,47 @@
+"""
+Template loaders which strip the indentation off HTML templates.
+
+The whitespace is collapsed once, when the template source is loaded; with
+the cached loader in front, rendering costs nothing extra. Every run of
+whitespace containing a line break becomes a single line break, so inline
+scripts with // comments and the spaces between inline elements still work.
+<pre> and <textarea> elements are left as they are, and so are the
+templates of third-party apps.
+"""
+import os
+import re
+
+from django.conf import settings
+from django.template.loaders import app_directories, filesystem
+
+WHITESPACE = re.compile(r'\s*\n\s*')
+VERBATIM = re.compile(r'<(pre|textarea)\b.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+
+
+def minify(source):
+    parts = []
+    end = 0
+    for match in VERBATIM.finditer(source):
+        parts.append(WHITESPACE.sub('\n', source[end:match.start()]))
+        parts.append(match.group())
+        end = match.end()
+    parts.append(WHITESPACE.sub('\n', source[end:]))
+    return ''.join(parts)
+
+
+class MinifyingLoaderMixin:
+    def get_contents(self, origin):
+        contents = super().get_contents(origin)
+        # only our own pages, templates of other apps may be plain text in
+        # an .html file, like Django's password reset email
+        if origin.name.endswith('.html') and origin.name.startswith(settings.BASE_DIR + os.sep):
+            contents = minify(contents)
+        return contents
+
+
+class FilesystemLoader(MinifyingLoaderMixin, filesystem.Loader):
+    pass
+
+
+class AppDirectoriesLoader(MinifyingLoaderMixin, app_directories.Loader):
+    pass
@@ -0,0 +1,162 @@
+"""
+Profile single requests on demand.
+
+Staff add `_profile=1` to the query string, or send an `X-Profile` header,
+and the request is run under cProfile while a sampling thread records its
+stacks. PROFILING_DIR then receives, under one common name:
+    <name>.prof       cProfile stats, for pstats or snakeviz
+    <name>.collapsed  sampled stacks, for flamegraph.pl or speedscope
+    <name>.sql        every SQL statement run, with its duration
+The name is sent back in the X-Profile response header.
+
+Under ASGI the middleware is awaited on the event loop, so cProfile and the
+sampler watch the loop's thread: the request's coroutines, along with
+whatever else the loop runs meanwhile. Its sync code running in a worker
+thread, e.g. the ORM, only shows up in the .sql file.
+"""
+import asyncio
+import collections
+import contextlib
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from housechores import queries
+
+QUERY_FLAG = '_profile'
+HEADER = 'HTTP_X_PROFILE'
+# seconds between two stack samples
+SAMPLE_INTERVAL = 0.001
+
+# one profiled request at a time, the profilers of two would get in each other's way
+_profiling = threading.Lock()
+
+
+class Sampler(threading.Thread):
+    # counts the stacks of another thread, folded the way flamegraph.pl wants them
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append('{}:{}'.format(frame.f_globals.get('__name__', '?'), frame.f_code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class ProfilingMiddleware:
+    """
+    Run requests flagged by staff under the profilers, see the module docstring.
+
+    Not installed at all when PROFILING_DIR is empty; otherwise unflagged
+    requests cost a dictionary lookup.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_DIR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # ASGI then awaits this middleware rather than run it in a thread
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if HEADER not in request.META and QUERY_FLAG not in request.GET:
+            return self.get_response(request)
+        if not request.user.is_staff or not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            with self.profiling() as results:
+                response = self.get_response(request)
+            return self.finish(request, response, *results)
+        finally:
+            _profiling.release()
+
+    async def __acall__(self, request):
+        if HEADER not in request.META and QUERY_FLAG not in request.GET:
+            return await self.get_response(request)
+        # resolving the lazy request.user reads the session and user from the database
+        is_staff = await sync_to_async(lambda: request.user.is_staff, thread_sensitive=True)()
+        if not is_staff or not _profiling.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            with self.profiling() as results:
+                response = await self.get_response(request)
+            return self.finish(request, response, *results)
+        finally:
+            _profiling.release()
+
+    @contextlib.contextmanager
+    def profiling(self):
+        # yields the profile, the sampler and the list of (duration, SQL) the
+        # request's queries are recorded into, in whichever thread they run
+        executed = []
+
+        def record_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                elapsed = time.perf_counter() - started
+                if not many:
+                    sql = context['connection'].ops.last_executed_query(context['cursor'], sql, params)
+                executed.append((elapsed, sql))
+
+        profile = cProfile.Profile()
+        sampler = Sampler(threading.get_ident())
+        with queries.execute_wrapper(record_query):
+            sampler.start()
+            profile.enable()
+            try:
+                yield profile, sampler, executed
+            finally:
+                profile.disable()
+                sampler.stop()
+
+    def finish(self, request, response, profile, sampler, executed):
+        match = request.resolver_match
+        name = '{}-{}-{}'.format(
+            time.strftime('%Y%m%d-%H%M%S'),
+            re.sub(r'[^\w.-]+', '_', match.view_name if match else 'unresolved'),
+            uuid.uuid4().hex[:8])
+        self.save(name, profile, sampler.stacks, executed)
+        response['X-Profile'] = name
+        return response
+
+    def save(self, name, profile, stacks, queries):
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILING_DIR, name)
+        profile.dump_stats(path + '.prof')
+        with open(path + '.collapsed', 'w') as file:
+            for stack, count in stacks.most_common():
+                file.write('{} {}\n'.format(stack, count))
+        with open(path + '.sql', 'w') as file:
+            file.write('-- {} queries, {:.2f} ms\n'.format(
+                len(queries), sum(elapsed for elapsed, sql in queries) * 1000))
+            for elapsed, sql in queries:
+                file.write('\n-- {:.2f} ms\n{};\n'.format(elapsed * 1000, sql))
@@ -0,0 +1,35 @@
+"""
+Wrap the SQL queries run on behalf of the current request, in any thread.
+
+connection.execute_wrapper() only sees the connections of the calling
+thread. Under ASGI the middleware is awaited on the event loop while the
+views' ORM calls run in a worker thread, with connections of its own. So
+middleware registers its wrappers in a context variable instead, which the
+worker threads inherit, and every connection of the housechores.sqlite3
+backend runs the wrappers of the context it is called from.
+"""
+import contextlib
+import contextvars
+import functools
+
+_wrappers = contextvars.ContextVar('query_wrappers', default=())
+
+
+@contextlib.contextmanager
+def execute_wrapper(wrapper):
+    """
+    Like connection.execute_wrapper(), for the queries of every connection
+    used within the current context.
+    """
+    token = _wrappers.set(_wrappers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        _wrappers.reset(token)
+
+
+def run_wrappers(execute, sql, params, many, context):
+    # installed on every connection; the first wrapper registered is outermost
+    for wrapper in reversed(_wrappers.get()):
+        execute = functools.partial(wrapper, execute)
+    return execute(sql, params, many, context)
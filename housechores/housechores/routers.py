@@ -0,0 +1,113 @@
+"""
+Send reads to the read replicas and writes to the primary database.
+
+A browser that wrote something keeps reading from the primary for
+DATABASE_REPLICA_LAG seconds, so it always sees its own writes.
+"""
+import asyncio
+import contextvars
+import math
+import random
+import time
+
+from django.conf import settings
+
+PRIMARY = 'default'
+# seconds since epoch until which a browser reads from the primary
+COOKIE_NAME = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# {'use_primary': bool, 'wrote': bool} of the request being handled
+_request_state = contextvars.ContextVar('request_state', default=None)
+
+
+def get_replicas():
+    return settings.DATABASE_REPLICAS
+
+
+def reads_from_replica():
+    state = _request_state.get()
+    return bool(get_replicas()) and not (state and state['use_primary'])
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reads_from_replica():
+            return random.choice(get_replicas())
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        # objects related to ones in some other database, e.g. while that
+        # database is being migrated, are left to Django's default routing
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (None, PRIMARY, *get_replicas()):
+            return None
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {PRIMARY, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin the reads of writing requests, and of browsers that wrote recently,
+    to the primary database.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # ASGI then awaits this middleware rather than run it in a thread
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not get_replicas():
+            return self.get_response(request)
+
+        token, state = self.pin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.remember(response, state)
+
+    async def __acall__(self, request):
+        if not get_replicas():
+            return await self.get_response(request)
+
+        # the ORM's threads run in a copy of this context, sharing `state`
+        token, state = self.pin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.remember(response, state)
+
+    def pin(self, request):
+        try:
+            primary_until = float(request.COOKIES.get(COOKIE_NAME, 0))
+        except ValueError:
+            primary_until = 0
+        # a write request reads back what it wrote, e.g. complete_many's results
+        state = {'use_primary': request.method not in SAFE_METHODS or time.time() < primary_until,
+                 'wrote': False}
+        return _request_state.set(state), state
+
+    def remember(self, response, state):
+        if state['wrote']:
+            lag = settings.DATABASE_REPLICA_LAG
+            response.set_cookie(COOKIE_NAME, str(time.time() + lag), max_age=math.ceil(lag),
+                                httponly=True, samesite='Lax')
+        return response
@@ -27,6 +27,13 @@ DEBUG = True
 
 ALLOWED_HOSTS = ['localhost']
 
+# bearer token the Prometheus server sends to read /metrics without logging
+# in, empty leaves /metrics to staff
+METRICS_TOKEN = os.environ.get('HOUSECHORES_METRICS_TOKEN', '')
+
+# where requests profiled with ?_profile=1 are saved, empty turns profiling off
+PROFILING_DIR = os.environ.get('HOUSECHORES_PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+
 
 # Application definition
 
@@ -43,23 +50,39 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # outermost, so the time spent in every other middleware is counted
+    'housechores.metrics.MetricsMiddleware',
+    # before anything that reads or changes the response body
+    'housechores.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # before the session middleware, so session writes count as writes
+    'housechores.routers.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # after authentication, only staff may profile requests
+    'housechores.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'housechores.urls'
+# housechores/asgi.py switches to the async task views
+ASYNC_VIEWS = os.environ.get('HOUSECHORES_ASYNC_VIEWS') == '1'
+
+ROOT_URLCONF = 'housechores.async_urls' if ASYNC_VIEWS else 'housechores.urls'
+
+# HTML templates lose their indentation as they are loaded, see housechores/minify.py
+MINIFYING_LOADERS = ['housechores.minify.FilesystemLoader', 'housechores.minify.AppDirectoriesLoader']
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
-        'APP_DIRS': True,
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'OPTIONS': {
+            # cached like Django's own default, templates are reloaded while debugging
+            'loaders': MINIFYING_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', MINIFYING_LOADERS)],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -70,19 +93,82 @@ TEMPLATES = [
     },
 ]
 
+# responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024
+
 WSGI_APPLICATION = 'housechores.wsgi.application'
+ASGI_APPLICATION = 'housechores.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# housechores.sqlite3 applies PRAGMAS to every new connection and starts
+# transactions with BEGIN IMMEDIATE. WAL lets readers carry on while a write
+# is in progress; `manage.py stress_db` compares it with the plain backend.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    # durable at every checkpoint instead of every commit, safe with WAL
+    'synchronous': 'normal',
+    # milliseconds a writer waits for the lock before "database is locked"
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # negative sizes are in KiB
+    'cache_size': -20000,
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'housechores.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'PRAGMAS': SQLITE_PRAGMAS,
+        # keep connections open between requests, pragmas are set once per connection
+        'CONN_MAX_AGE': 600,
+    },
+    # a copy of 'default' kept up to date outside of Django, e.g. by LiteFS;
+    # the tests give it a database of its own and copy rows over by hand
+    'replica': {
+        'ENGINE': 'housechores.sqlite3',
+        'NAME': os.environ.get('HOUSECHORES_REPLICA_NAME', os.path.join(BASE_DIR, 'replica.sqlite3')),
+        'PRAGMAS': SQLITE_PRAGMAS,
+        'CONN_MAX_AGE': 600,
+    },
+}
+
+# Reads go to one of DATABASE_REPLICAS unless the request writes, or the
+# browser wrote within the last DATABASE_REPLICA_LAG seconds.
+
+DATABASE_ROUTERS = ['housechores.routers.PrimaryReplicaRouter']
+
+DATABASE_REPLICAS = ['replica'] if os.environ.get('HOUSECHORES_REPLICA_NAME') else []
+
+DATABASE_REPLICA_LAG = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Rendered task boards and their version counter live here, so every worker
+# process has to see the same cache: use memcached or redis when running more
+# than one process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Live board events are published here; LocalBackend only reaches clients
+# connected to the same process, so several processes need a shared backend.
+
+TASK_EVENTS_BACKEND = 'tasks.events.LocalBackend'
+
+# Boards served over ASGI follow the live events. Over WSGI every open event
+# stream holds a worker thread for minutes, so the stream is only served, and
+# boards only follow it, when this is on.
+
+TASK_EVENTS_OVER_WSGI = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -122,6 +208,18 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+# `manage.py collectstatic` copies the files here under hashed names and
+# precompresses them, housechores.staticfiles.serve then sends them with
+# far-future cache headers unless a web server in front serves this directory.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+STATICFILES_STORAGE = 'housechores.staticfiles.CompressedManifestStaticFilesStorage'
+
+# the tests render templates without running collectstatic first
+TEST_RUNNER = 'housechores.testing.TestRunner'
+
 #
 
 LOGIN_REDIRECT_URL = 'tasks:index'
@@ -0,0 +1,33 @@
+"""
+SQLite backend tuned for many concurrent readers and a few writers.
+
+Connections get the pragmas listed under the database's PRAGMAS setting,
+transactions take the write lock when they begin, and queries run the
+wrappers of housechores.queries.
+"""
+from django.db.backends.signals import connection_created
+from django.db.backends.sqlite3 import base
+from django.dispatch import receiver
+
+from housechores import queries
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.execute_wrappers.append(queries.run_wrappers)
+
+    def _start_transaction_under_autocommit(self):
+        # a deferred transaction that reads and then writes can't wait for
+        # another writer, it fails with "database is locked" straight away;
+        # taking the lock up front lets busy_timeout queue the writers instead
+        self.cursor().execute('BEGIN IMMEDIATE')
+
+
+@receiver(connection_created)
+def set_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in connection.settings_dict.get('PRAGMAS', {}).items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
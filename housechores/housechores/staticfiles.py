@@ -0,0 +1,106 @@
+"""
+Fingerprinted, precompressed static files served by Django itself.
+
+`collectstatic` copies every file under a name carrying a hash of its
+content, e.g. bootstrap.min.css -> bootstrap.min.6b4d6047fd2b.css, and writes
+gzip (and, with the optional brotli package, brotli) versions next to the
+text files. `serve` hands out the smallest version the browser accepts;
+hashed names never change content, so they are cached for a year.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+
+from .compression import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# files below this many bytes don't shrink enough to be worth compressing
+COMPRESS_MIN_SIZE = 1024
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml')
+# (suffix, Content-Encoding), best first
+ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+
+CACHE_FOREVER = 'public, max-age=31536000, immutable'
+# unhashed names may change content with the next deployment
+CACHE_BRIEFLY = 'public, max-age=60'
+
+
+def compress(path):
+    """
+    Write `path`.gz, and `path`.br when brotli is installed, unless they
+    turn out no smaller than `path`.
+    """
+    with open(path, 'rb') as file:
+        content = file.read()
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(content):
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage which precompresses the hashed copies of text files.
+    """
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            if not name.endswith(COMPRESSED_EXTENSIONS):
+                continue
+            path = self.path(name)
+            if os.path.getsize(path) >= COMPRESS_MIN_SIZE:
+                compress(path)
+
+
+def is_hashed(name):
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    return name in hashed_files.values()
+
+
+def serve(request, path):
+    # the files collected to STATIC_ROOT, for deployments without a web server in front
+    name = posixpath.normpath(path).lstrip('/')
+    # raises SuspiciousFileOperation, a 400, for paths leaving STATIC_ROOT
+    fullpath = safe_join(settings.STATIC_ROOT, name)
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    content_type = mimetypes.guess_type(fullpath)[0] or 'application/octet-stream'
+    accepted = accepted_encodings(request)
+    served, content_encoding = fullpath, None
+    for suffix, coding in ENCODINGS:
+        if coding in accepted and os.path.isfile(fullpath + suffix):
+            served, content_encoding = fullpath + suffix, coding
+            break
+
+    stat = os.stat(served)
+    etag = '"{:x}-{:x}"'.format(int(stat.st_mtime), stat.st_size)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(served, 'rb'), filename=os.path.basename(fullpath))
+        # FileResponse would guess from the name of the compressed file
+        response['Content-Type'] = content_type
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = CACHE_FOREVER if is_hashed(name) else CACHE_BRIEFLY
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,105 @@
+import contextlib
+import re
+
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+# statements whose plan is checked for full table scans
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE')
+SCAN = re.compile(r'SCAN (?:TABLE )?(\w+)')
+# a virtual table, e.g. full-text search, passing constraints to its own index
+VIRTUAL_INDEX = re.compile(r'VIRTUAL TABLE INDEX \d+:\S')
+# transaction control, mostly savepoints of TestCase's own transaction
+NOT_COUNTED = re.compile(r'(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT|BEGIN)\b')
+
+
+def counted(queries):
+    return [query for query in queries if not NOT_COUNTED.match(query['sql'])]
+
+
+def full_scans(queries):
+    """
+    Return (table, sql) for every full table scan in the plans of `queries`.
+
+    Scans along an index (SQLite says "USING INDEX") walk the index in
+    order and are bounded by a LIMIT, they don't count; neither do scans
+    of virtual tables given constraints, like FTS5 MATCH.
+    """
+    tables = set(connection.introspection.table_names())
+    scans = []
+    with connection.cursor() as cursor:
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(EXPLAINED):
+                continue
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            for row in cursor.fetchall():
+                detail = row[-1]
+                match = SCAN.match(detail)
+                if match and match.group(1) in tables and 'USING' not in detail \
+                        and not VIRTUAL_INDEX.search(detail):
+                    scans.append((match.group(1), sql))
+    return scans
+
+
+class QueryBudgetMixin:
+    """
+    Assertions on the number and plans of the SQL queries a test makes.
+    """
+    @contextlib.contextmanager
+    def assertQueryBudget(self, budget, scans=()):
+        """
+        Fail when the block runs more than `budget` queries, or scans a
+        table not listed in `scans` without using an index.
+        """
+        with CaptureQueriesContext(connection) as captured:
+            yield captured
+        queries = counted(captured)
+        self.assertLessEqual(len(queries), budget, 'Query budget of {} exceeded by {} queries:\n{}'.format(
+            budget, len(queries) - budget, '\n'.join(query['sql'] for query in queries)))
+
+        unexpected = [(table, sql) for table, sql in full_scans(captured) if table not in scans]
+        self.assertEqual(unexpected, [], 'Full table scans:\n{}'.format(
+            '\n'.join('{}: {}'.format(table, sql) for table, sql in unexpected)))
+
+    def assertConstantQueries(self, request, grow):
+        """
+        Fail when `request()` runs more queries after `grow()` added data.
+        """
+        with CaptureQueriesContext(connection) as before:
+            request()
+        grow()
+        with CaptureQueriesContext(connection) as after:
+            request()
+        before, after = counted(before), counted(after)
+        self.assertEqual(len(after), len(before), 'Query count grew with the data:\n{}'.format(
+            '\n'.join(query['sql'] for query in after)))
+
+    def assertSameQueries(self, small, large):
+        """
+        Fail when `large()`, e.g. a request on more rows, runs more queries than `small()`.
+        """
+        with CaptureQueriesContext(connection) as before:
+            small()
+        with CaptureQueriesContext(connection) as after:
+            large()
+        before, after = counted(before), counted(after)
+        self.assertEqual(len(after), len(before), 'Query count grew with the request:\n{}'.format(
+            '\n'.join(query['sql'] for query in after)))
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Run the tests with plain static files storage, the manifest of hashed
+    names only exists after collectstatic.
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.static_storage = override_settings(
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+        self.static_storage.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.static_storage.disable()
+        super().teardown_test_environment(**kwargs)
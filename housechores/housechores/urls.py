@@ -13,11 +13,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
+
+from . import metrics, staticfiles
 
 urlpatterns = [
     path('tasks/', include('tasks.urls')),
     path('tasks/accounts/', include('accounts.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics.metrics, name='metrics'),
+    re_path(r'^{}(?P<path>.+)$'.format(settings.STATIC_URL.lstrip('/')), staticfiles.serve),
 ]
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Task
+from .models import RecurrenceRule, Task
 
 # Register your models here.
-admin.site.register(Task)
\ No newline at end of file
+admin.site.register(Task)
+admin.site.register(RecurrenceRule)
@@ -0,0 +1,73 @@
+"""
+Move tasks completed or expired long ago from tasks_task into ArchivedTask.
+
+Every batch is copied and deleted in one transaction, so an interrupted run
+loses nothing and running again just carries on. Archived tasks leave
+tombstones like deleted ones, delta sync clients drop them from the board.
+"""
+import datetime
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedTask, Task
+
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_BATCH_SIZE = 500
+
+ARCHIVED_FIELDS = ('id', 'caption', 'pub_date', 'due_date', 'task_giver_id',
+                   'task_done_by_id', 'task_done_date')
+
+
+def archivable(cutoff):
+    """
+    Return querysets of the expired and the done tasks to archive, each
+    ordered by the column it is filtered on, so both are a range seek on a
+    partial index: (due_date, id) of the open tasks and (task_done_date, id)
+    of the done ones.
+    """
+    expired = Task.objects.filter(task_done_date__isnull=True, due_date__lt=cutoff)
+    done = Task.objects.filter(task_done_date__isnull=False, task_done_date__lt=cutoff)
+    return expired.order_by('due_date', 'id'), done.order_by('task_done_date', 'id')
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Archive up to `batch_size` tasks completed or expired before `cutoff`,
+    return the number archived.
+    """
+    with transaction.atomic():
+        task_ids = []
+        for queryset in archivable(cutoff):
+            task_ids += queryset.values_list('pk', flat=True)[:batch_size - len(task_ids)]
+            if len(task_ids) >= batch_size:
+                break
+        if not task_ids:
+            return 0
+
+        tasks = Task.objects.filter(pk__in=task_ids).values(*ARCHIVED_FIELDS)
+        # a task archived before, by a run that crashed after committing, is left alone
+        ArchivedTask.objects.bulk_create((ArchivedTask(**task) for task in tasks), ignore_conflicts=True)
+        # archived tasks still count in their users' stats
+        deleted, _ = Task.objects.filter(pk__in=task_ids).delete(keep_stats=True)
+    return deleted
+
+
+def archive_tasks(days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, pause=0.0, now=None):
+    """
+    Archive tasks completed or expired more than `days` days ago, batch by
+    batch, pausing `pause` seconds in between so other writers get the
+    database. Yields the number of tasks archived by every batch.
+    """
+    if now is None:
+        now = timezone.now()
+    cutoff = now - datetime.timedelta(days=days)
+    while True:
+        archived = archive_batch(cutoff, batch_size)
+        if not archived:
+            return
+        yield archived
+        if archived < batch_size:
+            return
+        time.sleep(pause)
@@ -0,0 +1,16 @@
+from django.urls import path
+from . import async_views, urls
+
+# tasks.urls with the async views swapped in, used when served over ASGI
+ASYNC_VIEWS = {
+    'index': async_views.index,
+    'complete_task': async_views.complete_task,
+    'delete_task': async_views.delete_task,
+    'create_task': async_views.create_task,
+}
+
+app_name = urls.app_name
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+    for pattern in urls.urlpatterns
+]
@@ -0,0 +1,191 @@
+import asyncio
+import functools
+import io
+from calendar import timegm
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import get_user
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
+from django.http import HttpResponseRedirect
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import events, views
+from .forms import CreateTaskForm
+from .models import Task
+
+
+index_view = views.IndexView.as_view()
+
+
+def database_sync_to_async(func):
+    # all ORM work runs on the one thread Django's connection handling expects
+    return sync_to_async(func, thread_sensitive=True)
+
+
+def _is_authenticated(request):
+    # resolving the lazy request.user reads the session and user from the database
+    return request.user.is_authenticated
+
+
+def _board_validators(request):
+    etag = views.board_etag(request)
+    last_modified = views.board_last_modified(request)
+    return (quote_etag(etag) if etag else None,
+            timegm(last_modified.utctimetuple()) if last_modified else None)
+
+
+async def index(request):
+    # unchanged polls are answered right here, only a changed board is
+    # handed to a worker thread to be rendered by IndexView
+    etag, last_modified = await database_sync_to_async(_board_validators)(request)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        return await database_sync_to_async(index_view)(request)
+
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+async def complete_task(request, task_id):
+    # redirect to index when user is not logged in
+    if not await database_sync_to_async(_is_authenticated)(request):
+        return HttpResponseRedirect(reverse('tasks:index'))
+
+    # mark task as completed; missing, completed and expired tasks are not claimed
+    if not await database_sync_to_async(Task.objects.complete)(task_id, request.user):
+        messages.warning(request, 'This task can no longer be completed.')
+
+    return HttpResponseRedirect(reverse('tasks:index'))
+
+
+async def delete_task(request, task_id):
+    task = await database_sync_to_async(get_object_or_404)(Task, pk=task_id)
+
+    # redirect to index when user is not logged in or user does not own this task
+    if not await database_sync_to_async(_is_authenticated)(request) or \
+            (not request.user.is_superuser and task.task_giver_id != request.user.pk):
+        return HttpResponseRedirect(reverse('tasks:index'))
+
+    # delete task
+    await database_sync_to_async(task.delete)()
+
+    return HttpResponseRedirect(reverse('tasks:index'))
+
+
+async def create_task(request):
+    # redirect to index if user is not logged in
+    if not await database_sync_to_async(_is_authenticated)(request):
+        return HttpResponseRedirect(reverse('tasks:index'))
+
+    if request.method == 'POST':
+        form = CreateTaskForm(request.POST)
+        if form.is_valid():
+            # create new task from the validated form data
+            task = Task()
+            task.caption = form.cleaned_data['caption']
+            task.pub_date = timezone.now()
+            task.due_date = form.cleaned_data['due_date']
+            task.task_giver = request.user
+
+            await database_sync_to_async(views.save_task)(task, form.cleaned_data['repeat'])
+            return HttpResponseRedirect(reverse('tasks:index'))
+
+    # messages shown by the template may have to be read from the session
+    form = CreateTaskForm()
+    return await database_sync_to_async(render)(request, 'tasks/create_task.html', {'form': form})
+
+
+def _is_session_authenticated(request):
+    # what SessionMiddleware and AuthenticationMiddleware would set up
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    request.user = get_user(request)
+    return request.user.is_authenticated
+
+
+class EventStreamMiddleware:
+    """
+    ASGI middleware serving the task event stream on the event loop.
+
+    Django 3.1 iterates streaming responses synchronously, so the regular
+    view would block the loop for as long as a client stays connected;
+    here an idle client costs one waiting coroutine.
+    """
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != reverse('tasks:task_events'):
+            return await self.application(scope, receive, send)
+
+        request = ASGIRequest(scope, io.BytesIO())
+        if not await database_sync_to_async(_is_session_authenticated)(request):
+            await self.send_start(send, views.HttpResponseForbidden())
+            return await send({'type': 'http.response.body'})
+        await self.send_start(send, views.event_stream_response(()))
+
+        async def send_events(subscription):
+            async for chunk in events.astream(subscription):
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            await send({'type': 'http.response.body'})
+
+        async def wait_for_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        # stop streaming as soon as the client goes away
+        tasks = [asyncio.ensure_future(send_events(events.get_backend().subscribe())),
+                 asyncio.ensure_future(wait_for_disconnect())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def send_start(self, send, response):
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(header.encode('ascii'), value.encode('latin1'))
+                        for header, value in response.items()],
+        })
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    Django's ASGI handler, reading streaming responses off the event loop.
+
+    Django 3.1 iterates a streaming response on the loop, where the ORM
+    queries of a lazy iterator, like the export's rows, raise
+    SynchronousOnlyOperation. Each part is read in the thread the ORM work
+    runs in instead, so the export's cursor stays on one connection.
+    """
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = [(header.encode('ascii'), value.encode('latin1')) for header, value in response.items()]
+        headers += [(b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+                    for cookie in response.cookies.values()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+
+        parts = iter(response)
+        read = database_sync_to_async(functools.partial(next, parts, None))
+        while True:
+            part = await read()
+            if part is None:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await database_sync_to_async(response.close)()
@@ -0,0 +1,99 @@
+import contextlib
+import datetime
+import math
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from .models import Task
+
+SEED_CHUNK_SIZE = 5000
+# seeded captions are one of these and a number, a realistic vocabulary for searches
+CHORES = (
+    'Wash the dishes', 'Vacuum the living room', 'Take out the trash', 'Water the plants',
+    'Clean the bathroom', 'Do the laundry', 'Mop the kitchen floor', 'Walk the dog',
+    'Feed the cat', 'Iron the shirts', 'Dust the shelves', 'Change bed sheets',
+    'Clean the windows', 'Buy groceries', 'Cook dinner', 'Pay the bills',
+    'Mow the lawn', 'Wipe the counters', 'Descale the kettle', 'Sort the recycling',
+)
+
+
+@contextlib.contextmanager
+def scratch_database():
+    # benchmarks run against a throwaway test database, never the real one
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def seed(tasks, users, task_giver=None, chunk_size=SEED_CHUNK_SIZE):
+    """
+    Bulk insert `users` users and `tasks` tasks spread over them.
+
+    A third of the tasks is done, a third expired and a third still open.
+    Tasks are given round-robin by the seeded users and `task_giver`.
+    Returns the seeded users.
+    """
+    # one precomputed unusable password, hashing one per user would dominate seeding
+    User.objects.bulk_create(
+        (User(username='user{}'.format(i), password='!') for i in range(users)),
+        batch_size=chunk_size)
+    givers = list(User.objects.filter(username__startswith='user').order_by('pk'))
+    if task_giver is not None:
+        givers.append(task_giver)
+
+    now = timezone.now()
+    for start in range(0, tasks, chunk_size):
+        batch = []
+        for i in range(start, min(start + chunk_size, tasks)):
+            giver = givers[i % len(givers)]
+            kind = i % 3
+            if kind == 0:
+                due_date = now + datetime.timedelta(days=1, seconds=i)
+            else:
+                due_date = now - datetime.timedelta(days=1, seconds=i)
+            batch.append(Task(
+                caption='{} {}'.format(CHORES[i % len(CHORES)], i), pub_date=now - datetime.timedelta(days=2),
+                due_date=due_date, task_giver=giver,
+                task_done_by=giver if kind == 1 else None,
+                task_done_date=due_date if kind == 1 else None))
+        with transaction.atomic():
+            Task.objects.bulk_create(batch)
+    return givers
+
+
+def percentile(values, percent):
+    # nearest-rank percentile of a non-empty list
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * percent / 100) - 1, 0)]
+
+
+def measure(request, count):
+    """
+    Call `request(i)` `count` times, return latency and query statistics.
+    """
+    timings, queries = [], []
+    for i in range(count):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request(i)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError('Request {} failed with status {}'.format(i, response.status_code))
+        timings.append(elapsed * 1000)
+        queries.append(len(captured))
+    return {
+        'requests': count,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(sum(timings) / count, 3),
+        'queries_per_request': round(sum(queries) / count, 2),
+        'max_queries': max(queries),
+    }
@@ -0,0 +1,94 @@
+import datetime
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+from housechores.metrics import count_cache
+
+VERSION_KEY = 'tasks:version'
+CHANGED_AT_KEY = 'tasks:changed_at'
+# longest time a rendered board is kept, it's usually invalidated much sooner
+BOARD_TIMEOUT = 300
+# a rebuild holding the lock longer than this is assumed to have died
+LOCK_TIMEOUT = 10
+# how long requests wait for another request's rebuild before doing their own
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.05
+# >1 recomputes earlier, <1 later, see "Optimal Probabilistic Cache Stampede Prevention"
+EARLY_RECOMPUTE_BETA = 1.0
+
+
+def get_version():
+    # version of the whole task table, part of every board cache key
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from the clock so a lost counter never reuses an old version
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    # invalidate every cached board after any change to tasks
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        get_version()
+    cache.set(CHANGED_AT_KEY, time.time(), None)
+
+
+def get_changed_at():
+    # time of the last change to tasks, None when it has been evicted
+    changed_at = cache.get(CHANGED_AT_KEY)
+    if changed_at is None:
+        return None
+    return datetime.datetime.fromtimestamp(changed_at, tz=datetime.timezone.utc)
+
+
+def get_or_build(key, build, name='default'):
+    """
+    Return the value cached under `key`, building it with `build()` when needed.
+
+    `build` returns a (value, timeout) pair. Entries are refreshed a little
+    before they expire (probabilistic early recompute), and only one request
+    at a time rebuilds a missing entry while the others wait for its result.
+    Lookups are counted in the cache metrics under `name`.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires_at, delta = entry
+        # the slower the build, the earlier one lucky request refreshes it
+        jitter = -delta * EARLY_RECOMPUTE_BETA * math.log(1 - random.random())
+        if time.time() + jitter < expires_at:
+            count_cache(name, 'hit')
+            return value
+
+    lock_key = key + ':lock'
+    locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+    if not locked:
+        # somebody else is rebuilding, serve what we have or wait for them
+        if entry is not None:
+            count_cache(name, 'stale')
+            return entry[0]
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                count_cache(name, 'waited')
+                return entry[0]
+
+    # an entry refreshed early counts as a miss as well
+    count_cache(name, 'miss')
+    try:
+        started = time.time()
+        value, timeout = build()
+        delta = time.time() - started
+        if timeout > 0:
+            cache.set(key, (value, time.time() + timeout, delta), timeout)
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
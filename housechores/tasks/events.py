@@ -0,0 +1,199 @@
+import asyncio
+import collections
+import functools
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .cache import get_version
+
+EVENT_CREATED = 'created'
+EVENT_UPDATED = 'updated'
+EVENT_COMPLETED = 'completed'
+EVENT_DELETED = 'deleted'
+# sent instead of the events a subscriber fell too far behind on
+EVENT_RELOAD = 'reload'
+
+# events a slow subscriber may fall behind by before it is told to reload
+MAX_PENDING = 100
+# a comment line every HEARTBEAT seconds keeps proxies from closing idle streams
+HEARTBEAT = 15
+# streams are closed after a while so long-lived workers are recycled,
+# EventSource reconnects on its own after RETRY milliseconds
+STREAM_DURATION = 300
+RETRY = 2000
+
+
+class Subscription:
+    """
+    Events published since subscribing, read by one event stream.
+
+    Readers either block in get() (a WSGI worker thread) or await aget()
+    (the ASGI event loop); publishers may call put() from any thread.
+    """
+    def __init__(self, backend, max_pending=MAX_PENDING):
+        self.backend = backend
+        self.max_pending = max_pending
+        self.overflowed = False
+        self._events = collections.deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._waiter = None
+
+    def put(self, event):
+        with self._lock:
+            if len(self._events) >= self.max_pending:
+                self.overflowed = True
+                self._events.clear()
+            if not self.overflowed:
+                self._events.append(event)
+            waiter = self._waiter
+        self._ready.set()
+        if waiter is not None:
+            loop, ready = waiter
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # the reader's event loop is already closed
+                pass
+
+    def _drain(self):
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            self._ready.clear()
+        return events
+
+    def get(self, timeout=None):
+        # pending events, or [] when nothing was published within `timeout`
+        self._ready.wait(timeout)
+        return self._drain()
+
+    async def aget(self, timeout=None):
+        ready = asyncio.Event()
+        with self._lock:
+            self._waiter = (asyncio.get_running_loop(), ready)
+            pending = bool(self._events) or self.overflowed
+        try:
+            if not pending:
+                await asyncio.wait_for(ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._waiter = None
+        return self._drain()
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class BaseBackend:
+    """
+    Fans published events out to the subscriptions of this process.
+
+    Subclasses implement publish(); a backend shared by several processes
+    (e.g. on redis pub/sub) sends the event to every process and calls
+    deliver() in each of them when it arrives.
+    """
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def deliver(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def publish(self, event):
+        raise NotImplementedError('subclasses of BaseBackend must provide a publish() method')
+
+
+class LocalBackend(BaseBackend):
+    # events only reach streams served by this process, enough for a single
+    # worker process and for tests
+    def publish(self, event):
+        self.deliver(event)
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend():
+    return import_string(getattr(settings, 'TASK_EVENTS_BACKEND', 'tasks.events.LocalBackend'))()
+
+
+def publish(type, ids=()):
+    """
+    Tell every event stream that tasks changed, once the transaction commits.
+    """
+    ids = list(ids)
+
+    def send():
+        get_backend().publish({'type': type, 'ids': ids, 'version': get_version()})
+    transaction.on_commit(send)
+
+
+def format_event(event):
+    # the table version doubles as the SSE event id
+    return 'id: {}\ndata: {}\n\n'.format(event.get('version', ''), json.dumps(event))
+
+
+def _stream_started():
+    return 'retry: {}\n\n'.format(RETRY), time.monotonic() + STREAM_DURATION
+
+
+def _stream_chunk(subscription, events):
+    # what to send for one read, or None once the subscriber has to reload
+    if subscription.overflowed:
+        return None
+    if not events:
+        return ': keep-alive\n\n'
+    return ''.join(format_event(event) for event in events)
+
+
+def stream(subscription):
+    """
+    Server-sent events for `subscription`, read from a worker thread.
+    """
+    try:
+        retry, deadline = _stream_started()
+        yield retry
+        while time.monotonic() < deadline:
+            chunk = _stream_chunk(subscription, subscription.get(HEARTBEAT))
+            if chunk is None:
+                yield format_event({'type': EVENT_RELOAD})
+                return
+            yield chunk
+    finally:
+        subscription.close()
+
+
+async def astream(subscription):
+    """
+    Server-sent events for `subscription`, read on the event loop.
+    """
+    try:
+        retry, deadline = _stream_started()
+        yield retry
+        while time.monotonic() < deadline:
+            chunk = _stream_chunk(subscription, await subscription.aget(HEARTBEAT))
+            if chunk is None:
+                yield format_event({'type': EVENT_RELOAD})
+                return
+            yield chunk
+    finally:
+        subscription.close()
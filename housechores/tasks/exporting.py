@@ -0,0 +1,82 @@
+import csv
+import heapq
+import json
+
+from django.utils import timezone
+
+from .models import STATUS_OPEN, ArchivedTask, Task
+
+FORMATS = ('csv', 'ndjson')
+FIELDS = ('id', 'caption', 'task_giver', 'task_done_by', 'pub_date', 'due_date',
+          'task_done_date', 'status')
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def export_rows(status=None, since=None, until=None):
+    """
+    Return tasks to export as tuples of FIELDS, filtered by status and due
+    date, archived tasks included, in (due_date, id) order.
+
+    Live and archived tasks are read off their own (due_date, id) index by
+    a server-side cursor each, in chunks of CHUNK_SIZE, and merged; the
+    whole table is never held in memory. A task archived while the export
+    runs may be read from both, and is exported once.
+    """
+    now = timezone.now()
+    querysets = [Task.objects.filter_status(status, now)]
+    # archived tasks are done or expired, never open
+    if status != STATUS_OPEN:
+        querysets.append(ArchivedTask.objects.filter_status(status, now))
+
+    iterators = []
+    for queryset in querysets:
+        if since is not None:
+            queryset = queryset.filter(due_date__gte=since)
+        if until is not None:
+            queryset = queryset.filter(due_date__lt=until)
+        # live tasks first: a task archived after their cursor started is
+        # still found by the archive's
+        iterators.append(queryset.with_status(now).order_by('due_date', 'id')
+                         .values_list('id', 'caption', 'task_giver__username', 'task_done_by__username',
+                                      'pub_date', 'due_date', 'task_done_date', 'status')
+                         .iterator(chunk_size=CHUNK_SIZE))
+
+    previous = None
+    for row in heapq.merge(*iterators, key=lambda row: (row[5], row[0])):
+        if row[0] != previous:
+            yield row
+        previous = row[0]
+
+
+def _format_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class Echo:
+    # file-like object handing back what csv.writer writes, without buffering
+    def write(self, value):
+        return value
+
+
+def stream_export(rows, format):
+    # yield the export as text, one piece per CHUNK_SIZE rows
+    if format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(FIELDS)
+        encode = lambda row: writer.writerow([_format_value(value) for value in row])
+    elif format == 'ndjson':
+        encode = lambda row: json.dumps(dict(zip(FIELDS, map(_format_value, row)))) + '\n'
+    else:
+        raise ValueError('Unknown format {!r}'.format(format))
+
+    chunk = []
+    for row in rows:
+        chunk.append(encode(row))
+        if len(chunk) == CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
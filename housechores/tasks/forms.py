@@ -1,8 +1,29 @@
 from django import forms
 
+from .models import FREQUENCIES, STATUSES
+
 
 class CreateTaskForm(forms.Form):
     caption = forms.CharField(max_length=200)
-    due_date = forms.DateTimeField(input_formats=['%d/%m/%Y %H:%M'])
+    # the browser's own date picker posts %Y-%m-%dT%H:%M
+    due_date = forms.DateTimeField(
+        input_formats=['%Y-%m-%dT%H:%M', '%d/%m/%Y %H:%M'],
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'))
+    repeat = forms.ChoiceField(
+        choices=[('', 'does not repeat')] + [(frequency, frequency) for frequency in FREQUENCIES],
+        required=False)
+
+
+class BulkCreateTaskForm(forms.Form):
+    tasks = forms.CharField(widget=forms.Textarea(attrs={'rows': 10}),
+                            help_text='One task per line: caption, dd/mm/YYYY HH:MM')
 
 
+class ExportTasksForm(forms.Form):
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')], required=False)
+    status = forms.ChoiceField(choices=[(status, status) for status in STATUSES], required=False)
+    # due date range, `until` is exclusive
+    since = forms.DateTimeField(input_formats=['%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d'],
+                                required=False)
+    until = forms.DateTimeField(input_formats=['%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d'],
+                                required=False)
@@ -0,0 +1,85 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .forms import CreateTaskForm
+from .models import RecurrenceRule, Task
+
+FORMATS = ('csv', 'ndjson')
+CHUNK_SIZE = 1000
+
+
+def read_rows(lines, format, fieldnames=None):
+    """
+    Yield (line number, row dict) for every record in an iterable of lines.
+
+    Rows that can't be decoded are yielded as None so the caller can report
+    them without aborting the whole import.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(lines, fieldnames=fieldnames, skipinitialspace=True)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'ndjson':
+        for line_num, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_num, row if isinstance(row, dict) else None
+    else:
+        raise ValueError('Unknown format {!r}'.format(format))
+
+
+def clean_rows(rows, on_error=None):
+    # validate every row through CreateTaskForm and yield its cleaned data
+    for line_num, row in rows:
+        if row is None:
+            errors = {'__all__': ['Malformed record.']}
+        else:
+            form = CreateTaskForm(row)
+            if form.is_valid():
+                yield form.cleaned_data
+                continue
+            errors = form.errors
+        if on_error is not None:
+            on_error(line_num, errors)
+
+
+def format_error(line_num, errors):
+    messages = (message for field_errors in errors.values() for message in field_errors)
+    return 'Line {}: {}'.format(line_num, ' '.join(messages))
+
+
+def create_tasks(cleaned_rows, task_giver, chunk_size=CHUNK_SIZE):
+    """
+    Insert tasks from cleaned rows with one bulk_create per chunk.
+
+    Every chunk is committed in its own transaction, so only `chunk_size`
+    rows are held in memory at a time. Rows with a `repeat` frequency start a
+    recurrence rule each, saved one by one as the tasks need their ids.
+    Returns the number of created tasks.
+    """
+    pub_date = timezone.now()
+    rows = iter(cleaned_rows)
+
+    created = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return created
+        with transaction.atomic():
+            tasks = []
+            for row in chunk:
+                task = Task(caption=row['caption'], pub_date=pub_date,
+                            due_date=row['due_date'], task_giver=task_giver)
+                if row.get('repeat'):
+                    task.recurrence = RecurrenceRule.start(task, row['repeat'])
+                tasks.append(task)
+            Task.objects.bulk_create(tasks)
+        created += len(chunk)
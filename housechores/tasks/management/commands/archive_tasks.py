@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.archiving import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, archive_tasks
+from tasks.sync import TOMBSTONE_RETENTION_DAYS, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = ('Move tasks completed or expired more than --days days ago into the archive, '
+            'in batches of one transaction each. Safe to interrupt and to run again. '
+            'Tombstones of deleted tasks older than --tombstone-days are pruned after.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                            help='Archive tasks completed or expired longer ago than this.')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help='Tasks moved per transaction.')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to wait between batches, so other writers get the database.')
+        parser.add_argument('--tombstone-days', type=int, default=TOMBSTONE_RETENTION_DAYS,
+                            help='Prune tombstones older than this; delta sync clients which last '
+                                 'synced before get all tasks again.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['tombstone_days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days and --tombstone-days must not be negative '
+                               'and --batch-size must be positive.')
+
+        started = time.monotonic()
+        total = 0
+        for archived in archive_tasks(options['days'], options['batch_size'], options['pause']):
+            total += archived
+            if options['verbosity'] > 1:
+                self.stdout.write('Archived {} tasks.'.format(archived))
+        self.stdout.write('Archived {} tasks in {:.1f}s.'.format(total, time.monotonic() - started))
+        self.stdout.write('Pruned {} tombstones.'.format(prune_tombstones(options['tombstone_days'])))
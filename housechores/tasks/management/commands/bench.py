@@ -0,0 +1,141 @@
+import datetime
+import json
+import platform
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from tasks.benchmarking import scratch_database, seed, measure
+from tasks.models import Task, STATUS_OPEN
+
+SCENARIOS = ('index_cold', 'index', 'index_poll', 'search', 'create', 'complete', 'delete')
+# rare and common words, a prefix, a username and a word nothing matches
+SEARCHES = ('kettle', 'the', 'dish', 'laundry 12', 'user7', 'nothing')
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database with synthetic tasks and measure p50/p99 latency '
+            'and queries per request of the task board views through the test client.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=10000, help='Tasks to seed.')
+        parser.add_argument('--users', type=int, default=100, help='Users to seed.')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests measured per scenario.')
+        parser.add_argument('--scenario', choices=SCENARIOS, action='append',
+                            help='Scenario to run, all of them by default.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare with.')
+        parser.add_argument('--max-regression', type=float, default=20.0,
+                            help='Fail when a p99 latency grew by more than this many percent '
+                                 'over --compare, or queries per request grew at all.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+
+        with scratch_database():
+            results = self.run(options)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+        if baseline is not None:
+            self.compare(baseline, results, options['max_regression'])
+
+    def run(self, options):
+        user = User.objects.create_user(username='bench', password='bench')
+        started = time.monotonic()
+        seed(options['tasks'], options['users'], task_giver=user)
+        self.stdout.write('Seeded {} tasks and {} users in {:.1f}s.'.format(
+            options['tasks'], options['users'], time.monotonic() - started))
+
+        client = Client()
+        client.force_login(user)
+        count = options['requests']
+        results = {}
+        for scenario in options['scenario'] or SCENARIOS:
+            request = getattr(self, 'prepare_' + scenario)(client, user, count)
+            results[scenario] = measure(request, count)
+            self.stdout.write('{:<12} p50 {p50_ms:8.2f}ms  p99 {p99_ms:8.2f}ms  '
+                              '{queries_per_request:5.1f} queries/request'.format(
+                                  scenario, **results[scenario]))
+
+        return {
+            'meta': {
+                'tasks': options['tasks'],
+                'users': options['users'],
+                'requests': count,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'started_at': timezone.now().isoformat(),
+            },
+            'results': results,
+        }
+
+    # every prepare_* method returns a function sending the i-th request
+
+    def prepare_index_cold(self, client, user, count):
+        def request(i):
+            # nothing cached, the board is queried and rendered every time
+            cache.clear()
+            return client.get(reverse('tasks:index'))
+        return request
+
+    def prepare_index(self, client, user, count):
+        client.get(reverse('tasks:index'))
+        return lambda i: client.get(reverse('tasks:index'))
+
+    def prepare_index_poll(self, client, user, count):
+        etag = client.get(reverse('tasks:index'))['ETag']
+        return lambda i: client.get(reverse('tasks:index'), HTTP_IF_NONE_MATCH=etag)
+
+    def prepare_search(self, client, user, count):
+        def request(i):
+            # searches are cached like boards, measure the search itself
+            cache.clear()
+            return client.get(reverse('tasks:index'), {'q': SEARCHES[i % len(SEARCHES)]})
+        return request
+
+    def prepare_create(self, client, user, count):
+        due_date = timezone.localtime(timezone.now() + datetime.timedelta(days=1))
+        data = {'caption': 'Benchmark', 'due_date': due_date.strftime('%d/%m/%Y %H:%M')}
+        return lambda i: client.post(reverse('tasks:create_task'), data)
+
+    def prepare_complete(self, client, user, count):
+        task_ids = list(Task.objects.filter_status(STATUS_OPEN)
+                        .order_by('due_date').values_list('pk', flat=True)[:count])
+        if len(task_ids) < count:
+            raise CommandError('Not enough open tasks to complete, seed more --tasks.')
+        return lambda i: client.get(reverse('tasks:complete_task', args=(task_ids[i],)))
+
+    def prepare_delete(self, client, user, count):
+        task_ids = list(Task.objects.filter(task_giver=user).values_list('pk', flat=True)[:count])
+        if len(task_ids) < count:
+            raise CommandError('Not enough tasks to delete, seed more --tasks.')
+        return lambda i: client.get(reverse('tasks:delete_task', args=(task_ids[i],)))
+
+    def compare(self, baseline, results, max_regression):
+        regressions = []
+        for scenario, result in results['results'].items():
+            before = baseline['results'].get(scenario)
+            if before is None:
+                continue
+            change = (result['p99_ms'] - before['p99_ms']) / before['p99_ms'] * 100
+            self.stdout.write('{:<12} p99 {:+7.1f}%  queries {} -> {}'.format(
+                scenario, change, before['queries_per_request'], result['queries_per_request']))
+            if change > max_regression:
+                regressions.append('{} p99 grew by {:.1f}%'.format(scenario, change))
+            if result['queries_per_request'] > before['queries_per_request']:
+                regressions.append('{} makes more queries per request'.format(scenario))
+        if regressions:
+            raise CommandError('Regressions: {}.'.format(', '.join(regressions)))
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
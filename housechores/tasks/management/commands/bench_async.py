@@ -0,0 +1,87 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client, AsyncClient, override_settings
+from django.urls import reverse
+
+from tasks.benchmarking import scratch_database, seed
+
+
+class Command(BaseCommand):
+    help = ('Compare board polling throughput of the WSGI views against the async '
+            'views served through ASGI, on a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Polls sent through each path.')
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='Polls in flight at the same time.')
+        parser.add_argument('--tasks', type=int, default=200, help='Tasks on the board.')
+        parser.add_argument('--changed', action='store_true',
+                            help='Poll without If-None-Match, so every poll renders the board.')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run(options)
+
+    def run(self, options):
+        user = User.objects.create_user(username='bench', password='bench')
+        seed(options['tasks'], users=0, task_giver=user)
+
+        total, concurrency = options['requests'], options['concurrency']
+        for name, bench in (('WSGI', self.bench_wsgi), ('ASGI', self.bench_asgi)):
+            elapsed, statuses = bench(user, total, concurrency, options['changed'])
+            self.stdout.write('{}: {} polls, {} concurrent, {:.2f}s, {:.0f} req/s, statuses {}'.format(
+                name, total, concurrency, elapsed, total / elapsed,
+                dict(sorted(statuses.items()))))
+
+    def bench_wsgi(self, user, total, concurrency, changed):
+        clients = []
+        for i in range(concurrency):
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        extra = {} if changed else {'HTTP_IF_NONE_MATCH': self.etag(clients[0])}
+        url = reverse('tasks:index')
+
+        # every in-flight poll holds one worker thread, like a sync worker
+        started = time.monotonic()
+        with ThreadPoolExecutor(concurrency) as executor:
+            responses = list(executor.map(
+                lambda i: clients[i % concurrency].get(url, **extra).status_code, range(total)))
+        return time.monotonic() - started, self.count(responses)
+
+    def bench_asgi(self, user, total, concurrency, changed):
+        with override_settings(ROOT_URLCONF='housechores.async_urls'):
+            url = reverse('tasks:index')
+            client = Client()
+            client.force_login(user)
+            extra = {} if changed else {'if-none-match': self.etag(client)}
+            async_client = AsyncClient()
+            async_client.cookies = client.cookies
+
+            async def poll(semaphore):
+                async with semaphore:
+                    response = await async_client.get(url, **extra)
+                    return response.status_code
+
+            async def main():
+                # polls wait on the event loop, not on worker threads
+                semaphore = asyncio.Semaphore(concurrency)
+                return await asyncio.gather(*(poll(semaphore) for i in range(total)))
+
+            started = time.monotonic()
+            responses = asyncio.run(main())
+            return time.monotonic() - started, self.count(responses)
+
+    def etag(self, client):
+        return client.get(reverse('tasks:index'))['ETag']
+
+    def count(self, statuses):
+        counts = {}
+        for status in statuses:
+            counts[status] = counts.get(status, 0) + 1
+        return counts
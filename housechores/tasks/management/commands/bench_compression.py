@@ -0,0 +1,72 @@
+import copy
+import re
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from tasks.benchmarking import scratch_database, seed
+
+NEXT_PAGE = re.compile(r'href="\?after=([^"&]+)"')
+ENCODINGS = ('identity', 'gzip', 'br')
+PLAIN_LOADERS = ['django.template.loaders.filesystem.Loader',
+                 'django.template.loaders.app_directories.Loader']
+
+
+class Command(BaseCommand):
+    help = ('Walk every page of a synthetic task board and compare the bytes sent with '
+            'and without template minification, for each response encoding.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=5000, help='Tasks on the board.')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run(options)
+
+    def run(self, options):
+        user = User.objects.create_user(username='bench', password='bench')
+        seed(options['tasks'], users=10, task_giver=user)
+        client = Client()
+        client.force_login(user)
+
+        urls = self.page_urls(client)
+        baseline = None
+        for name, loaders in (('original', PLAIN_LOADERS), ('minified', settings.MINIFYING_LOADERS)):
+            # both cached, as without DEBUG
+            templates = copy.deepcopy(settings.TEMPLATES)
+            templates[0]['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', loaders)]
+            with override_settings(TEMPLATES=templates):
+                for encoding in ENCODINGS:
+                    size, elapsed = self.walk(client, urls, encoding)
+                    if baseline is None:
+                        baseline = size
+                    self.stdout.write('{:<8} {:<8} {:4} pages {:10,} bytes {:6.1f}% {:8.2f}ms/page'.format(
+                        name, encoding, len(urls), size, size / baseline * 100,
+                        elapsed / len(urls) * 1000))
+
+    def page_urls(self, client):
+        # every page of the board in order, following the next page links
+        urls = [reverse('tasks:index')]
+        while True:
+            html = client.get(urls[-1], HTTP_ACCEPT_ENCODING='identity').content.decode()
+            match = NEXT_PAGE.search(html)
+            if match is None:
+                return urls
+            urls.append('{}?after={}'.format(reverse('tasks:index'), match.group(1)))
+
+    def walk(self, client, urls, encoding):
+        # each page rendered anew
+        cache.clear()
+        size = 0
+        elapsed = 0.0
+        for url in urls:
+            started = time.perf_counter()
+            response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+            elapsed += time.perf_counter() - started
+            size += len(response.content)
+        return size, elapsed
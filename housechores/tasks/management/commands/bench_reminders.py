@@ -0,0 +1,56 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from tasks.benchmarking import SEED_CHUNK_SIZE, scratch_database
+from tasks.models import Task
+from tasks.reminders import REMINDER_BATCH_SIZE, REMINDER_WINDOW, REMINDER_WORKERS, send_reminders
+
+
+class Command(BaseCommand):
+    help = ('Send the reminders of a synthetic set of open tasks all due within the window, '
+            'through the in-memory email backend, and report the throughput.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=100000, help='Open tasks due soon.')
+        parser.add_argument('--users', type=int, default=1000, help='Task givers they are spread over.')
+        parser.add_argument('--batch-size', type=int, default=REMINDER_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=REMINDER_WORKERS)
+
+    def handle(self, *args, **options):
+        with scratch_database(), override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            self.seed(options['tasks'], options['users'])
+            mail.outbox = []
+
+            started = time.monotonic()
+            emails = tasks = 0
+            for batch_emails, batch_tasks in send_reminders(batch_size=options['batch_size'],
+                                                            workers=options['workers']):
+                emails += batch_emails
+                tasks += batch_tasks
+            elapsed = time.monotonic() - started
+            self.stdout.write('{} reminders of {} tasks in {:.2f}s: {:.0f} tasks/s, {:.0f} emails/s'.format(
+                emails, tasks, elapsed, tasks / elapsed, emails / elapsed))
+
+            started = time.monotonic()
+            list(send_reminders(batch_size=options['batch_size'], workers=options['workers']))
+            self.stdout.write('run again, nothing left to send: {:.2f}s'.format(time.monotonic() - started))
+
+    def seed(self, tasks, users):
+        User.objects.bulk_create(
+            (User(username='user{}'.format(i), email='user{}@example.com'.format(i), password='!')
+             for i in range(users)), batch_size=SEED_CHUNK_SIZE)
+        givers = list(User.objects.order_by('pk'))
+        now = timezone.now()
+        step = REMINDER_WINDOW / (tasks + 1)
+        for start in range(0, tasks, SEED_CHUNK_SIZE):
+            with transaction.atomic():
+                Task.objects.bulk_create(
+                    Task(caption='chore {}'.format(i), pub_date=now, due_date=now + step * (i + 1),
+                         task_giver=givers[i % len(givers)])
+                    for i in range(start, min(start + SEED_CHUNK_SIZE, tasks)))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.exporting import FORMATS, export_rows, stream_export
+from tasks.forms import ExportTasksForm
+from tasks.models import STATUSES
+
+
+class Command(BaseCommand):
+    help = ('Export tasks as CSV or NDJSON, streaming rows from the database. '
+            'Dates use the dd/mm/YYYY [HH:MM] or YYYY-MM-DD format.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--status', choices=STATUSES)
+        parser.add_argument('--since', help='Only tasks due at or after this date.')
+        parser.add_argument('--until', help='Only tasks due before this date.')
+        parser.add_argument('--output', default='-', help='File to write, "-" for standard output.')
+
+    def handle(self, *args, **options):
+        form = ExportTasksForm({key: options[key] for key in ('format', 'status', 'since', 'until')
+                                if options[key]})
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        rows = export_rows(form.cleaned_data['status'] or None,
+                           form.cleaned_data['since'], form.cleaned_data['until'])
+        chunks = stream_export(rows, options['format'])
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+        else:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(chunks)
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.importing import FORMATS, CHUNK_SIZE, read_rows, clean_rows, create_tasks, format_error
+
+
+class Command(BaseCommand):
+    help = ('Import tasks from a CSV file (with a "caption,due_date" header) or '
+            'from NDJSON, streaming the input in chunks. '
+            'Dates use the dd/mm/YYYY HH:MM format.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, "-" reads standard input.')
+        parser.add_argument('--giver', required=True, help='Username of the task giver.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format, guessed from the file extension by default.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Rows inserted per transaction.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if format not in FORMATS:
+            raise CommandError('Cannot guess the format of {!r}, use --format.'.format(path))
+        try:
+            task_giver = User.objects.get(username=options['giver'])
+        except User.DoesNotExist:
+            raise CommandError('User {!r} does not exist.'.format(options['giver']))
+
+        invalid = 0
+
+        def on_error(line_num, errors):
+            nonlocal invalid
+            invalid += 1
+            self.stderr.write(format_error(line_num, errors))
+
+        started = time.monotonic()
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            rows = clean_rows(read_rows(stream, format), on_error=on_error)
+            created = create_tasks(rows, task_giver, chunk_size=options['chunk_size'])
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {} tasks ({} invalid rows skipped) in {:.2f}s, {:.0f} rows/s.'.format(
+                created, invalid, elapsed, (created + invalid) / elapsed if elapsed else 0)))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from tasks.search import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the full-text search index of tasks from the tasks table, '
+            'e.g. after rows were changed with the triggers dropped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database to rebuild the index of.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        indexed = rebuild(using=options['database'])
+        self.stdout.write('Indexed {} tasks in {:.1f}s.'.format(indexed, time.monotonic() - started))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from tasks.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Count every user\'s given and completed chores afresh from the tasks and the archive, '
+            'correcting the stats kept as tasks change wherever they drifted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database to rebuild the stats of.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        wrong, counted = rebuild(using=options['database'])
+        self.stdout.write('Counted {} users, corrected {} in {:.1f}s.'.format(
+            counted, wrong, time.monotonic() - started))
@@ -0,0 +1,38 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.recurrence import CHUNK_SIZE, LOOKAHEAD, Scheduler
+
+
+class Command(BaseCommand):
+    help = ('Create the next occurrences of recurring chores due within --lookahead hours. '
+            'Runs once, e.g. from cron, or with --loop until interrupted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookahead', type=float, default=LOOKAHEAD.total_seconds() / 3600,
+                            help='Hours ahead of its due date an occurrence is created.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Rules held in memory and materialized per transaction.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, waking up whenever a rule is due.')
+
+    def handle(self, *args, **options):
+        if options['lookahead'] < 0 or options['chunk_size'] < 1:
+            raise CommandError('--lookahead must not be negative and --chunk-size must be positive.')
+        scheduler = Scheduler(datetime.timedelta(hours=options['lookahead']), options['chunk_size'])
+
+        if options['loop']:
+            def on_run(created):
+                if created:
+                    self.stdout.write('Created {} tasks.'.format(created))
+            try:
+                scheduler.run_forever(on_run=on_run)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        started = time.monotonic()
+        created = scheduler.run()
+        self.stdout.write('Created {} tasks in {:.1f}s.'.format(created, time.monotonic() - started))
@@ -0,0 +1,34 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.reminders import REMINDER_BATCH_SIZE, REMINDER_WINDOW, REMINDER_WORKERS, send_reminders
+
+
+class Command(BaseCommand):
+    help = ('Email task givers about their open tasks due within --hours hours, one email '
+            'per task giver and batch. A task is reminded of once, however often this runs.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=REMINDER_WINDOW.total_seconds() / 3600,
+                            help='Remind of tasks due within this many hours.')
+        parser.add_argument('--batch-size', type=int, default=REMINDER_BATCH_SIZE,
+                            help='Tasks claimed per transaction.')
+        parser.add_argument('--workers', type=int, default=REMINDER_WORKERS,
+                            help='Emails sent at once, over a connection each.')
+
+    def handle(self, *args, **options):
+        if options['hours'] <= 0 or options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--hours, --batch-size and --workers must be positive.')
+
+        started = time.monotonic()
+        emails = tasks = 0
+        for batch_emails, batch_tasks in send_reminders(datetime.timedelta(hours=options['hours']),
+                                                        options['batch_size'], options['workers']):
+            emails += batch_emails
+            tasks += batch_tasks
+            if options['verbosity'] > 1:
+                self.stdout.write('Sent {} reminders of {} tasks.'.format(batch_emails, batch_tasks))
+        self.stdout.write('Sent {} reminders of {} tasks in {:.1f}s.'.format(
+            emails, tasks, time.monotonic() - started))
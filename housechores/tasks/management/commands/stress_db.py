@@ -0,0 +1,104 @@
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction, OperationalError
+from django.utils import timezone
+
+from tasks.models import Task, STATUS_OPEN
+
+PROFILES = {
+    'plain': {'ENGINE': 'django.db.backends.sqlite3'},
+    'tuned': {'ENGINE': 'housechores.sqlite3', 'PRAGMAS': settings.SQLITE_PRAGMAS},
+}
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent readers and writers against a scratch SQLite database, once '
+            'with the plain sqlite3 backend and once with the tuned housechores.sqlite3 '
+            'profile, and report throughput and "database is locked" errors.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Reading threads.')
+        parser.add_argument('--writers', type=int, default=4, help='Writing threads.')
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help='Seconds each profile is run for.')
+        parser.add_argument('--tasks', type=int, default=1000, help='Tasks seeded before the run.')
+        parser.add_argument('--profile', choices=PROFILES, action='append',
+                            help='Profile to run, all of them by default.')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='housechores-stress-')
+        try:
+            for name in options['profile'] or PROFILES:
+                alias = 'stress_' + name
+                connections.databases[alias] = dict(
+                    PROFILES[name], NAME=os.path.join(directory, name + '.sqlite3'))
+                try:
+                    self.run(name, alias, options)
+                finally:
+                    connections[alias].close()
+                    del connections.databases[alias]
+        finally:
+            shutil.rmtree(directory)
+
+    def run(self, name, alias, options):
+        call_command('migrate', database=alias, verbosity=0)
+        user = User.objects.db_manager(alias).create_user(username='stress')
+        now = timezone.now()
+        Task.objects.using(alias).bulk_create(
+            Task(caption='Task {}'.format(i), pub_date=now, task_giver=user,
+                 due_date=now + datetime.timedelta(days=1, minutes=i))
+            for i in range(options['tasks']))
+
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def count(key):
+            with lock:
+                counts[key] += 1
+
+        def read():
+            list(Task.objects.using(alias).filter_status(STATUS_OPEN)
+                 .select_related('task_giver').order_by('due_date', 'id')[:50])
+            count('reads')
+
+        def write():
+            # read, then write in the same transaction, like the bulk actions do
+            with transaction.atomic(using=alias):
+                pending = Task.objects.using(alias).filter_status(STATUS_OPEN).count()
+                task = Task.objects.using(alias).create(
+                    caption='Task {}'.format(pending), pub_date=timezone.now(),
+                    due_date=timezone.now() + datetime.timedelta(days=1), task_giver_id=user.pk)
+                Task.objects.using(alias).complete(task.pk, user)
+            count('writes')
+
+        def worker(action):
+            try:
+                while time.monotonic() < deadline:
+                    try:
+                        action()
+                    except OperationalError:
+                        count('locked')
+            finally:
+                connections[alias].close()
+
+        threads = [threading.Thread(target=worker, args=(read,)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(write,)) for i in range(options['writers'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        self.stdout.write('{}: {:.0f} reads/s, {:.0f} writes/s, {} locked errors in {:.1f}s'.format(
+            name, counts['reads'] / elapsed, counts['writes'] / elapsed, counts['locked'], elapsed))
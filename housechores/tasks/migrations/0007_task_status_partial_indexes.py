@@ -0,0 +1,21 @@
+# Generated by Django 3.1.6 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_task_due_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(task_done_by=''), fields=['due_date', 'id'], name='task_pending_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(_negated=True, task_done_by=''), fields=['due_date', 'id'], name='task_done_due_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+# tasks with a blank giver get this inactive account, which can't be signed
+# up for, as task_giver can't be null once 0010 has run
+UNKNOWN_GIVER = '(unknown)'
+
+
+def get_user_model(apps):
+    return apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+
+def usernames_to_users(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Task = apps.get_model('tasks', 'Task')
+    User = get_user_model(apps)
+
+    # tasks may name users that no longer exist, keep them as inactive
+    # accounts with an unusable password so no task loses its giver
+    names = set(Task.objects.using(db).values_list('task_giver', flat=True).distinct())
+    names |= set(Task.objects.using(db).values_list('task_done_by', flat=True).distinct())
+    names.discard('')
+    user_ids = dict(User.objects.using(db).values_list('username', 'pk'))
+    if Task.objects.using(db).filter(task_giver='').exists():
+        names.add(UNKNOWN_GIVER)
+    User.objects.using(db).bulk_create([User(username=name, password='!', is_active=False)
+                                        for name in sorted(names) if name not in user_ids])
+    user_ids = dict(User.objects.using(db).values_list('username', 'pk'))
+    user_ids[''] = user_ids.get(UNKNOWN_GIVER)
+
+    # walk the table by primary key so every batch is a short transaction
+    last_pk = 0
+    while True:
+        with transaction.atomic(using=db):
+            batch = list(Task.objects.using(db).filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+            if not batch:
+                break
+            for task in batch:
+                task.task_giver_user_id = user_ids[task.task_giver]
+                if task.task_done_by:
+                    task.task_done_by_user_id = user_ids[task.task_done_by]
+                    # tasks completed before 'done date' existed are done at the latest by due date
+                    if task.task_done_date is None:
+                        task.task_done_date = task.due_date
+            Task.objects.using(db).bulk_update(batch, ['task_giver_user', 'task_done_by_user', 'task_done_date'])
+        last_pk = batch[-1].pk
+
+
+def users_to_usernames(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Task = apps.get_model('tasks', 'Task')
+    User = get_user_model(apps)
+    usernames = dict(User.objects.using(db).values_list('pk', 'username'))
+
+    last_pk = 0
+    while True:
+        with transaction.atomic(using=db):
+            batch = list(Task.objects.using(db).filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+            if not batch:
+                break
+            for task in batch:
+                task.task_giver = usernames[task.task_giver_user_id]
+                task.task_done_by = usernames.get(task.task_done_by_user_id, '')
+            Task.objects.using(db).bulk_update(batch, ['task_giver', 'task_done_by'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    # each batch commits on its own rather than the whole backfill at once
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0008_task_giver_user_done_by_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(usernames_to_users, users_to_usernames),
+    ]
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0009_backfill_task_users'),
+    ]
+
+    operations = [
+        # blank lets the old column be re-added with '' when migrating backwards
+        migrations.AlterField(
+            model_name='task',
+            name='task_giver',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_pending_due_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_done_due_idx',
+        ),
+        migrations.RemoveField(
+            model_name='task',
+            name='task_giver',
+        ),
+        migrations.RemoveField(
+            model_name='task',
+            name='task_done_by',
+        ),
+        migrations.RenameField(
+            model_name='task',
+            old_name='task_giver_user',
+            new_name='task_giver',
+        ),
+        migrations.RenameField(
+            model_name='task',
+            old_name='task_done_by_user',
+            new_name='task_done_by',
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='task_giver',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='given_tasks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='task_done_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='done_tasks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(task_done_date__isnull=True), fields=['due_date', 'id'], name='task_pending_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(task_done_date__isnull=False), fields=['due_date', 'id'], name='task_done_due_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import migrations
+
+# SQLite FTS5 index of task captions and task givers' usernames, one row per
+# task with the task's id as rowid; triggers keep it in sync with every write,
+# including bulk inserts and raw deletes which send no model signals
+CREATE_TABLE = [
+    """
+    CREATE VIRTUAL TABLE tasks_task_search USING fts5(
+        caption, task_giver, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    # a word in the caption weighs ten times one in the username
+    "INSERT INTO tasks_task_search(tasks_task_search, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    """
+    INSERT INTO tasks_task_search(rowid, caption, task_giver)
+    SELECT tasks_task.id, tasks_task.caption, auth_user.username
+    FROM tasks_task JOIN auth_user ON auth_user.id = tasks_task.task_giver_id
+    """,
+]
+
+# SQLite rebuilds tasks_task for most schema changes, and can't while these
+# triggers refer to it: later migrations altering tasks_task drop them
+# before and create them again after
+CREATE_TRIGGERS = [
+    """
+    CREATE TRIGGER tasks_task_search_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO tasks_task_search(rowid, caption, task_giver)
+        SELECT new.id, new.caption, username FROM auth_user WHERE id = new.task_giver_id;
+    END
+    """,
+    """
+    CREATE TRIGGER tasks_task_search_update AFTER UPDATE OF caption, task_giver_id ON tasks_task BEGIN
+        UPDATE tasks_task_search
+        SET caption = new.caption,
+            task_giver = (SELECT username FROM auth_user WHERE id = new.task_giver_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER tasks_task_search_delete AFTER DELETE ON tasks_task BEGIN
+        DELETE FROM tasks_task_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER tasks_task_search_username AFTER UPDATE OF username ON auth_user BEGIN
+        UPDATE tasks_task_search SET task_giver = new.username
+        WHERE rowid IN (SELECT id FROM tasks_task WHERE task_giver_id = new.id);
+    END
+    """,
+]
+
+DROP_TRIGGERS = [
+    'DROP TRIGGER tasks_task_search_username',
+    'DROP TRIGGER tasks_task_search_delete',
+    'DROP TRIGGER tasks_task_search_update',
+    'DROP TRIGGER tasks_task_search_insert',
+]
+
+DROP_TABLE = ['DROP TABLE tasks_task_search']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0011_task_updated_at_tombstones'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TABLE + CREATE_TRIGGERS, DROP_TRIGGERS + DROP_TABLE),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.6 on 2026-10-18 00:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0012_task_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('caption', models.CharField(max_length=30)),
+                ('pub_date', models.DateTimeField(verbose_name='date added')),
+                ('due_date', models.DateTimeField(verbose_name='due date')),
+                ('task_done_date', models.DateTimeField(blank=True, null=True, verbose_name='done date')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='archived at')),
+                ('task_done_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_done_tasks', to=settings.AUTH_USER_MODEL)),
+                ('task_giver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_given_tasks', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['due_date', 'id'], name='archived_due_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.1.6 on 2026-10-18 00:11
+
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+search = import_module('tasks.migrations.0012_task_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0013_archivedtask'),
+    ]
+
+    operations = [
+        # tasks_task is rebuilt to add its recurrence column
+        migrations.RunSQL(search.DROP_TRIGGERS, search.CREATE_TRIGGERS),
+        migrations.CreateModel(
+            name='RecurrenceRule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('caption', models.CharField(max_length=30)),
+                ('frequency', models.CharField(choices=[('daily', 'daily'), ('weekly', 'weekly'), ('monthly', 'monthly')], max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('starts_at', models.DateTimeField(verbose_name='starts at')),
+                ('ends_at', models.DateTimeField(blank=True, null=True, verbose_name='ends at')),
+                ('next_due', models.DateTimeField(blank=True, null=True, verbose_name='next due')),
+                ('task_giver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurrence_rules', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tasks', to='tasks.recurrencerule'),
+        ),
+        migrations.AddIndex(
+            model_name='recurrencerule',
+            index=models.Index(fields=['next_due', 'id'], name='recurrence_next_due_idx'),
+        ),
+        migrations.RunSQL(search.CREATE_TRIGGERS, search.DROP_TRIGGERS),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.6 on 2026-10-18 00:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0014_recurrencerule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskReminder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.IntegerField(unique=True)),
+                ('due_date', models.DateTimeField(verbose_name='due date')),
+                ('claim', models.CharField(max_length=32)),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='sent at')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='taskreminder',
+            index=models.Index(fields=['due_date'], name='reminder_due_date_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.1.6 on 2026-10-18 00:27
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def count_stats(apps, schema_editor):
+    # the stats of existing tasks, from then on kept as tasks change
+    db = schema_editor.connection.alias
+    UserStats = apps.get_model('tasks', 'UserStats')
+    given, completed = Counter(), Counter()
+    for name in ('Task', 'ArchivedTask'):
+        tasks = apps.get_model('tasks', name).objects.using(db).order_by()
+        given.update(dict(tasks.values_list('task_giver').annotate(Count('pk'))))
+        completed.update(dict(tasks.filter(task_done_by__isnull=False)
+                              .values_list('task_done_by').annotate(Count('pk'))))
+    UserStats.objects.using(db).bulk_create(
+        UserStats(user_id=user_id, given=given[user_id], completed=completed[user_id])
+        for user_id in given.keys() | completed.keys())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0015_taskreminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='chore_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('given', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['-completed', 'user'], name='stats_completed_idx'),
+        ),
+        migrations.RunPython(count_stats, migrations.RunPython.noop),
+    ]
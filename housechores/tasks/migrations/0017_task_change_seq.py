@@ -0,0 +1,92 @@
+# Generated by Django 3.1.6 on 2026-10-18 01:03
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search = import_module('tasks.migrations.0012_task_search')
+
+# every task written and every tombstone left behind takes the next value of
+# the one TaskChangeCounter row, created by the first change if missing, e.g.
+# after a flush; the trigger's own UPDATE doesn't fire it again, SQLite leaves
+# recursive triggers off
+NEXT_CHANGE = """
+    INSERT INTO tasks_taskchangecounter(id, value, pruned) VALUES (1, 1, 0)
+    ON CONFLICT(id) DO UPDATE SET value = value + 1;
+    UPDATE {table} SET change_seq = (SELECT value FROM tasks_taskchangecounter WHERE id = 1)
+    WHERE id = new.id;
+"""
+
+# like the search triggers, later migrations altering tasks_task drop these
+# before and create them again after
+CREATE_TRIGGERS = [
+    'CREATE TRIGGER tasks_task_change_insert AFTER INSERT ON tasks_task BEGIN {} END'.format(
+        NEXT_CHANGE.format(table='tasks_task')),
+    'CREATE TRIGGER tasks_task_change_update AFTER UPDATE ON tasks_task BEGIN {} END'.format(
+        NEXT_CHANGE.format(table='tasks_task')),
+    'CREATE TRIGGER tasks_tasktombstone_change_insert AFTER INSERT ON tasks_tasktombstone BEGIN {} END'.format(
+        NEXT_CHANGE.format(table='tasks_tasktombstone')),
+]
+
+DROP_TRIGGERS = [
+    'DROP TRIGGER tasks_tasktombstone_change_insert',
+    'DROP TRIGGER tasks_task_change_update',
+    'DROP TRIGGER tasks_task_change_insert',
+]
+
+# existing rows are numbered tasks first, then tombstones; cursors of the
+# old (updated_at, id) format are no longer understood and sync from scratch
+BACKFILL = [
+    'UPDATE tasks_task SET change_seq = id',
+    'UPDATE tasks_tasktombstone SET change_seq = (SELECT COALESCE(MAX(id), 0) FROM tasks_task) + id',
+    """
+    INSERT INTO tasks_taskchangecounter(id, value, pruned)
+    SELECT 1, MAX(COALESCE((SELECT MAX(change_seq) FROM tasks_task), 0),
+                  COALESCE((SELECT MAX(change_seq) FROM tasks_tasktombstone), 0)), 0
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0016_userstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChangeCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+                ('pruned', models.BigIntegerField(default=0)),
+            ],
+        ),
+        # tasks_task is rebuilt to add its change_seq column
+        migrations.RunSQL(search.DROP_TRIGGERS, search.CREATE_TRIGGERS),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_updated_at_id_idx',
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tasktombstone',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['change_seq'], name='task_change_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasktombstone',
+            index=models.Index(fields=['change_seq'], name='tombstone_change_seq_idx'),
+        ),
+        migrations.RunSQL(search.CREATE_TRIGGERS, search.DROP_TRIGGERS),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.6 on 2026-10-18 01:09
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0017_task_change_seq'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recurrencerule',
+            name='interval',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        # rules which would have kept the scheduler looping repeat every day, week or month instead
+        migrations.RunSQL('UPDATE tasks_recurrencerule SET "interval" = 1 WHERE "interval" < 1',
+                          migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='recurrencerule',
+            constraint=models.CheckConstraint(check=models.Q(interval__gte=1), name='recurrence_interval_min'),
+        ),
+    ]
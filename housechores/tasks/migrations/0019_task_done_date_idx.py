@@ -0,0 +1,17 @@
+# Generated by Django 3.1.6 on 2026-10-18 01:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0018_recurrence_interval_min'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(task_done_date__isnull=False), fields=['task_done_date', 'id'], name='task_done_date_idx'),
+        ),
+    ]
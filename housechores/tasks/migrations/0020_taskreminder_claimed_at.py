@@ -0,0 +1,23 @@
+# Generated by Django 3.1.6 on 2026-10-18 01:18
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0019_task_done_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskreminder',
+            name='claimed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='claimed at'),
+        ),
+        migrations.AddIndex(
+            model_name='taskreminder',
+            index=models.Index(condition=models.Q(sent_at__isnull=True), fields=['claimed_at'], name='reminder_unsent_claim_idx'),
+        ),
+    ]
@@ -1,18 +1,425 @@
-from django.db import models
+import calendar
+import datetime
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.validators import MinValueValidator
+from django.db import DatabaseError, models, transaction
+from django.db.models import Case, F, Q, Value, When
 from django.utils import timezone
 
+from .cache import bump_version
+from .events import EVENT_COMPLETED, EVENT_CREATED, EVENT_DELETED, publish
+
+STATUS_OPEN = 'open'
+STATUS_EXPIRED = 'expired'
+STATUS_DONE = 'done'
+STATUSES = (STATUS_OPEN, STATUS_EXPIRED, STATUS_DONE)
+
+# per-id outcomes of bulk actions
+RESULT_COMPLETED = 'completed'
+RESULT_DELETED = 'deleted'
+RESULT_NOT_FOUND = 'not_found'
+RESULT_FORBIDDEN = 'forbidden'
+
+# most ids in one DELETE ... WHERE id IN (...) of a bulk delete
+DELETE_BATCH_SIZE = 500
+
+FREQUENCY_DAILY = 'daily'
+FREQUENCY_WEEKLY = 'weekly'
+FREQUENCY_MONTHLY = 'monthly'
+FREQUENCIES = (FREQUENCY_DAILY, FREQUENCY_WEEKLY, FREQUENCY_MONTHLY)
+
+
+class StatusQuerySet(models.QuerySet):
+    # tasks, live or archived, by open/expired/done status
+    def with_status(self, now=None):
+        # annotate every row with its status, evaluated against a single `now`
+        if now is None:
+            now = timezone.now()
+        return self.annotate(status=Case(
+            When(task_done_date__isnull=False, then=Value(STATUS_DONE)),
+            When(due_date__lt=now, then=Value(STATUS_EXPIRED)),
+            default=Value(STATUS_OPEN),
+            output_field=models.CharField(),
+        ))
+
+    def filter_status(self, status, now=None):
+        # filter on the raw columns so the partial indexes can be used
+        if now is None:
+            now = timezone.now()
+        if status == STATUS_OPEN:
+            return self.filter(task_done_date__isnull=True, due_date__gte=now)
+        if status == STATUS_EXPIRED:
+            return self.filter(task_done_date__isnull=True, due_date__lt=now)
+        if status == STATUS_DONE:
+            return self.filter(task_done_date__isnull=False)
+        return self
+
+
+class TaskQuerySet(StatusQuerySet):
+    # update() and bulk_create() send no model signals, invalidate cached boards here;
+    # callers of update() publish their own event, they know what changed
+    def update(self, **kwargs):
+        # auto_now is only applied by save(), stamp updated_at for delta sync
+        kwargs.setdefault('updated_at', timezone.now())
+        rows = super().update(**kwargs)
+        if rows:
+            bump_version()
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # the rows and their stats go to the same, write, database
+        self._for_write = True
+        using = self.db
+        with transaction.atomic(using=using, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            stats = UserStats.objects.using(using)
+            stats.add('given', Counter(obj.task_giver_id for obj in objs))
+            stats.add('completed', Counter(obj.task_done_by_id for obj in objs))
+        if objs:
+            bump_version()
+            # SQLite does not return the new primary keys
+            publish(EVENT_CREATED, [obj.pk for obj in objs if obj.pk is not None])
+        return objs
+
+    def delete(self, keep_stats=False):
+        deleted = len(self._delete(keep_stats))
+        return deleted, {self.model._meta.label: deleted}
+
+    def _delete(self, keep_stats=False):
+        # one tombstone INSERT and one DELETE per batch, instead of the
+        # collector's post_delete signal (and tombstone INSERT) for every task;
+        # no other model references tasks, so there is nothing to cascade to.
+        # Deleted tasks are taken off their users' stats unless `keep_stats`.
+        # Returns the ids of the tasks deleted
+        assert not self.query.is_sliced, "Cannot use 'limit' or 'offset' with delete."
+        # routed for writing like QuerySet.delete(), not to a read replica;
+        # every statement below uses this one alias
+        self._for_write = True
+        using = self.db
+        with transaction.atomic(using=using, savepoint=False):
+            # the rows are locked from being read until deleted (BEGIN
+            # IMMEDIATE on SQLite), so the DELETE removes exactly these
+            rows = list(self.using(using).select_for_update()
+                        .values_list('pk', 'task_giver_id', 'task_done_by_id'))
+            task_ids = [pk for pk, task_giver_id, task_done_by_id in rows]
+            if not keep_stats:
+                stats = UserStats.objects.using(using)
+                stats.add('given', Counter(task_giver_id for pk, task_giver_id, task_done_by_id in rows), -1)
+                stats.add('completed', Counter(task_done_by_id for pk, task_giver_id, task_done_by_id in rows), -1)
+            TaskTombstone.objects.using(using).bulk_create(
+                (TaskTombstone(task_id=pk) for pk in task_ids), batch_size=DELETE_BATCH_SIZE)
+            deleted = 0
+            for start in range(0, len(task_ids), DELETE_BATCH_SIZE):
+                batch = self.model._base_manager.using(using).filter(
+                    pk__in=task_ids[start:start + DELETE_BATCH_SIZE])
+                deleted += batch._raw_delete(using)
+            if deleted != len(task_ids):
+                raise DatabaseError('Deleted {} of {} tasks read.'.format(deleted, len(task_ids)))
+        if deleted:
+            bump_version()
+            publish(EVENT_DELETED, task_ids)
+        return task_ids
+
+    def complete(self, task_id, user, now=None):
+        # claim the task in one conditional UPDATE; returns True only for the
+        # caller that actually completed it, so concurrent clicks can't both win
+        if now is None:
+            now = timezone.now()
+        self._for_write = True
+        using = self.db
+        with transaction.atomic(using=using, savepoint=False):
+            claimed = self.using(using).filter(pk=task_id, task_done_date__isnull=True, due_date__gte=now).update(
+                task_done_by=user, task_done_date=now)
+            UserStats.objects.using(using).add('completed', {user.pk: claimed})
+        if claimed:
+            publish(EVENT_COMPLETED, [task_id])
+        return claimed == 1
+
+    def complete_many(self, task_ids, user, now=None):
+        # claim every completable task in one UPDATE, then read back the rows
+        # once to tell each id's outcome: completed, done, expired or not_found
+        if now is None:
+            now = timezone.now()
+        self._for_write = True
+        using = self.db
+        with transaction.atomic(using=using, savepoint=False):
+            claimed = self.using(using).filter(
+                pk__in=task_ids, task_done_date__isnull=True, due_date__gte=now).update(
+                task_done_by=user, task_done_date=now)
+            UserStats.objects.using(using).add('completed', {user.pk: claimed})
+
+        # read back from where the UPDATE went, a replica may not have it yet
+        results = dict.fromkeys(task_ids, RESULT_NOT_FOUND)
+        rows = self.using(using).filter(pk__in=task_ids).values_list('pk', 'task_done_by', 'task_done_date')
+        for pk, task_done_by, task_done_date in rows:
+            if task_done_by == user.pk and task_done_date == now:
+                results[pk] = RESULT_COMPLETED
+            elif task_done_date:
+                results[pk] = STATUS_DONE
+            else:
+                results[pk] = STATUS_EXPIRED
+
+        completed = [pk for pk, result in results.items() if result == RESULT_COMPLETED]
+        if completed:
+            publish(EVENT_COMPLETED, completed)
+        return results
+
+    def delete_many(self, task_ids, user):
+        # delete, in one statement, the tasks `user` may delete: own tasks,
+        # or any task for a superuser; then read back the ids left to tell
+        # the tasks `user` may not delete from those not found
+        self._for_write = True
+        using = self.db
+        deletable = self.using(using).filter(pk__in=task_ids)
+        if not user.is_superuser:
+            deletable = deletable.filter(task_giver=user)
+        deleted = set(deletable._delete())
+
+        results = dict.fromkeys(task_ids, RESULT_NOT_FOUND)
+        results.update(dict.fromkeys(deleted, RESULT_DELETED))
+        for pk in self.using(using).filter(pk__in=task_ids).values_list('pk', flat=True):
+            results[pk] = RESULT_FORBIDDEN
+        return results
+
 
 # Create your models here.
 class Task(models.Model):
     caption = models.CharField(max_length=30)
     pub_date = models.DateTimeField('date added')
     due_date = models.DateTimeField('due date')
-    task_giver = models.CharField(max_length=30)
-    task_done_by = models.CharField(max_length=30, blank=True)
+    task_giver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                   related_name='given_tasks')
+    # a task is done once it has a done date, even if its completer was deleted since
+    task_done_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                     blank=True, null=True, related_name='done_tasks')
     task_done_date = models.DateTimeField('done date', blank=True, null=True)
+    updated_at = models.DateTimeField('updated at', auto_now=True)
+    # position of the task's latest change among all changes to tasks, set
+    # by a trigger as the row is written, see TaskChangeCounter
+    change_seq = models.BigIntegerField(default=0, editable=False)
+    # the rule this task is an occurrence of, if it repeats
+    recurrence = models.ForeignKey('RecurrenceRule', on_delete=models.SET_NULL,
+                                   blank=True, null=True, related_name='tasks')
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the index page walks (due_date, id)
+            models.Index(fields=['due_date', 'id'], name='task_due_date_id_idx'),
+            # open/expired and done tasks filtered by status
+            models.Index(fields=['due_date', 'id'], name='task_pending_due_idx',
+                         condition=Q(task_done_date__isnull=True)),
+            models.Index(fields=['due_date', 'id'], name='task_done_due_idx',
+                         condition=Q(task_done_date__isnull=False)),
+            # archiving walks the done tasks by the date they were done
+            models.Index(fields=['task_done_date', 'id'], name='task_done_date_idx',
+                         condition=Q(task_done_date__isnull=False)),
+            # delta sync walks changes in change_seq order
+            models.Index(fields=['change_seq'], name='task_change_seq_idx'),
+        ]
 
     def __str__(self):
         return '{} by {}'.format(self.caption, self.task_giver)
 
     def is_expired(self):
-        return not self.task_done_by and self.due_date < timezone.now()
+        return self.task_done_date is None and self.due_date < timezone.now()
+
+
+class RecurrenceRule(models.Model):
+    # a chore repeating every `interval` days, weeks or months; its tasks
+    # are created one occurrence at a time by `manage.py schedule_recurring`
+    caption = models.CharField(max_length=30)
+    task_giver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                   related_name='recurrence_rules')
+    frequency = models.CharField(max_length=10, choices=[(frequency, frequency) for frequency in FREQUENCIES])
+    # 0 would never step past a due date, the scheduler would loop forever
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    # due date of the first occurrence, monthly rules keep its day of the month
+    starts_at = models.DateTimeField('starts at')
+    # no occurrences are due after this
+    ends_at = models.DateTimeField('ends at', blank=True, null=True)
+    # due date of the next occurrence not created yet, null once the rule ended
+    next_due = models.DateTimeField('next due', blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # the scheduler reads rules in due order, the index is its queue
+            models.Index(fields=['next_due', 'id'], name='recurrence_next_due_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=Q(interval__gte=1), name='recurrence_interval_min'),
+        ]
+
+    def __str__(self):
+        return '{} by {}, {}'.format(self.caption, self.task_giver, self.frequency)
+
+    @classmethod
+    def start(cls, task, frequency, interval=1):
+        """
+        Create a rule repeating `task` from its due date on, `task` being the first occurrence.
+        """
+        rule = cls(caption=task.caption, task_giver=task.task_giver, frequency=frequency,
+                   interval=interval, starts_at=task.due_date)
+        rule.next_due = rule.following(task.due_date)
+        rule.save()
+        return rule
+
+    def following(self, due):
+        """
+        Return the due date of the occurrence after the one due at `due`, or
+        None when the rule ends before it.
+        """
+        # stepped in local time, so a chore stays at the same hour across DST changes
+        local = timezone.localtime(due).replace(tzinfo=None)
+        if self.frequency == FREQUENCY_MONTHLY:
+            month = local.month - 1 + self.interval
+            year, month = local.year + month // 12, month % 12 + 1
+            # the 31st turns into the last day of shorter months
+            day = min(timezone.localtime(self.starts_at).day, calendar.monthrange(year, month)[1])
+            local = local.replace(year=year, month=month, day=day)
+        else:
+            local += datetime.timedelta(days=self.interval * (7 if self.frequency == FREQUENCY_WEEKLY else 1))
+        following = timezone.make_aware(local, is_dst=False)
+        if self.ends_at is not None and following > self.ends_at:
+            return None
+        return following
+
+
+class UserStatsQuerySet(models.QuerySet):
+    def add(self, field, counts, sign=1):
+        # add `counts`, {user id: count}, times `sign` to `field` of the users'
+        # rows: one UPDATE per distinct count, not per task or user. Rows
+        # missing for users counted up are created, `manage.py rebuild_stats`
+        # sets right whatever went past this
+        users = defaultdict(list)
+        for user_id, count in counts.items():
+            if user_id is not None and count:
+                users[count * sign].append(user_id)
+        self._for_write = True
+        using = self.db
+        with transaction.atomic(using=using, savepoint=False):
+            for change, user_ids in users.items():
+                updated = self.using(using).filter(user_id__in=user_ids).update(**{field: F(field) + change})
+                if updated < len(user_ids) and change > 0:
+                    existing = set(self.using(using).filter(user_id__in=user_ids)
+                                   .values_list('user_id', flat=True))
+                    self.using(using).bulk_create(self.model(user_id=user_id, **{field: change})
+                                     for user_id in user_ids if user_id not in existing)
+
+
+class UserStats(models.Model):
+    # a user's chore counts, kept up to date by every write to tasks so the
+    # leaderboard reads one row per user instead of counting tasks; archived
+    # tasks still count, deleted ones don't
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                primary_key=True, related_name='chore_stats')
+    # tasks the user gave
+    given = models.IntegerField(default=0)
+    # tasks the user completed, all in time as expired tasks can't be completed
+    completed = models.IntegerField(default=0)
+
+    objects = UserStatsQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the leaderboard reads the top of (-completed, user)
+            models.Index(fields=['-completed', 'user'], name='stats_completed_idx'),
+        ]
+
+    def __str__(self):
+        return '{}: {} completed, {} given'.format(self.user, self.completed, self.given)
+
+
+class TaskChangeCounter(models.Model):
+    """
+    The one row counting changes to tasks, for delta sync.
+
+    Triggers bump `value` and stamp it on every task written and every
+    tombstone left behind, see migration 0017. They run inside the writing
+    transaction, and SQLite has one writer at a time, so stamps follow commit
+    order: a change committed after a client synced always gets a higher
+    stamp than the client's cursor, unlike its wall-clock updated_at.
+    """
+    value = models.BigIntegerField(default=0)
+    # highest stamp of the tombstones pruned so far, clients synced up to an
+    # older stamp may have missed a deletion
+    pruned = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return '{} changes, pruned up to {}'.format(self.value, self.pruned)
+
+
+class TaskTombstone(models.Model):
+    # left behind by deleted tasks so delta sync clients learn about deletions,
+    # pruned after TOMBSTONE_RETENTION_DAYS, see tasks.sync
+    task_id = models.IntegerField()
+    deleted_at = models.DateTimeField('deleted at', default=timezone.now)
+    # set by a trigger like Task.change_seq
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'task_id'], name='tombstone_deleted_at_idx'),
+            models.Index(fields=['change_seq'], name='tombstone_change_seq_idx'),
+        ]
+
+    def __str__(self):
+        return 'task {} deleted at {}'.format(self.task_id, self.deleted_at)
+
+
+class TaskReminder(models.Model):
+    # marks a task its giver was reminded of, or is being reminded of while
+    # `sent_at` is null; unique, so no two runs of `manage.py send_reminders`
+    # remind of a task twice; dropped once the task is past its due date, or
+    # when the task is given another due date or deleted
+    task_id = models.IntegerField(unique=True)
+    due_date = models.DateTimeField('due date')
+    # the run which created the marker, and when; a claim never sent is
+    # taken over by a later run once it is older than CLAIM_TIMEOUT
+    claim = models.CharField(max_length=32)
+    claimed_at = models.DateTimeField('claimed at', default=timezone.now)
+    sent_at = models.DateTimeField('sent at', blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['due_date'], name='reminder_due_date_idx'),
+            models.Index(fields=['claimed_at'], name='reminder_unsent_claim_idx',
+                         condition=Q(sent_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return 'reminder of task {}'.format(self.task_id)
+
+
+class ArchivedTask(models.Model):
+    # a task completed or expired long ago, moved out of tasks_task by
+    # `manage.py archive_tasks`; keeps the task's id and never changes again
+    id = models.IntegerField(primary_key=True)
+    caption = models.CharField(max_length=30)
+    pub_date = models.DateTimeField('date added')
+    due_date = models.DateTimeField('due date')
+    task_giver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                   related_name='archived_given_tasks')
+    task_done_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                     blank=True, null=True, related_name='archived_done_tasks')
+    task_done_date = models.DateTimeField('done date', blank=True, null=True)
+    archived_at = models.DateTimeField('archived at', default=timezone.now)
+
+    objects = StatusQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the history walks (due_date, id) backwards
+            models.Index(fields=['due_date', 'id'], name='archived_due_date_id_idx'),
+        ]
+
+    def __str__(self):
+        return '{} by {}'.format(self.caption, self.task_giver)
+
+    @property
+    def status(self):
+        # archived tasks are either done or expired for good
+        return STATUS_DONE if self.task_done_date else STATUS_EXPIRED
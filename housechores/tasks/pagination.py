@@ -0,0 +1,66 @@
+import datetime
+from collections import namedtuple
+
+from django.db.models import Q
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+KeysetPage = namedtuple('KeysetPage', [
+    'object_list', 'has_previous', 'has_next', 'previous_cursor', 'next_cursor',
+])
+
+
+def encode_cursor(moment, pk):
+    # cursor is "<moment in microseconds since epoch>_<id>", exact and url safe
+    delta = moment - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+    return '{}_{}'.format(micros, pk)
+
+
+def decode_cursor(value):
+    # return (moment, id) or None when cursor is missing or malformed
+    try:
+        micros, pk = value.split('_')
+        moment = EPOCH + datetime.timedelta(microseconds=int(micros))
+        return moment, int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def paginate(queryset, per_page, after=None, before=None, descending=False):
+    """
+    Return one KeysetPage of `queryset` ordered by (due_date, id), or by
+    (-due_date, -id) when `descending`.
+
+    Pages are addressed by the (due_date, id) of their boundary rows instead
+    of an OFFSET, so every page is a range seek on the (due_date, id) index.
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+    # lookups of the rows up to a cursor and of the rows from a cursor on
+    up_to, from_on = ('gte', 'lte') if descending else ('lte', 'gte')
+    order = ('-due_date', '-id') if descending else ('due_date', 'id')
+    reverse_order = ('due_date', 'id') if descending else ('-due_date', '-id')
+
+    if before is not None:
+        due_date, pk = before
+        rows = list(queryset.filter(**{'due_date__' + up_to: due_date})
+                    .exclude(Q(due_date=due_date) & Q(**{'pk__' + from_on: pk}))
+                    .order_by(*reverse_order)[:per_page + 1])
+        has_previous, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+    else:
+        if after is not None:
+            due_date, pk = after
+            queryset = (queryset.filter(**{'due_date__' + from_on: due_date})
+                        .exclude(Q(due_date=due_date) & Q(**{'pk__' + up_to: pk})))
+        rows = list(queryset.order_by(*order)[:per_page + 1])
+        has_previous, has_next = after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+
+    return KeysetPage(
+        object_list=rows,
+        has_previous=has_previous and bool(rows),
+        has_next=has_next and bool(rows),
+        previous_cursor=encode_cursor(rows[0].due_date, rows[0].pk) if rows else None,
+        next_cursor=encode_cursor(rows[-1].due_date, rows[-1].pk) if rows else None,
+    )
@@ -0,0 +1,118 @@
+"""
+Create the tasks of recurring chores as their due dates come near.
+
+Every RecurrenceRule keeps the due date of its next occurrence not created
+yet, and the (next_due, id) index orders the rules like a priority queue.
+The scheduler holds the head of that queue, at most `chunk_size` rules, in
+a heap: each run only looks at the rules due, never at all of them, and a
+long running scheduler sleeps until the first rule in the heap is due.
+
+An occurrence is created LOOKAHEAD ahead of its due date. Occurrences due
+while no scheduler ran for longer than that are skipped, not created late.
+"""
+import datetime
+import heapq
+import threading
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RecurrenceRule, Task
+
+LOOKAHEAD = datetime.timedelta(days=1)
+# rules held in the heap and materialized per transaction
+CHUNK_SIZE = 1000
+# seconds after which the heap is read again, picking up new and edited rules
+REFRESH_INTERVAL = 60
+
+
+class Scheduler:
+    """
+    Materialize occurrences of recurrence rules, see the module docstring.
+    """
+    def __init__(self, lookahead=LOOKAHEAD, chunk_size=CHUNK_SIZE, refresh_interval=REFRESH_INTERVAL):
+        self.lookahead = lookahead
+        self.chunk_size = chunk_size
+        self.refresh_interval = refresh_interval
+        # (next_due, rule id) of the rules due first
+        self.heap = []
+        # (next_due, id) of the last rule read, None when every rule was read
+        self.bound = None
+        self.loaded_at = None
+
+    def load(self, now):
+        # the head of the queue, straight off the (next_due, id) index
+        self.heap = list(RecurrenceRule.objects.filter(next_due__isnull=False)
+                         .order_by('next_due', 'id').values_list('next_due', 'id')[:self.chunk_size])
+        heapq.heapify(self.heap)
+        self.bound = max(self.heap) if len(self.heap) == self.chunk_size else None
+        self.loaded_at = now
+
+    def run(self, now=None):
+        """
+        Create every occurrence due by `now` + lookahead, return the number of tasks created.
+        """
+        if now is None:
+            now = timezone.now()
+        if self.loaded_at is None or (now - self.loaded_at).total_seconds() >= self.refresh_interval:
+            self.load(now)
+
+        horizon = now + self.lookahead
+        created = 0
+        while True:
+            due = []
+            while self.heap and self.heap[0][0] <= horizon and len(due) < self.chunk_size:
+                due.append(heapq.heappop(self.heap))
+            if due:
+                created += self.materialize(due, now)
+            elif self.bound is not None and self.bound[0] <= horizon:
+                # the heap ran dry, rules past the ones read may be due as well
+                self.load(now)
+                if not self.heap or self.heap[0][0] > horizon:
+                    return created
+            else:
+                return created
+
+    def materialize(self, due, now):
+        horizon = now + self.lookahead
+        with transaction.atomic():
+            rules = RecurrenceRule.objects.in_bulk([rule_id for next_due, rule_id in due])
+            tasks, changed = [], []
+            for next_due, rule_id in due:
+                rule = rules.get(rule_id)
+                # deleted or edited since it was read, the next load has it right
+                if rule is None or rule.next_due != next_due:
+                    continue
+                while rule.next_due is not None and rule.next_due <= horizon:
+                    if rule.next_due >= now:
+                        tasks.append(Task(caption=rule.caption, pub_date=now, due_date=rule.next_due,
+                                          task_giver_id=rule.task_giver_id, recurrence=rule))
+                    rule.next_due = rule.following(rule.next_due)
+                changed.append(rule)
+            Task.objects.bulk_create(tasks)
+            RecurrenceRule.objects.bulk_update(changed, ['next_due'])
+
+        for rule in changed:
+            # back in line, unless it is now past the rules read
+            if rule.next_due is not None and (self.bound is None or (rule.next_due, rule.pk) <= self.bound):
+                heapq.heappush(self.heap, (rule.next_due, rule.pk))
+        return len(tasks)
+
+    def seconds_to_next(self, now):
+        # until the first rule in the heap is due, or the heap is read again
+        wait = self.refresh_interval - (now - self.loaded_at).total_seconds()
+        if self.heap:
+            wait = min(wait, (self.heap[0][0] - self.lookahead - now).total_seconds())
+        return max(wait, 0)
+
+    def run_forever(self, stop=None, on_run=None):
+        """
+        Run whenever a rule is due until `stop`, a threading.Event, is set.
+        """
+        if stop is None:
+            stop = threading.Event()
+        while not stop.is_set():
+            created = self.run()
+            if on_run is not None:
+                on_run(created)
+            stop.wait(self.seconds_to_next(timezone.now()))
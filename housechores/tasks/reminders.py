@@ -0,0 +1,141 @@
+"""
+Email task givers about their open tasks due soon.
+
+Tasks entering the window before their due date are read in (due_date, id)
+order off the index of open tasks, a batch at a time. Every batch is first
+claimed with a TaskReminder marker per task, unique on the task id, then
+sent as one email per task giver by a bounded pool of workers, each
+holding one connection to the email backend. A task with a marker is never
+reminded of again, unless its due date changes; the markers of emails which
+failed are removed, so the next run tries those again. A run dying between
+claiming and sending leaves its reminders unsent for CLAIM_TIMEOUT, after
+which the next run takes them over; that run is assumed dead by then, rather
+than still sending.
+"""
+import datetime
+import logging
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Task, TaskReminder
+
+REMINDER_WINDOW = datetime.timedelta(hours=24)
+# tasks claimed per transaction, a task giver gets one email per batch
+REMINDER_BATCH_SIZE = 500
+# emails sent at once, each worker keeps its own connection to the backend
+REMINDER_WORKERS = 4
+# unsent claims older than this are left by a run which died, and reclaimed
+CLAIM_TIMEOUT = datetime.timedelta(minutes=30)
+
+logger = logging.getLogger(__name__)
+
+
+def due_soon(now, window, after=None):
+    """
+    Return the open tasks due within `window` from `now`, not reminded of
+    yet and with an email to send to, ordered by (due_date, id) from `after` on.
+    """
+    tasks = (Task.objects.filter(task_done_date__isnull=True, due_date__gte=now, due_date__lt=now + window)
+             .exclude(task_giver__email='')
+             .exclude(pk__in=TaskReminder.objects.values('task_id')))
+    if after is not None:
+        due_date, pk = after
+        tasks = tasks.filter(due_date__gte=due_date).exclude(Q(due_date=due_date) & Q(pk__lte=pk))
+    return tasks.select_related('task_giver').order_by('due_date', 'id')
+
+
+def claim(tasks):
+    """
+    Create the markers of `tasks`, return those no other run claimed first.
+    """
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        TaskReminder.objects.bulk_create(
+            (TaskReminder(task_id=task.pk, due_date=task.due_date, claim=token) for task in tasks),
+            ignore_conflicts=True)
+        claimed = set(TaskReminder.objects.filter(task_id__in=[task.pk for task in tasks], claim=token)
+                      .values_list('task_id', flat=True))
+    return [task for task in tasks if task.pk in claimed]
+
+
+def reminder_email(template, user, tasks):
+    if len(tasks) == 1:
+        subject = '{} is due soon'.format(tasks[0].caption)
+    else:
+        subject = '{} chores are due soon'.format(len(tasks))
+    body = template.render({'user': user, 'tasks': tasks})
+    return EmailMessage(subject, body, to=[user.email])
+
+
+def send_all(emails):
+    # one worker's share: every email over a single connection, returns the
+    # task ids of the emails sent; a failed email does not stop the others
+    sent = []
+    connection = get_connection()
+    try:
+        connection.open()
+        for task_ids, email in emails:
+            try:
+                if connection.send_messages([email]):
+                    sent += task_ids
+            except Exception:
+                logger.exception('Reminder to %s failed', email.to[0])
+    except Exception:
+        logger.exception('Could not connect to the email backend')
+    finally:
+        connection.close()
+    return sent
+
+
+def send_batch(tasks, executor, workers):
+    """
+    Claim `tasks` and email them to their task givers, return the number of
+    emails and tasks sent.
+    """
+    by_user = defaultdict(list)
+    for task in claim(tasks):
+        by_user[task.task_giver].append(task)
+    # compiled once, templates are only cached when not DEBUG
+    template = get_template('tasks/reminder_email.txt')
+    emails = [([task.pk for task in user_tasks], reminder_email(template, user, user_tasks))
+              for user, user_tasks in by_user.items()]
+
+    sent = set()
+    shares = [emails[i::workers] for i in range(min(workers, len(emails)))]
+    for task_ids in executor.map(send_all, shares):
+        sent.update(task_ids)
+    claimed = [task_id for task_ids, email in emails for task_id in task_ids]
+    with transaction.atomic():
+        TaskReminder.objects.filter(task_id__in=sent).update(sent_at=timezone.now())
+        TaskReminder.objects.filter(task_id__in=[pk for pk in claimed if pk not in sent]).delete()
+    return sum(1 for task_ids, email in emails if task_ids[0] in sent), len(sent)
+
+
+def send_reminders(window=REMINDER_WINDOW, batch_size=REMINDER_BATCH_SIZE, workers=REMINDER_WORKERS, now=None):
+    """
+    Remind task givers of their open tasks due within `window`, batch by
+    batch. Yields the number of emails and of tasks sent by every batch.
+    """
+    if now is None:
+        now = timezone.now()
+    # markers of tasks past their due date can't match again
+    TaskReminder.objects.filter(due_date__lt=now).delete()
+    TaskReminder.objects.filter(sent_at__isnull=True, claimed_at__lt=now - CLAIM_TIMEOUT).delete()
+
+    with ThreadPoolExecutor(workers) as executor:
+        after = None
+        while True:
+            tasks = list(due_soon(now, window, after)[:batch_size])
+            if not tasks:
+                return
+            yield send_batch(tasks, executor, workers)
+            if len(tasks) < batch_size:
+                return
+            after = tasks[-1].due_date, tasks[-1].pk
@@ -0,0 +1,84 @@
+"""
+Full-text search over task captions and task givers' usernames.
+
+Tasks are found through the tasks_task_search FTS5 table, see migration
+0012. Ranking means scoring every match, which takes long for words found
+in hundreds of thousands of tasks; so only the newest SEARCH_LIMIT matches
+are ranked. Those are read walking the index backwards by task id, and
+cost the same however common a word is.
+"""
+import re
+from collections import namedtuple
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import Task
+
+TABLE = 'tasks_task_search'
+# newest matches ranked per search, the results end after SEARCH_LIMIT tasks
+SEARCH_LIMIT = 500
+# words used from a query, the rest is ignored
+MAX_WORDS = 10
+WORD = re.compile(r'\w+')
+
+SearchPage = namedtuple('SearchPage', [
+    'object_list', 'number', 'has_previous', 'has_next', 'previous_page', 'next_page',
+])
+
+
+def match_expression(text):
+    """
+    Return the FTS5 query matching tasks with every word of `text` as a
+    prefix, or '' when `text` has no words. FTS5 syntax is not passed through.
+    """
+    words = WORD.findall(text)[:MAX_WORDS]
+    return ' '.join('"{}"*'.format(word) for word in words)
+
+
+def search(queryset, text, per_page, number=1):
+    """
+    Return page `number` of the tasks of `queryset` matching `text`, best match first.
+    """
+    expression = match_expression(text)
+    if not expression:
+        return SearchPage([], 1, False, False, None, None)
+
+    table = Task._meta.db_table
+    candidates = (queryset.order_by().extra(
+        tables=[TABLE],
+        where=['{}.rowid = {}.id'.format(TABLE, table), '{} MATCH %s'.format(TABLE)],
+        params=[expression],
+        select={'search_rank': '{}.rank'.format(TABLE)},
+        order_by=['-{}.rowid'.format(TABLE)],
+    ).values_list('pk', 'search_rank')[:SEARCH_LIMIT])
+    # lower bm25 ranks are better, newer tasks first among equals
+    ranked = [pk for pk, rank in sorted(candidates, key=lambda candidate: (candidate[1], -candidate[0]))]
+
+    start = (number - 1) * per_page
+    page_ids = ranked[start:start + per_page]
+    tasks = {task.pk: task for task in queryset.filter(pk__in=page_ids)}
+    has_next = len(ranked) > start + per_page
+    return SearchPage(
+        object_list=[tasks[pk] for pk in page_ids if pk in tasks],
+        number=number,
+        has_previous=number > 1,
+        has_next=has_next,
+        previous_page=number - 1 if number > 1 else None,
+        next_page=number + 1 if has_next else None,
+    )
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """
+    Fill the search index anew from the tasks table, return the number of tasks indexed.
+    """
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(TABLE))
+        cursor.execute(
+            'INSERT INTO {}(rowid, caption, task_giver) '
+            'SELECT tasks_task.id, tasks_task.caption, auth_user.username '
+            'FROM tasks_task JOIN auth_user ON auth_user.id = tasks_task.task_giver_id'.format(TABLE))
+        indexed = cursor.rowcount
+        # merge the index into a single b-tree, searches read fewer pages
+        cursor.execute("INSERT INTO {0}({0}) VALUES ('optimize')".format(TABLE))
+    return indexed
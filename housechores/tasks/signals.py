@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .events import EVENT_CREATED, EVENT_UPDATED, EVENT_DELETED, publish
+from .models import Task, TaskReminder, TaskTombstone, UserStats
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def task_changed(sender, **kwargs):
+    bump_version()
+
+
+@receiver(post_delete, sender=Task)
+def leave_tombstone(sender, instance, using, **kwargs):
+    TaskTombstone.objects.using(using).create(task_id=instance.pk)
+
+
+@receiver(post_save, sender=Task)
+def publish_saved(sender, instance, created, **kwargs):
+    publish(EVENT_CREATED if created else EVENT_UPDATED, [instance.pk])
+
+
+@receiver(post_delete, sender=Task)
+def publish_deleted(sender, instance, **kwargs):
+    publish(EVENT_DELETED, [instance.pk])
+
+
+@receiver(post_save, sender=Task)
+def count_saved(sender, instance, created, using, **kwargs):
+    # the stats live in the database the task was written to
+    if created:
+        UserStats.objects.using(using).add('given', {instance.task_giver_id: 1})
+
+
+@receiver(post_delete, sender=Task)
+def count_deleted(sender, instance, using, **kwargs):
+    UserStats.objects.using(using).add('given', {instance.task_giver_id: 1}, -1)
+    UserStats.objects.using(using).add('completed', {instance.task_done_by_id: 1}, -1)
+
+
+@receiver(post_save, sender=Task)
+def forget_reminder(sender, instance, created, using, raw=False, **kwargs):
+    # a task given another due date is reminded of again before that one
+    if not created and not raw:
+        TaskReminder.objects.using(using).filter(task_id=instance.pk).exclude(due_date=instance.due_date).delete()
+
+
+@receiver(post_delete, sender=Task)
+def drop_reminder(sender, instance, using, **kwargs):
+    TaskReminder.objects.using(using).filter(task_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def start_stats(sender, instance, created, using, raw=False, **kwargs):
+    # so counting a new user's chores is a single UPDATE
+    if created and not raw:
+        UserStats.objects.using(using).create(user=instance)
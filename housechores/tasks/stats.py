@@ -0,0 +1,53 @@
+"""
+Per-user chore statistics, see UserStats.
+
+Every write to tasks updates its users' rows, so the leaderboard reads one
+row per user however many tasks there are. rebuild() counts everything
+again from the tasks and the archive, setting right any drift, e.g. from
+writes made straight to the database.
+"""
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+
+from .models import ArchivedTask, Task, UserStats
+
+LEADERBOARD_SIZE = 50
+
+
+def count(using=DEFAULT_DB_ALIAS):
+    """
+    Return the {user id: (given, completed)} counts of every user with tasks, counted afresh.
+    """
+    given, completed = Counter(), Counter()
+    for model in (Task, ArchivedTask):
+        tasks = model.objects.using(using).order_by()
+        given.update(dict(tasks.values_list('task_giver').annotate(Count('pk'))))
+        completed.update(dict(tasks.filter(task_done_by__isnull=False)
+                              .values_list('task_done_by').annotate(Count('pk'))))
+    return {user_id: (given[user_id], completed[user_id]) for user_id in given.keys() | completed.keys()}
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """
+    Replace every user's stats with counts taken afresh, return the number
+    of users whose stats were wrong and the number of users counted.
+    """
+    with transaction.atomic(using=using):
+        counts = count(using)
+        stats = UserStats.objects.using(using)
+        old = {user_id: (given, completed) for user_id, given, completed
+               in stats.values_list('user_id', 'given', 'completed')}
+        wrong = sum(1 for user_id in counts.keys() | old.keys() if counts.get(user_id, (0, 0)) != old.get(user_id))
+        stats.all().delete()
+        stats.bulk_create(UserStats(user_id=user_id, given=given, completed=completed)
+                          for user_id, (given, completed) in counts.items())
+    return wrong, len(counts)
+
+
+def leaderboard(limit=LEADERBOARD_SIZE):
+    """
+    Return the stats of the `limit` users who completed most chores, off the (-completed, user) index.
+    """
+    return UserStats.objects.select_related('user').order_by('-completed', 'user_id')[:limit]
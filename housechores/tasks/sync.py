@@ -0,0 +1,102 @@
+import datetime
+import heapq
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Task, TaskChangeCounter, TaskTombstone
+
+CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 1000
+# clients which don't sync for this long get all tasks again instead of a delta
+TOMBSTONE_RETENTION_DAYS = 90
+
+
+def serialize_task(task):
+    return {
+        'id': task.pk,
+        'caption': task.caption,
+        'task_giver': task.task_giver.username,
+        'task_done_by': task.task_done_by.username if task.task_done_by else None,
+        'pub_date': task.pub_date.isoformat(),
+        'due_date': task.due_date.isoformat(),
+        'task_done_date': task.task_done_date.isoformat() if task.task_done_date else None,
+        'updated_at': task.updated_at.isoformat(),
+    }
+
+
+def decode_sequence(value):
+    # return the change_seq of a cursor, or None when it is malformed;
+    # int() alone would take the old "<moment>_<id>" cursors for numbers
+    if not isinstance(value, str) or not (value.isascii() and value.isdigit()):
+        return None
+    return int(value)
+
+
+def changes_since(cursor, limit=CHANGES_LIMIT):
+    """
+    Return tasks changed and ids of tasks deleted after `cursor`.
+
+    Both streams are read in change_seq order from their own index, at most
+    `limit + 1` rows each, and merged; the returned cursor is the change_seq
+    of the last change included, so work is proportional to the number of
+    changes. When the cursor can't be served, because it is malformed or
+    tombstones it needs were pruned, changes are returned from the start
+    with `reset` set: the client drops its tasks before applying them.
+    """
+    seq = decode_sequence(cursor)
+    reset = bool(cursor) and (
+        seq is None or seq < (TaskChangeCounter.objects.values_list('pruned', flat=True).first() or 0))
+    if reset:
+        seq = None
+
+    tasks = Task.objects.select_related('task_giver', 'task_done_by')
+    tombstones = TaskTombstone.objects.all()
+    if seq is not None:
+        tasks, tombstones = tasks.filter(change_seq__gt=seq), tombstones.filter(change_seq__gt=seq)
+    tasks = tasks.order_by('change_seq')[:limit + 1]
+    tombstones = tombstones.order_by('change_seq')[:limit + 1]
+
+    changes = heapq.merge(
+        ((task.change_seq, task.pk, task) for task in tasks),
+        ((tombstone.change_seq, tombstone.task_id, None) for tombstone in tombstones),
+        key=lambda change: change[0],
+    )
+    changes = list(islice(changes, limit + 1))
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    result = {
+        'tasks': [serialize_task(task) for change_seq, pk, task in changes if task is not None],
+        'deleted': [pk for change_seq, pk, task in changes if task is None],
+        'has_more': has_more,
+        'reset': reset,
+    }
+    if changes:
+        result['cursor'] = str(changes[-1][0])
+    else:
+        result['cursor'] = str(seq) if seq is not None else None
+    return result
+
+
+def prune_tombstones(days=TOMBSTONE_RETENTION_DAYS, now=None):
+    """
+    Delete tombstones older than `days` days, return the number deleted.
+
+    Clients which last synced before the newest of them are sent all tasks
+    again with `reset`, see changes_since().
+    """
+    if now is None:
+        now = timezone.now()
+    with transaction.atomic():
+        old = TaskTombstone.objects.filter(deleted_at__lt=now - datetime.timedelta(days=days))
+        pruned = old.aggregate(pruned=Max('change_seq'))['pruned']
+        if pruned is None:
+            return 0
+        counter, created = TaskChangeCounter.objects.get_or_create(pk=1)
+        if counter.pruned < pruned:
+            counter.pruned = pruned
+            counter.save(update_fields=['pruned'])
+        return old.filter(change_seq__lte=pruned).delete()[0]
@@ -1,10 +1,49 @@
-from django.test import TestCase
+from asgiref.sync import SyncToAsync, async_to_sync, sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.core import mail
+from django.core.cache import cache
 from django.urls import reverse
 from .models import Task
 from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
 from django.utils import timezone
+import asyncio
 import datetime
+import gzip
+import inspect
+import io
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock, skipIf
+from django.core.management import call_command, CommandError
+from django.urls import resolve
+from django.utils.http import urlencode
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.template.loader import get_template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from .views import IndexView
+from . import cache as board_cache
+from . import archiving, benchmarking, events, importing, recurrence, reminders, search, stats, sync
+from .async_views import EventStreamMiddleware, StreamingASGIHandler
+from housechores import compression, metrics, staticfiles
+from housechores.minify import minify
+from housechores.testing import QueryBudgetMixin
+from housechores.routers import COOKIE_NAME
+from .models import STATUS_OPEN, STATUS_EXPIRED, STATUS_DONE, RESULT_COMPLETED, ArchivedTask, TaskTombstone
+from .models import FREQUENCY_DAILY, FREQUENCY_WEEKLY, FREQUENCY_MONTHLY, RecurrenceRule, TaskReminder, UserStats
 
 COMPLETE_BUTTON = 'class="btn btn-primary my-2"'
 DELETE_BUTTON = 'class="btn btn-danger my-2"'
@@ -19,31 +58,42 @@ def create_user(superuser=False):
         return User.objects.create_user(username='testuser', password='12345')
 
 
+def get_user(username):
+    """
+    Return user with given username, creating it when missing
+    """
+    return User.objects.get_or_create(username=username)[0]
+
+
 def create_task(text, status):
     """
     Create completed(status='completed'), uncompleted(status='uncompleted')
-    or expired(status='expired') task
+    or expired(status='expired') task given (and completed) by user named `text`
     Order in queryset(by due_date):
     completed(now-10days), expired(now-5days), uncompleted(now+10days)
     """
+    user = get_user(text)
     pub_date = timezone.now() - datetime.timedelta(days=10)
     if status == 'completed':
         due_date = pub_date
         return Task.objects.create(caption=text, pub_date=pub_date,
-                                   due_date=due_date, task_giver=text,
-                                   task_done_by=text, task_done_date=timezone.now())
+                                   due_date=due_date, task_giver=user,
+                                   task_done_by=user, task_done_date=timezone.now())
     elif status == 'uncompleted':
         due_date = timezone.now() + datetime.timedelta(days=10)
         return Task.objects.create(caption=text, pub_date=pub_date,
-                                   due_date=due_date, task_giver=text)
+                                   due_date=due_date, task_giver=user)
     elif status == 'expired':
         due_date = timezone.now() - datetime.timedelta(days=5)
         return Task.objects.create(caption=text, pub_date=pub_date,
-                                   due_date=due_date, task_giver=text)
+                                   due_date=due_date, task_giver=user)
 
 
 # IndexView tests
 class IndexViewTests(TestCase):
+    def setUp(self):
+        # rendered boards outlive the rolled back test database
+        cache.clear()
 
     def test_display_no_tasks(self):
         """
@@ -247,183 +297,2753 @@ class IndexViewTests(TestCase):
         self.assertNotContains(response, DELETE_BUTTON)
 
 
-# complete_task tests
-class CompleteTaskViewTests(TestCase):
-    def test_not_logged_user_complete_task(self):
+# IndexView owner filter tests
+class IndexViewOwnerFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        create_task('a', 'completed')
+        create_task('testuser', 'uncompleted')
+        done = create_task('b', 'uncompleted')
+        Task.objects.complete(done.id, self.user)
+
+    def test_created_by_me(self):
         """
-        Not logged user cannot complete tasks.
+        mine=created shows only tasks given by current user
         """
-        task = create_task('a', 'uncompleted')
-        self.client.post(reverse('tasks:complete_task', args=(task.id,)))
+        response = self.client.get(reverse('tasks:index'), {'mine': 'created'})
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: testuser by testuser>'])
 
-        task_check = get_object_or_404(Task, pk=task.id)
-        self.assertEqual(task_check.task_done_by, '')
-        self.assertIsNone(task_check.task_done_date)
+    def test_completed_by_me(self):
+        """
+        mine=completed shows only tasks completed by current user
+        """
+        response = self.client.get(reverse('tasks:index'), {'mine': 'completed'})
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: b by b>'])
 
-    def test_complete_uncompleted_task(self):
+    def test_single_task_query(self):
         """
-        Logged user can complete uncompleted tasks.
+        Task givers and completers are joined into the single task query
         """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('tasks:index'))
+
+        self.assertContains(response, 'done by testuser')
+        # board validator and the page itself
+        task_queries = [q['sql'] for q in queries if 'tasks_task' in q['sql']]
+        self.assertEqual(len(task_queries), 2)
+        self.assertIn('JOIN "auth_user"', task_queries[1])
+
+
+# IndexView status filter tests
+class IndexViewStatusFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
         self.user = create_user()
         self.client.login(username='testuser', password='12345')
 
-        task = create_task('a', 'uncompleted')
-        self.client.post(reverse('tasks:complete_task', args=(task.id,)))
+        create_task('a', 'completed')
+        create_task('b', 'uncompleted')
+        create_task('c', 'expired')
 
-        task_check = get_object_or_404(Task, pk=task.id)
-        self.assertEqual(task_check.task_done_by, self.user.username)
-        self.assertIsNotNone(task_check.task_done_date)
+    def test_filter_open(self):
+        """
+        status=open shows only uncompleted tasks that are not expired
+        """
+        response = self.client.get(reverse('tasks:index'), {'status': 'open'})
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: b by b>'])
 
-    def test_complete_completed_task(self):
+    def test_filter_expired(self):
         """
-        Logged user cannot complete completed tasks.
+        status=expired shows only expired tasks
+        """
+        response = self.client.get(reverse('tasks:index'), {'status': 'expired'})
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: c by c>'])
+
+    def test_filter_done(self):
+        """
+        status=done shows only completed tasks
+        """
+        response = self.client.get(reverse('tasks:index'), {'status': 'done'})
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: a by a>'])
+
+    def test_unknown_status(self):
         """
+        Unknown status shows all tasks
+        """
+        response = self.client.get(reverse('tasks:index'), {'status': 'foo'})
+        self.assertEqual(len(response.context['task_list']), 3)
+
+    def test_status_annotation(self):
+        """
+        Every listed task carries its status computed by the database
+        """
+        response = self.client.get(reverse('tasks:index'))
+        self.assertEqual([task.status for task in response.context['task_list']],
+                         [STATUS_DONE, STATUS_EXPIRED, STATUS_OPEN])
+
+
+# IndexView board cache tests
+class IndexViewCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
         self.user = create_user()
         self.client.login(username='testuser', password='12345')
 
-        task = create_task('a', 'completed')
+    def task_queries(self):
+        # queries for the page itself, the board validator is always run
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('tasks:index'))
+        return response, [q for q in queries if 'tasks_task' in q['sql']][1:]
+
+    def test_board_served_from_cache(self):
+        """
+        Second request renders the board without querying tasks
+        """
+        create_task('a', 'completed')
+        self.task_queries()
+
+        response, queries = self.task_queries()
+        self.assertEqual(queries, [])
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: a by a>'])
+
+    def test_changes_invalidate_board(self):
+        """
+        Creating, completing and deleting tasks show up on the next request
+        """
+        task = create_task('testuser', 'uncompleted')
+        self.task_queries()
+
         self.client.post(reverse('tasks:complete_task', args=(task.id,)))
+        response, queries = self.task_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, 'done by testuser')
 
-        task_check = get_object_or_404(Task, pk=task.id)
-        self.assertEqual(task_check.task_done_by, 'a')
-        self.assertEqual(task_check.task_done_date, task.task_done_date)
+        self.client.post(reverse('tasks:delete_task', args=(task.id,)))
+        response, queries = self.task_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertQuerysetEqual(response.context['task_list'], [])
 
-    def test_complete_expired_task(self):
+    def test_delete_button_per_user(self):
         """
-        Logged user cannot complete expired tasks.
+        Users sharing a cached board only see delete buttons they may use
         """
+        create_task('testuser', 'completed')
+        response = self.client.get(reverse('tasks:index'))
+        self.assertContains(response, DELETE_BUTTON)
+
+        User.objects.create_user(username='other', password='12345')
+        self.client.login(username='other', password='12345')
+        response, queries = self.task_queries()
+        self.assertEqual(queries, [])
+        self.assertNotContains(response, DELETE_BUTTON)
+        self.assertContains(response, 'Welcome other')
+
+    def test_board_expires_with_first_open_task(self):
+        """
+        Board is kept only until the first open task on it expires
+        """
+        task = create_task('a', 'uncompleted')
+        Task.objects.filter(pk=task.pk).update(
+            due_date=timezone.now() + datetime.timedelta(seconds=30))
+
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.client.get(reverse('tasks:index'))
+
+        timeout = cache_set.call_args[0][2]
+        self.assertLessEqual(timeout, 30)
+
+
+# IndexView conditional GET tests
+class IndexViewConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
         self.user = create_user()
         self.client.login(username='testuser', password='12345')
+        self.task = create_task('a', 'uncompleted')
 
-        task = create_task('a', 'expired')
-        self.client.post(reverse('tasks:complete_task', args=(task.id,)))
+    def test_validators_sent(self):
+        """
+        Board is sent with ETag and Last-Modified and must be revalidated
+        """
+        response = self.client.get(reverse('tasks:index'))
 
-        task_check = get_object_or_404(Task, pk=task.id)
-        self.assertEqual(task_check.task_done_by, '')
-        self.assertIsNone(task_check.task_done_date)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
 
+    def test_unchanged_board_not_modified(self):
+        """
+        Unchanged board is answered with 304 without rendering anything
+        """
+        etag = self.client.get(reverse('tasks:index'))['ETag']
 
-# delete_task tests
-class DeleteTaskViewTests(TestCase):
-    def test_not_logged_user_delete_task(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('tasks:index'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response.templates, [])
+        self.assertEqual(len([q for q in queries if 'tasks_task' in q['sql']]), 1)
+
+    def test_if_modified_since(self):
         """
-        Not logged user cannot delete tasks.
+        If-Modified-Since is answered with 304 until tasks change
         """
-        task = create_task('a', 'uncompleted')
-        self.client.post(reverse('tasks:delete_task', args=(task.id,)))
+        last_modified = self.client.get(reverse('tasks:index'))['Last-Modified']
+        response = self.client.get(reverse('tasks:index'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
 
-        self.assertEqual(Task.objects.count(), 1)
+    def test_changed_board_modified(self):
+        """
+        Any change to tasks makes the board modified
+        """
+        etag = self.client.get(reverse('tasks:index'))['ETag']
+        Task.objects.complete(self.task.id, self.user)
 
-    def test_user_delete_not_owned_task(self):
+        response = self.client.get(reverse('tasks:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'done by testuser')
+
+    def test_expired_task_modifies_board(self):
         """
-        User cannot delete not owned task
+        Task expiring without any write makes the board modified
         """
-        self.user = create_user()
+        etag = self.client.get(reverse('tasks:index'))['ETag']
+
+        later = timezone.now() + datetime.timedelta(days=11)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            response = self.client.get(reverse('tasks:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_per_user(self):
+        """
+        Users see different delete buttons, so they get different ETags
+        """
+        etag = self.client.get(reverse('tasks:index'))['ETag']
+
+        User.objects.create_user(username='other', password='12345')
+        self.client.login(username='other', password='12345')
+        response = self.client.get(reverse('tasks:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_per_session(self):
+        """
+        Logging in again rotates the CSRF token the board carries, so it gets another ETag
+        """
+        etag = self.client.get(reverse('tasks:index'))['ETag']
+        self.assertEqual(self.client.get(reverse('tasks:index'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.logout()
         self.client.login(username='testuser', password='12345')
+        response = self.client.get(reverse('tasks:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
 
-        task = create_task('a', 'uncompleted')
-        self.client.post(reverse('tasks:delete_task', args=(task.id,)))
+    def test_pending_message_not_cached(self):
+        """
+        Board carrying a flash message is always rendered
+        """
+        etag = self.client.get(reverse('tasks:index'))['ETag']
+        self.client.post(reverse('tasks:complete_task', args=(999,)))
+        response = self.client.get(reverse('tasks:index'), HTTP_IF_NONE_MATCH=etag)
 
-        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'This task can no longer be completed.')
 
-    def test_user_delete_owned_task(self):
+
+# board cache stampede protection tests
+class GetOrBuildTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_build_once(self):
         """
-        User can delete owned task
+        Value is built once and then served from cache
+        """
+        build = mock.Mock(return_value=('value', 60))
+
+        self.assertEqual(board_cache.get_or_build('key', build), 'value')
+        self.assertEqual(board_cache.get_or_build('key', build), 'value')
+        self.assertEqual(build.call_count, 1)
+
+    def test_serve_current_value_while_rebuilding(self):
+        """
+        While another request refreshes an entry, the current value is served
         """
+        board_cache.get_or_build('key', lambda: ('old', 60))
+        cache.add('key:lock', 1)
+
+        with mock.patch.object(board_cache, 'EARLY_RECOMPUTE_BETA', 10 ** 9):
+            value = board_cache.get_or_build('key', lambda: ('new', 60))
+        self.assertEqual(value, 'old')
+
+    @mock.patch.object(board_cache, 'LOCK_WAIT', 0.1)
+    def test_wait_for_rebuild(self):
+        """
+        Without a cached value, requests wait for the lock holder and then build
+        """
+        cache.add('key:lock', 1)
+        build = mock.Mock(return_value=('value', 60))
+
+        self.assertEqual(board_cache.get_or_build('key', build), 'value')
+        self.assertEqual(build.call_count, 1)
+        # the lock still belongs to its holder
+        self.assertEqual(cache.get('key:lock'), 1)
+
+    def test_version_bump(self):
+        """
+        Task changes bump the table version
+        """
+        version = board_cache.get_version()
+        create_task('a', 'uncompleted')
+        self.assertGreater(board_cache.get_version(), version)
+
+
+# IndexView keyset pagination tests
+@mock.patch.object(IndexView, 'page_size', 2)
+class IndexViewPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
         self.user = create_user()
         self.client.login(username='testuser', password='12345')
 
-        task = create_task('testuser', 'uncompleted')
-        self.client.post(reverse('tasks:delete_task', args=(task.id,)))
+        # 'a' and 'b' share a due_date, ties are broken by id
+        due_date = timezone.now() + datetime.timedelta(days=1)
+        for caption in 'ab':
+            Task.objects.create(caption=caption, pub_date=timezone.now(),
+                                due_date=due_date, task_giver=get_user(caption))
+        for days, caption in enumerate('cde', start=2):
+            Task.objects.create(caption=caption, pub_date=timezone.now(),
+                                due_date=timezone.now() + datetime.timedelta(days=days),
+                                task_giver=get_user(caption))
+
+    def test_first_page(self):
+        """
+        First page holds the earliest tasks and links only to the next page
+        """
+        response = self.client.get(reverse('tasks:index'))
 
-        self.assertEqual(Task.objects.count(), 0)
+        self.assertQuerysetEqual(response.context['task_list'],
+                                 ['<Task: a by a>', '<Task: b by b>'])
+        self.assertFalse(response.context['page'].has_previous)
+        self.assertTrue(response.context['page'].has_next)
 
-    def test_superuser_delete_not_owned_task(self):
+    def test_walk_forward_and_back(self):
         """
-        Superuser can delete not owned task
+        Next and previous cursors walk the whole table without gaps
         """
-        self.user = create_user(superuser=True)
-        self.client.login(username='testuser', password='12345')
+        page = self.client.get(reverse('tasks:index')).context['page']
+        response = self.client.get(reverse('tasks:index'), {'after': page.next_cursor})
+        self.assertQuerysetEqual(response.context['task_list'],
+                                 ['<Task: c by c>', '<Task: d by d>'])
 
-        task = create_task('a', 'uncompleted')
-        self.client.post(reverse('tasks:delete_task', args=(task.id,)))
+        page = response.context['page']
+        response = self.client.get(reverse('tasks:index'), {'after': page.next_cursor})
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: e by e>'])
+        self.assertFalse(response.context['page'].has_next)
 
-        self.assertEqual(Task.objects.count(), 0)
+        page = response.context['page']
+        response = self.client.get(reverse('tasks:index'), {'before': page.previous_cursor})
+        self.assertQuerysetEqual(response.context['task_list'],
+                                 ['<Task: c by c>', '<Task: d by d>'])
+        self.assertTrue(response.context['page'].has_previous)
 
+    def test_invalid_cursor(self):
+        """
+        Malformed cursor falls back to the first page
+        """
+        response = self.client.get(reverse('tasks:index'), {'after': 'garbage'})
 
-# create_task tests
-class CreateTaskViewTests(TestCase):
-    def test_not_logged_user_create_task(self):
+        self.assertEqual(response.status_code, 200)
+        self.assertQuerysetEqual(response.context['task_list'],
+                                 ['<Task: a by a>', '<Task: b by b>'])
+
+    def test_no_offset_scan(self):
         """
-        Not logged user cannot create tasks.
+        Pages are fetched with LIMIT only, never with OFFSET
         """
-        caption = 'a'
-        date = timezone.now()
-        self.client.post(reverse('tasks:create_task'), {'caption': caption, 'due_date': date})
+        page = self.client.get(reverse('tasks:index')).context['page']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('tasks:index'), {'after': page.next_cursor})
 
-        self.assertEqual(Task.objects.count(), 0)
+        # board validator and the page itself
+        task_queries = [q['sql'] for q in queries if 'tasks_task' in q['sql']]
+        self.assertEqual(len(task_queries), 2)
+        for sql in task_queries:
+            self.assertIn('LIMIT', sql)
+            self.assertNotIn('OFFSET', sql)
 
-    def test_logged_user_create_task(self):
+
+class ArchiveTasksTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+        now = timezone.now()
+
+        def add(caption, due_days, done_days=None):
+            return Task.objects.create(
+                caption=caption, pub_date=now - datetime.timedelta(days=100),
+                due_date=now + datetime.timedelta(days=due_days), task_giver=self.user,
+                task_done_by=self.user if done_days is not None else None,
+                task_done_date=now + datetime.timedelta(days=done_days) if done_days is not None else None)
+
+        self.old_expired = add('old expired', -40)
+        self.old_done = add('old done', 10, done_days=-50)
+        add('recent expired', -5)
+        add('recent done', -20, done_days=-25)
+        add('open', 5)
+
+    def archive(self, *args):
+        out = io.StringIO()
+        call_command('archive_tasks', *args, stdout=out)
+        return out.getvalue()
+
+    def test_archived(self):
         """
-        Logged user can create tasks.
+        Tasks completed or expired more than --days ago move to the archive, with tombstones
+        """
+        version = board_cache.get_version()
+        self.assertIn('Archived 2 tasks', self.archive('--days', '30'))
+
+        self.assertQuerysetEqual(Task.objects.order_by('caption'),
+                                 ['<Task: open by testuser>', '<Task: recent done by testuser>',
+                                  '<Task: recent expired by testuser>'])
+        archived = ArchivedTask.objects.order_by('caption')
+        self.assertEqual([(task.pk, task.caption, task.status) for task in archived], [
+            (self.old_done.pk, 'old done', STATUS_DONE), (self.old_expired.pk, 'old expired', STATUS_EXPIRED)])
+        self.assertEqual(archived[0].task_done_by, self.user)
+        self.assertEqual(archived[0].due_date, self.old_done.due_date)
+        self.assertEqual(set(TaskTombstone.objects.values_list('task_id', flat=True)),
+                         {self.old_done.pk, self.old_expired.pk})
+        self.assertNotEqual(board_cache.get_version(), version)
+
+    def test_repeatable(self):
         """
+        Batches carry on where they stopped, rows archived before are kept as they are
+        """
+        ArchivedTask.objects.create(id=self.old_done.pk, caption='archived before', pub_date=timezone.now(),
+                                    due_date=timezone.now(), task_giver=self.user)
+        self.assertIn('Archived 3 tasks', self.archive('--days', '10', '--batch-size', '1'))
+        self.assertIn('Archived 0 tasks', self.archive('--days', '10'))
+
+        self.assertQuerysetEqual(Task.objects.order_by('caption'),
+                                 ['<Task: open by testuser>', '<Task: recent expired by testuser>'])
+        self.assertEqual(ArchivedTask.objects.get(pk=self.old_done.pk).caption, 'archived before')
+        self.assertEqual(ArchivedTask.objects.count(), 3)
+
+    def test_tombstones_pruned(self):
+        """
+        Tombstones older than --tombstone-days are pruned after archiving
+        """
+        self.archive('--days', '30')
+        TaskTombstone.objects.filter(task_id=self.old_done.pk).update(
+            deleted_at=timezone.now() - datetime.timedelta(days=100))
+        self.assertIn('Pruned 1 tombstones', self.archive('--days', '30', '--tombstone-days', '90'))
+        self.assertEqual(list(TaskTombstone.objects.values_list('task_id', flat=True)), [self.old_expired.pk])
+
+    def test_history(self):
+        """
+        History lists archived tasks latest due first, read-only, a page at a time
+        """
+        self.archive('--days', '0')
+        with mock.patch('tasks.views.HISTORY_PAGE_SIZE', 2):
+            response = self.client.get(reverse('tasks:history'))
+            self.assertEqual([task.caption for task in response.context['task_list']],
+                             ['old done', 'recent expired'])
+            self.assertNotContains(response, 'complete_task')
+            self.assertContains(response, 'done by testuser')
+
+            page = response.context['page']
+            response = self.client.get(reverse('tasks:history'), {'after': page.next_cursor})
+            self.assertEqual([task.caption for task in response.context['task_list']],
+                             ['recent done', 'old expired'])
+            self.assertFalse(response.context['page'].has_next)
+
+            page = response.context['page']
+            response = self.client.get(reverse('tasks:history'), {'before': page.previous_cursor})
+            self.assertEqual([task.caption for task in response.context['task_list']],
+                             ['old done', 'recent expired'])
+            self.assertFalse(response.context['page'].has_previous)
+
+    def test_history_not_logged_user(self):
+        """
+        Not logged user is sent to the main page
+        """
+        self.client.logout()
+        response = self.client.get(reverse('tasks:history'))
+        self.assertRedirects(response, reverse('tasks:index'))
+
+
+class RecurrenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
         self.user = create_user()
         self.client.login(username='testuser', password='12345')
+        self.now = timezone.now().replace(microsecond=0)
 
-        caption = 'a'
-        # date = timezone.now()
-        date = timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M')
+    def add_rule(self, caption, next_due, frequency=FREQUENCY_DAILY, **kwargs):
+        return RecurrenceRule.objects.create(caption=caption, task_giver=self.user, frequency=frequency,
+                                             starts_at=next_due, next_due=next_due, **kwargs)
 
-        self.client.post(reverse('tasks:create_task'), {'caption': caption, 'due_date': date})
-        self.assertEqual(Task.objects.count(), 1)
+    def schedule(self, *args):
+        out = io.StringIO()
+        call_command('schedule_recurring', *args, stdout=out)
+        return out.getvalue()
 
+    def test_following(self):
+        """
+        Occurrences follow every interval days, weeks or months, the 31st clipped to shorter months
+        """
+        start = timezone.make_aware(datetime.datetime(2030, 1, 31, 18, 30))
+        rule = RecurrenceRule(frequency=FREQUENCY_DAILY, interval=2, starts_at=start)
+        self.assertEqual(rule.following(start), start + datetime.timedelta(days=2))
+        rule.frequency = FREQUENCY_WEEKLY
+        self.assertEqual(rule.following(start), start + datetime.timedelta(weeks=2))
+
+        rule = RecurrenceRule(frequency=FREQUENCY_MONTHLY, interval=1, starts_at=start)
+        february = rule.following(start)
+        self.assertEqual(february, timezone.make_aware(datetime.datetime(2030, 2, 28, 18, 30)))
+        self.assertEqual(rule.following(february), timezone.make_aware(datetime.datetime(2030, 3, 31, 18, 30)))
+        rule.interval = 11
+        self.assertEqual(rule.following(start), timezone.make_aware(datetime.datetime(2030, 12, 31, 18, 30)))
+
+        rule.ends_at = start + datetime.timedelta(days=300)
+        self.assertIsNone(rule.following(start))
+
+    def test_create_repeating_task(self):
+        """
+        A task created with repeat starts a rule, its next occurrence is due one interval later
+        """
+        self.client.post(reverse('tasks:create_task'),
+                         {'caption': 'Water plants', 'due_date': '2030-05-01T18:30', 'repeat': FREQUENCY_WEEKLY})
+        task = Task.objects.get()
+        rule = RecurrenceRule.objects.get()
+        self.assertEqual(task.recurrence, rule)
+        self.assertEqual((rule.caption, rule.task_giver, rule.frequency), ('Water plants', self.user, 'weekly'))
+        self.assertEqual(rule.next_due, task.due_date + datetime.timedelta(weeks=1))
+
+        self.client.post(reverse('tasks:create_task'), {'caption': 'Once', 'due_date': '2030-05-01T18:30'})
+        self.assertIsNone(Task.objects.get(caption='Once').recurrence)
+        self.assertEqual(RecurrenceRule.objects.count(), 1)
+
+    def test_create_repeating_task_atomic(self):
+        """
+        A repeating task whose save fails leaves no rule behind
+        """
+        with mock.patch.object(Task, 'save', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('tasks:create_task'), {
+                    'caption': 'Water plants', 'due_date': '2030-05-01T18:30', 'repeat': FREQUENCY_WEEKLY})
+        self.assertFalse(RecurrenceRule.objects.exists())
 
-# Task model tests
-class TaskModelTests(TestCase):
-    def test_completed_task(self):
+    def test_stop_repeating(self):
         """
-        Completed task is not expired.
+        Task giver stops a chore repeating, its tasks stay as one-off tasks
         """
-        due_date = timezone.now() - datetime.timedelta(days=10)
-        task = Task.objects.create(caption='a', pub_date=timezone.now(),
-                                   due_date=due_date, task_giver='a',
-                                   task_done_by='a', task_done_date=timezone.now())
-        self.assertIs(task.is_expired(), False)
+        self.client.post(reverse('tasks:create_task'),
+                         {'caption': 'Water plants', 'due_date': '2030-05-01T18:30', 'repeat': FREQUENCY_DAILY})
+        task = Task.objects.get()
+        stop_url = reverse('tasks:stop_repeating', args=(task.id,))
+        self.assertContains(self.client.get(reverse('tasks:index')), stop_url)
+
+        self.client.force_login(get_user('other'))
+        self.assertNotContains(self.client.get(reverse('tasks:index')), stop_url)
+        self.client.get(stop_url)
+        self.assertTrue(RecurrenceRule.objects.exists())
+
+        self.client.force_login(self.user)
+        response = self.client.get(stop_url, follow=True)
+        self.assertContains(response, 'Water plants no longer repeats.')
+        self.assertNotContains(response, stop_url)
+        self.assertFalse(RecurrenceRule.objects.exists())
+        self.assertIsNone(Task.objects.get().recurrence)
+        self.assertIn('Created 0 tasks', self.schedule('--lookahead', '100000'))
+
+    def test_interval_positive(self):
+        """
+        A rule never repeats every 0 days, which would keep the scheduler looping
+        """
+        rule = RecurrenceRule(caption='never', task_giver=self.user, frequency=FREQUENCY_DAILY,
+                              interval=0, starts_at=self.now, next_due=self.now)
+        with self.assertRaises(ValidationError):
+            rule.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            rule.save()
+
+    def test_import_repeating_tasks(self):
+        """
+        Imported rows with repeat start a rule each, like tasks created one by one
+        """
+        rows = [{'caption': 'Water plants', 'due_date': '2030-05-01T18:30', 'repeat': FREQUENCY_WEEKLY},
+                {'caption': 'Once', 'due_date': '2030-05-01T18:30'}]
+        self.assertEqual(importing.create_tasks(importing.clean_rows(enumerate(rows)), self.user), 2)
+        rule = RecurrenceRule.objects.get()
+        self.assertEqual(Task.objects.get(caption='Water plants').recurrence, rule)
+        self.assertEqual(rule.next_due, Task.objects.get(caption='Water plants').due_date + datetime.timedelta(weeks=1))
+        self.assertIsNone(Task.objects.get(caption='Once').recurrence)
+
+    def test_schedule(self):
+        """
+        Only occurrences due within the lookahead are created, once however often it runs
+        """
+        soon = self.add_rule('soon', self.now + datetime.timedelta(hours=3))
+        self.add_rule('later', self.now + datetime.timedelta(days=3))
+        version = board_cache.get_version()
+
+        self.assertIn('Created 1 tasks', self.schedule('--lookahead', '24'))
+        task = Task.objects.get()
+        self.assertEqual((task.caption, task.due_date, task.recurrence), ('soon', soon.next_due, soon))
+        soon.refresh_from_db()
+        self.assertEqual(soon.next_due, task.due_date + datetime.timedelta(days=1))
+        self.assertNotEqual(board_cache.get_version(), version)
+
+        self.assertIn('Created 0 tasks', self.schedule('--lookahead', '24'))
+        self.assertEqual(Task.objects.count(), 1)
 
-        due_date = timezone.now() + datetime.timedelta(days=10)
-        task = Task.objects.create(caption='a', pub_date=timezone.now(),
-                                   due_date=due_date, task_giver='a',
-                                   task_done_by='a', task_done_date=timezone.now())
-        self.assertIs(task.is_expired(), False)
+    def test_ended_rule(self):
+        """
+        A rule ends after its last occurrence
+        """
+        rule = self.add_rule('twice', self.now + datetime.timedelta(hours=1),
+                             ends_at=self.now + datetime.timedelta(days=1, hours=1))
+        self.schedule('--lookahead', '48')
+        self.assertEqual(Task.objects.count(), 2)
+        rule.refresh_from_db()
+        self.assertIsNone(rule.next_due)
+        self.assertIn('Created 0 tasks', self.schedule('--lookahead', '1000'))
+
+    def test_missed_occurrences_skipped(self):
+        """
+        Occurrences due while nothing ran are skipped, the rule carries on from the next one
+        """
+        rule = self.add_rule('missed', self.now - datetime.timedelta(days=3, hours=1))
+        self.schedule('--lookahead', '24')
+        task = Task.objects.get()
+        self.assertEqual(task.due_date, self.now + datetime.timedelta(hours=23))
+        rule.refresh_from_db()
+        self.assertEqual(rule.next_due, task.due_date + datetime.timedelta(days=1))
+
+    def test_chunks(self):
+        """
+        Rules past the ones held in memory are read when the heap runs dry
+        """
+        for i in range(7):
+            self.add_rule('chore {}'.format(i), self.now + datetime.timedelta(hours=i + 1))
+        self.add_rule('later', self.now + datetime.timedelta(days=3))
 
-        due_date = timezone.now()
-        task = Task.objects.create(caption='a', pub_date=timezone.now(),
-                                   due_date=due_date, task_giver='a',
-                                   task_done_by='a', task_done_date=timezone.now())
-        self.assertIs(task.is_expired(), False)
+        self.assertIn('Created 7 tasks', self.schedule('--lookahead', '24', '--chunk-size', '2'))
+        self.assertEqual(sorted(Task.objects.values_list('caption', flat=True)),
+                         ['chore {}'.format(i) for i in range(7)])
 
-    def test_due_date_after_now(self):
+    def test_scheduler(self):
         """
-        Task with 'due_date' after 'timezone.now()' is not expired
+        A long running scheduler creates every occurrence once as time goes by and sleeps until the next
         """
-        due_date = timezone.now() + datetime.timedelta(days=10)
-        task = Task.objects.create(caption='a', pub_date=timezone.now(),
-                                   due_date=due_date, task_giver='a')
-        self.assertIs(task.is_expired(), False)
-
-    def test_due_date_before_now(self):
+        rule = self.add_rule('daily', self.now + datetime.timedelta(hours=1))
+        scheduler = recurrence.Scheduler(datetime.timedelta(hours=2), chunk_size=10, refresh_interval=3600 * 24)
+        self.assertEqual(scheduler.run(self.now), 1)
+        self.assertEqual(scheduler.run(self.now + datetime.timedelta(minutes=1)), 0)
+        # due in 25 hours, created 2 hours before
+        self.assertEqual(scheduler.seconds_to_next(self.now), 23 * 3600)
+
+        # a rule created while it runs is picked up at the next refresh
+        self.add_rule('new', self.now + datetime.timedelta(hours=2))
+        self.assertEqual(scheduler.run(self.now + datetime.timedelta(hours=23)), 1)
+        self.assertEqual(scheduler.run(self.now + datetime.timedelta(days=1)), 1)
+        self.assertEqual(Task.objects.filter(recurrence=rule).count(), 2)
+
+    def test_deleted_rule(self):
         """
-        Task with 'due_date' before 'timezone.now()' is expired
+        A rule deleted while in the heap creates nothing, its tasks stay
         """
-        due_date = timezone.now() - datetime.timedelta(days=10)
-        task = Task.objects.create(caption='a', pub_date=timezone.now(),
-                                   due_date=due_date, task_giver='a')
-        self.assertIs(task.is_expired(), True)
+        rule = self.add_rule('daily', self.now + datetime.timedelta(hours=1))
+        scheduler = recurrence.Scheduler(datetime.timedelta(hours=2), refresh_interval=3600 * 24)
+        scheduler.run(self.now)
+        rule.delete()
+        self.assertEqual(scheduler.run(self.now + datetime.timedelta(days=1)), 0)
+        self.assertIsNone(Task.objects.get().recurrence)
+
+    def test_constant_queries(self):
+        """
+        Creating occurrences takes the same queries for one rule as for many
+        """
+        def run(count):
+            for i in range(count):
+                self.add_rule('chore', self.now + datetime.timedelta(minutes=i + 1))
+            with CaptureQueriesContext(connection) as queries:
+                recurrence.Scheduler().run(self.now)
+            RecurrenceRule.objects.all().delete()
+            return len(queries)
 
-    def test_due_date_is_now(self):
+        self.assertEqual(run(1), run(20))
+
+
+class RemindersTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.user.email = 'testuser@example.com'
+        self.user.save()
+        self.now = timezone.now()
+
+    def add(self, caption, due_hours, user=None, done=False):
+        user = user or self.user
+        return Task.objects.create(
+            caption=caption, pub_date=self.now, due_date=self.now + datetime.timedelta(hours=due_hours),
+            task_giver=user, task_done_by=user if done else None, task_done_date=self.now if done else None)
+
+    def remind(self, *args):
+        out = io.StringIO()
+        call_command('send_reminders', *args, stdout=out)
+        return out.getvalue()
+
+    def test_reminders(self):
         """
-        Task with 'due_date' equal to 'timezone.now()' is expired
+        Task givers get one email about their open tasks due within the window
         """
-        task = Task.objects.create(caption='a', pub_date=timezone.now(),
-                                   due_date=timezone.now(), task_giver='a')
-        self.assertIs(task.is_expired(), True)
+        soon = self.add('Wash & dry', 2)
+        self.add('Vacuum', 20)
+        self.add('Later', 30)
+        self.add('Done', 2, done=True)
+        self.add('Expired', -2)
+        anna = User.objects.create_user(username='anna', password='12345', email='anna@example.com')
+        self.add('Walk the dog', 5, user=anna)
+        no_email = User.objects.create_user(username='bob', password='12345')
+        self.add('Feed the cat', 5, user=no_email)
+
+        self.assertIn('Sent 2 reminders of 3 tasks', self.remind('--hours', '24'))
+        emails = {email.to[0]: email for email in mail.outbox}
+        self.assertEqual(set(emails), {'testuser@example.com', 'anna@example.com'})
+        self.assertEqual(emails['testuser@example.com'].subject, '2 chores are due soon')
+        body = emails['testuser@example.com'].body
+        self.assertIn('- Wash & dry, due {}'.format(timezone.localtime(soon.due_date).strftime('%d/%m/%Y %H:%M')),
+                      body)
+        self.assertIn('- Vacuum', body)
+        self.assertNotIn('Later', body)
+        self.assertEqual(emails['anna@example.com'].subject, 'Walk the dog is due soon')
+        self.assertFalse(TaskReminder.objects.filter(sent_at__isnull=True).exists())
+
+    def test_sent_once(self):
+        """
+        A task is reminded of once, however often reminders run and however wide the window grows
+        """
+        self.add('Vacuum', 2)
+        self.remind('--hours', '24')
+        self.add('Mop', 30)
+        self.assertIn('Sent 1 reminders of 1 tasks', self.remind('--hours', '48'))
+        self.assertIn('Sent 0 reminders of 0 tasks', self.remind('--hours', '48'))
+        self.assertEqual([email.subject for email in mail.outbox], ['Vacuum is due soon', 'Mop is due soon'])
+
+    def test_batches(self):
+        """
+        Batches walk every task due soon, a task giver gets an email per batch
+        """
+        for i in range(5):
+            user = User.objects.create_user(username='user{}'.format(i), password='12345',
+                                            email='user{}@example.com'.format(i))
+            self.add('chore {}'.format(i), i + 1, user=user)
+            self.add('chore {}'.format(i), i + 1)
+        # testuser's tasks due in 2 and 3 hours share the second batch
+        self.assertIn('Sent 9 reminders of 10 tasks',
+                      self.remind('--batch-size', '3', '--workers', '2', '--verbosity', '2'))
+        self.assertEqual(TaskReminder.objects.filter(sent_at__isnull=False).count(), 10)
+        self.assertEqual(len(mail.outbox), 9)
+
+    def test_claimed_elsewhere(self):
+        """
+        Tasks claimed by another run are left to it
+        """
+        task = self.add('Vacuum', 2)
+        self.add('Mop', 3)
+        TaskReminder.objects.create(task_id=task.pk, due_date=task.due_date, claim='other')
+        self.assertEqual(reminders.claim([task]), [])
+        self.remind()
+        self.assertEqual([email.subject for email in mail.outbox], ['Mop is due soon'])
+
+    def test_stale_claim_taken_over(self):
+        """
+        Unsent claims of a run which died are taken over once they time out
+        """
+        stale = self.add('Vacuum', 2)
+        fresh = self.add('Mop', 3)
+        TaskReminder.objects.create(task_id=stale.pk, due_date=stale.due_date, claim='dead',
+                                    claimed_at=self.now - reminders.CLAIM_TIMEOUT - datetime.timedelta(minutes=1))
+        TaskReminder.objects.create(task_id=fresh.pk, due_date=fresh.due_date, claim='running')
+        self.assertIn('Sent 1 reminders of 1 tasks', self.remind())
+        self.assertEqual([email.subject for email in mail.outbox], ['Vacuum is due soon'])
+
+    def test_due_date_changed(self):
+        """
+        A task is reminded of again when given another due date, and its marker goes with it
+        """
+        task = self.add('Vacuum', 2)
+        self.remind()
+        task.caption = 'Vacuum upstairs'
+        task.save()
+        self.assertIn('Sent 0 reminders of 0 tasks', self.remind())
+        task.due_date += datetime.timedelta(hours=1)
+        task.save()
+        self.assertIn('Sent 1 reminders of 1 tasks', self.remind())
+        task.delete()
+        self.assertFalse(TaskReminder.objects.exists())
+
+    def test_failed_email_retried(self):
+        """
+        Reminders which could not be sent are tried again by the next run
+        """
+        self.add('Vacuum', 2)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError), \
+                self.assertLogs('tasks.reminders', 'ERROR'):
+            self.assertIn('Sent 0 reminders of 0 tasks', self.remind())
+        self.assertFalse(TaskReminder.objects.exists())
+        self.assertIn('Sent 1 reminders of 1 tasks', self.remind())
+
+    def test_markers_dropped(self):
+        """
+        Markers of tasks past their due date are dropped
+        """
+        TaskReminder.objects.create(task_id=1, due_date=self.now - datetime.timedelta(minutes=1), claim='old')
+        kept = TaskReminder.objects.create(task_id=2, due_date=self.now + datetime.timedelta(hours=1), claim='new')
+        self.remind()
+        self.assertQuerysetEqual(TaskReminder.objects.all(), [kept], transform=lambda reminder: reminder)
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+        self.anna = User.objects.create_user(username='anna', password='12345')
+
+    def stats(self, user):
+        stats = UserStats.objects.get(user=user)
+        return stats.given, stats.completed
+
+    def add(self, user, days=1):
+        return Task.objects.create(caption='chore', pub_date=timezone.now(), task_giver=user,
+                                   due_date=timezone.now() + datetime.timedelta(days=days))
+
+    def test_counted_as_tasks_change(self):
+        """
+        Creating, completing and deleting tasks, one or many at a time, updates their users' stats
+        """
+        self.assertEqual(self.stats(self.user), (0, 0))
+        date = timezone.localtime(timezone.now() + datetime.timedelta(days=1)).strftime('%d/%m/%Y %H:%M')
+        self.client.post(reverse('tasks:create_task'), {'caption': 'a', 'due_date': date})
+        self.client.post(reverse('tasks:bulk_create_task'),
+                         {'tasks': '\n'.join('{}, {}'.format(caption, date) for caption in 'bcd')})
+        self.assertEqual(self.stats(self.user), (4, 0))
+
+        tasks = list(Task.objects.order_by('pk'))
+        self.client.get(reverse('tasks:complete_task', args=(tasks[0].id,)))
+        self.client.post(reverse('tasks:bulk_complete_task'), {'task_ids': [tasks[0].id, tasks[1].id, tasks[2].id]})
+        self.client.logout()
+        self.client.login(username='anna', password='12345')
+        self.client.get(reverse('tasks:complete_task', args=(tasks[0].id,)))
+        self.assertEqual(self.stats(self.user), (4, 3))
+        self.assertEqual(self.stats(self.anna), (0, 0))
+
+        self.client.logout()
+        self.client.login(username='testuser', password='12345')
+        self.client.get(reverse('tasks:delete_task', args=(tasks[0].id,)))
+        self.client.post(reverse('tasks:bulk_delete_task'), {'task_ids': [tasks[1].id, tasks[3].id]})
+        self.assertEqual(self.stats(self.user), (1, 1))
+        self.assertEqual(stats.count()[self.user.pk], (1, 1))
+
+    def test_archived_still_count(self):
+        """
+        Archiving tasks leaves their users' stats as they are
+        """
+        self.add(self.anna, days=-40)
+        done = self.add(self.anna)
+        Task.objects.complete(done.pk, self.user)
+        Task.objects.filter(pk=done.pk).update(task_done_date=timezone.now() - datetime.timedelta(days=40))
+
+        self.assertEqual(archiving.archive_batch(timezone.now() - datetime.timedelta(days=30)), 2)
+        self.assertEqual(self.stats(self.anna), (2, 0))
+        self.assertEqual(self.stats(self.user), (0, 1))
+        self.assertEqual(stats.count(), {self.anna.pk: (2, 0), self.user.pk: (0, 1)})
+
+    def test_user_without_stats(self):
+        """
+        Users created without stats, e.g. in bulk, get them counting their first chore
+        """
+        UserStats.objects.filter(user=self.anna).delete()
+        now = timezone.now()
+        Task.objects.bulk_create([
+            Task(caption='a', pub_date=now, due_date=now, task_giver=self.anna),
+            Task(caption='b', pub_date=now, due_date=now, task_giver=self.anna,
+                 task_done_by=self.anna, task_done_date=now),
+        ])
+        self.assertEqual(self.stats(self.anna), (2, 1))
+
+    def test_rebuild(self):
+        """
+        rebuild_stats counts everything afresh and corrects the stats that drifted
+        """
+        for i in range(3):
+            self.add(self.anna)
+        Task.objects.complete(self.add(self.user).pk, self.anna)
+        UserStats.objects.filter(user=self.anna).update(given=10)
+        UserStats.objects.filter(user=self.user).delete()
+
+        out = io.StringIO()
+        call_command('rebuild_stats', stdout=out)
+        self.assertIn('Counted 2 users, corrected 2', out.getvalue())
+        self.assertEqual(self.stats(self.anna), (3, 1))
+        self.assertEqual(self.stats(self.user), (1, 0))
+
+        out = io.StringIO()
+        call_command('rebuild_stats', stdout=out)
+        self.assertIn('corrected 0', out.getvalue())
+
+    def test_leaderboard(self):
+        """
+        Leaderboard lists users by chores completed, most first
+        """
+        for i in range(3):
+            task = self.add(self.user)
+            Task.objects.complete(task.pk, self.anna if i else self.user)
+        response = self.client.get(reverse('tasks:leaderboard'))
+        self.assertEqual([(stats.user.username, stats.completed) for stats in response.context['stats_list']],
+                         [('anna', 2), ('testuser', 1)])
+        self.assertContains(response, '<td>anna</td>', html=True)
+
+    def test_leaderboard_not_logged_user(self):
+        """
+        Not logged user is sent to the main page
+        """
+        self.client.logout()
+        response = self.client.get(reverse('tasks:leaderboard'))
+        self.assertRedirects(response, reverse('tasks:index'))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+        due_date = timezone.now() + datetime.timedelta(days=1)
+        for caption, username in (('Wash the dishes', 'anna'), ('Descale the kettle', 'bob'),
+                                  ('Dust the shelves', 'dishwasher'), ('Walk the dog', 'anna')):
+            Task.objects.create(caption=caption, pub_date=timezone.now(),
+                                due_date=due_date, task_giver=get_user(username))
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('tasks:index'), dict(params, q=query))
+        self.assertEqual(response.status_code, 200)
+        return [task.caption for task in response.context['task_list']]
+
+    def test_ranked(self):
+        """
+        Captions and usernames are searched by word prefix, caption matches rank first
+        """
+        self.assertEqual(self.search('dish'), ['Wash the dishes', 'Dust the shelves'])
+        self.assertEqual(self.search('the Kettle'), ['Descale the kettle'])
+        self.assertEqual(self.search('anna'), ['Walk the dog', 'Wash the dishes'])
+        self.assertEqual(self.search('vacuum'), [])
+
+    def test_query_syntax_ignored(self):
+        """
+        FTS5 operators and quotes in the query are taken as plain words
+        """
+        self.assertEqual(self.search('dog OR "kettle'), [])
+        self.assertEqual(self.search('walk* dog^'), ['Walk the dog'])
+        self.assertEqual(self.search('walk AND dog'), [])
+        self.assertEqual(self.search('"-:()'), [])
+
+    def test_kept_in_sync(self):
+        """
+        Created, bulk created, edited, renamed and deleted tasks are found accordingly
+        """
+        due_date = timezone.now() + datetime.timedelta(days=1)
+        Task.objects.bulk_create([Task(caption='Mow the lawn', pub_date=timezone.now(),
+                                       due_date=due_date, task_giver=self.user)])
+        self.assertEqual(self.search('lawn'), ['Mow the lawn'])
+
+        task = Task.objects.get(caption='Walk the dog')
+        task.caption = 'Feed the cat'
+        task.save()
+        self.assertEqual(self.search('dog'), [])
+        self.assertEqual(self.search('cat'), ['Feed the cat'])
+
+        User.objects.filter(username='anna').update(username='hanna')
+        self.assertEqual(self.search('anna'), [])
+        User.objects.filter(username='hanna').update(username='joanna')
+        self.assertEqual(self.search('joanna'), ['Feed the cat', 'Wash the dishes'])
+
+        Task.objects.filter(caption__startswith='Wash').delete()
+        self.assertEqual(self.search('dish'), ['Dust the shelves'])
+
+    def test_filtered(self):
+        """
+        Search keeps the status filter of the board
+        """
+        Task.objects.complete(Task.objects.get(caption='Wash the dishes').pk, self.user)
+        self.assertEqual(self.search('dish', status='done'), ['Wash the dishes'])
+        self.assertEqual(self.search('dish', status='open'), ['Dust the shelves'])
+
+    @mock.patch.object(IndexView, 'page_size', 1)
+    def test_pages(self):
+        """
+        Results are split into numbered pages linked to each other
+        """
+        self.assertEqual(self.search('the', page=3), ['Descale the kettle'])
+        response = self.client.get(reverse('tasks:index'), {'q': 'the', 'page': 4})
+        self.assertContains(response, 'q=the&amp;page=3')
+        self.assertFalse(response.context['page'].has_next)
+        self.assertEqual(self.search('the', page='nonsense'), self.search('the'))
+
+    def test_rebuild(self):
+        """
+        rebuild_search_index fills the index from the tasks table
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM tasks_task_search')
+        self.assertEqual(self.search('kettle'), [])
+
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 4 tasks', out.getvalue())
+        cache.clear()
+        self.assertEqual(self.search('kettle'), ['Descale the kettle'])
+
+    def test_search_limit(self):
+        """
+        Only the newest SEARCH_LIMIT matches are ranked
+        """
+        with mock.patch.object(search, 'SEARCH_LIMIT', 2):
+            self.assertEqual(self.search('the'), ['Walk the dog', 'Dust the shelves'])
+
+
+# complete_task tests
+class CompleteTaskViewTests(TestCase):
+    def test_not_logged_user_complete_task(self):
+        """
+        Not logged user cannot complete tasks.
+        """
+        task = create_task('a', 'uncompleted')
+        self.client.post(reverse('tasks:complete_task', args=(task.id,)))
+
+        task_check = get_object_or_404(Task, pk=task.id)
+        self.assertIsNone(task_check.task_done_by)
+        self.assertIsNone(task_check.task_done_date)
+
+    def test_complete_uncompleted_task(self):
+        """
+        Logged user can complete uncompleted tasks.
+        """
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        task = create_task('a', 'uncompleted')
+        self.client.post(reverse('tasks:complete_task', args=(task.id,)))
+
+        task_check = get_object_or_404(Task, pk=task.id)
+        self.assertEqual(task_check.task_done_by, self.user)
+        self.assertIsNotNone(task_check.task_done_date)
+
+    def test_complete_completed_task(self):
+        """
+        Logged user cannot complete completed tasks.
+        """
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        task = create_task('a', 'completed')
+        self.client.post(reverse('tasks:complete_task', args=(task.id,)))
+
+        task_check = get_object_or_404(Task, pk=task.id)
+        self.assertEqual(task_check.task_done_by.username, 'a')
+        self.assertEqual(task_check.task_done_date, task.task_done_date)
+
+    def test_complete_expired_task(self):
+        """
+        Logged user cannot complete expired tasks.
+        """
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        task = create_task('a', 'expired')
+        self.client.post(reverse('tasks:complete_task', args=(task.id,)))
+
+        task_check = get_object_or_404(Task, pk=task.id)
+        self.assertIsNone(task_check.task_done_by)
+        self.assertIsNone(task_check.task_done_date)
+
+
+    def test_complete_task_single_update(self):
+        """
+        Completing a task costs one UPDATE and no SELECT of the task
+        """
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        task = create_task('a', 'uncompleted')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('tasks:complete_task', args=(task.id,)))
+
+        task_queries = [q['sql'] for q in queries if 'tasks_task' in q['sql']]
+        self.assertEqual(len(task_queries), 1)
+        self.assertTrue(task_queries[0].startswith('UPDATE'))
+
+    def test_complete_twice(self):
+        """
+        Only the first of two completions claims the task
+        """
+        task = create_task('a', 'uncompleted')
+
+        first, second = get_user('first'), get_user('second')
+        self.assertIs(Task.objects.complete(task.id, first), True)
+        self.assertIs(Task.objects.complete(task.id, second), False)
+        self.assertEqual(Task.objects.get(pk=task.id).task_done_by, first)
+
+    def test_complete_missing_task(self):
+        """
+        Completing a missing task redirects with a warning
+        """
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        response = self.client.post(reverse('tasks:complete_task', args=(1,)), follow=True)
+        self.assertContains(response, 'This task can no longer be completed.')
+
+
+# delete_task tests
+class DeleteTaskViewTests(TestCase):
+    def test_not_logged_user_delete_task(self):
+        """
+        Not logged user cannot delete tasks.
+        """
+        task = create_task('a', 'uncompleted')
+        self.client.post(reverse('tasks:delete_task', args=(task.id,)))
+
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_user_delete_not_owned_task(self):
+        """
+        User cannot delete not owned task
+        """
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        task = create_task('a', 'uncompleted')
+        self.client.post(reverse('tasks:delete_task', args=(task.id,)))
+
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_user_delete_owned_task(self):
+        """
+        User can delete owned task
+        """
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        task = create_task('testuser', 'uncompleted')
+        self.client.post(reverse('tasks:delete_task', args=(task.id,)))
+
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_superuser_delete_not_owned_task(self):
+        """
+        Superuser can delete not owned task
+        """
+        self.user = create_user(superuser=True)
+        self.client.login(username='testuser', password='12345')
+
+        task = create_task('a', 'uncompleted')
+        self.client.post(reverse('tasks:delete_task', args=(task.id,)))
+
+        self.assertEqual(Task.objects.count(), 0)
+
+
+# bulk_complete_task and bulk_delete_task tests
+class BulkTaskViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.completed = create_task('a', 'completed')
+        self.uncompleted = create_task('b', 'uncompleted')
+        self.expired = create_task('c', 'expired')
+        self.owned = create_task('testuser', 'uncompleted')
+
+    def post_json(self, name, task_ids):
+        return self.client.post(reverse(name), {'task_ids': task_ids},
+                                HTTP_ACCEPT='application/json')
+
+    def test_not_logged_user_bulk_actions(self):
+        """
+        Not logged user cannot complete or delete tasks in bulk.
+        """
+        ids = [self.uncompleted.id, self.owned.id]
+        self.post_json('tasks:bulk_complete_task', ids)
+        self.post_json('tasks:bulk_delete_task', ids)
+
+        self.assertEqual(Task.objects.filter(task_done_by=None).count(), 3)
+        self.assertEqual(Task.objects.count(), 4)
+
+    def test_bulk_complete(self):
+        """
+        Only uncompleted tasks are completed, every id gets its own result
+        """
+        self.client.login(username='testuser', password='12345')
+
+        ids = [self.completed.id, self.uncompleted.id, self.expired.id, 999]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_json('tasks:bulk_complete_task', ids)
+
+        self.assertEqual(response.json()['results'], {
+            str(self.completed.id): 'done',
+            str(self.uncompleted.id): 'completed',
+            str(self.expired.id): 'expired',
+            '999': 'not_found',
+        })
+        self.assertEqual(Task.objects.get(pk=self.uncompleted.id).task_done_by, self.user)
+        self.assertEqual(Task.objects.get(pk=self.completed.id).task_done_by.username, 'a')
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "tasks_task"')]
+        self.assertEqual(len(updates), 1)
+
+    def test_bulk_delete(self):
+        """
+        User deletes only owned tasks in bulk
+        """
+        self.client.login(username='testuser', password='12345')
+
+        response = self.post_json('tasks:bulk_delete_task', [self.owned.id, self.completed.id, 999])
+
+        self.assertEqual(response.json()['results'], {
+            str(self.owned.id): 'deleted',
+            str(self.completed.id): 'forbidden',
+            '999': 'not_found',
+        })
+        self.assertFalse(Task.objects.filter(pk=self.owned.id).exists())
+        self.assertEqual(Task.objects.count(), 3)
+
+    def test_bulk_delete_reports_rows_removed(self):
+        """
+        Only tasks the DELETE removed are reported deleted, a DELETE removing fewer rows than read is rolled back
+        """
+        with mock.patch('django.db.models.QuerySet._raw_delete', return_value=0), \
+                self.assertRaises(DatabaseError), transaction.atomic():
+            Task.objects.delete_many([self.owned.id], self.user)
+        self.assertTrue(Task.objects.filter(pk=self.owned.id).exists())
+        self.assertFalse(TaskTombstone.objects.exists())
+
+        self.assertEqual(Task.objects.delete_many([self.owned.id], self.user), {self.owned.id: 'deleted'})
+        self.assertEqual(Task.objects.delete_many([self.owned.id], self.user), {self.owned.id: 'not_found'})
+
+    def test_superuser_bulk_delete(self):
+        """
+        Superuser deletes not owned tasks in bulk
+        """
+        User.objects.filter(pk=self.user.pk).update(is_superuser=True)
+        self.client.login(username='testuser', password='12345')
+
+        self.post_json('tasks:bulk_delete_task', [self.completed.id, self.expired.id])
+
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_bulk_complete_from_index_form(self):
+        """
+        Browser form posts redirect to index with a summary
+        """
+        self.client.login(username='testuser', password='12345')
+
+        response = self.client.post(reverse('tasks:bulk_complete_task'),
+                                    {'task_ids': [self.uncompleted.id, self.owned.id]},
+                                    follow=True)
+
+        self.assertRedirects(response, reverse('tasks:index'))
+        self.assertContains(response, 'Completed 2 of 2 tasks.')
+
+    def test_bulk_requires_post(self):
+        """
+        Bulk endpoints do not accept GET
+        """
+        self.client.login(username='testuser', password='12345')
+
+        response = self.client.get(reverse('tasks:bulk_delete_task'), {'task_ids': [self.owned.id]})
+
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(Task.objects.count(), 4)
+
+
+# task_changes API tests
+class TaskChangesApiTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+        self.a = create_task('a', 'uncompleted')
+        self.b = create_task('b', 'uncompleted')
+
+    def changes(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get(reverse('tasks:task_changes'), params).json()
+
+    def test_not_logged_user(self):
+        """
+        Not logged user cannot sync tasks
+        """
+        self.client.logout()
+        response = self.client.get(reverse('tasks:task_changes'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_initial_sync(self):
+        """
+        Without a cursor every task is returned
+        """
+        changes = self.changes()
+
+        self.assertEqual([task['id'] for task in changes['tasks']], [self.a.id, self.b.id])
+        self.assertEqual(changes['tasks'][0]['task_giver'], 'a')
+        self.assertEqual(changes['deleted'], [])
+        self.assertFalse(changes['has_more'])
+
+    def test_only_changes_after_cursor(self):
+        """
+        Completed and deleted tasks are reported after the cursor, nothing else
+        """
+        cursor = self.changes()['cursor']
+        self.assertEqual(self.changes(cursor)['tasks'], [])
+
+        Task.objects.complete(self.a.id, self.user)
+        b_id = self.b.id
+        self.b.delete()
+        changes = self.changes(cursor)
+
+        self.assertEqual([task['id'] for task in changes['tasks']], [self.a.id])
+        self.assertEqual(changes['tasks'][0]['task_done_by'], 'testuser')
+        self.assertEqual(changes['deleted'], [b_id])
+
+        changes = self.changes(changes['cursor'])
+        self.assertEqual((changes['tasks'], changes['deleted']), ([], []))
+
+    def test_late_commit_not_skipped(self):
+        """
+        Change stamped with an earlier time but committed after the cursor is still reported
+        """
+        cursor = self.changes()['cursor']
+        # a writer which read the clock before waiting for the write lock
+        Task.objects.filter(pk=self.a.pk).update(caption='late',
+                                                 updated_at=timezone.now() - datetime.timedelta(minutes=1))
+        changes = self.changes(cursor)
+        self.assertEqual([task['caption'] for task in changes['tasks']], ['late'])
+        self.assertFalse(changes['reset'])
+
+    def test_unknown_cursor_resets(self):
+        """
+        Malformed cursors, like those of the old (updated_at, id) format, sync from scratch
+        """
+        changes = self.changes('1602979200000000_5')
+        self.assertTrue(changes['reset'])
+        self.assertEqual([task['id'] for task in changes['tasks']], [self.a.id, self.b.id])
+        self.assertFalse(self.changes(changes['cursor'])['reset'])
+
+    def test_pruned_tombstones_reset(self):
+        """
+        Clients which synced before pruned tombstones get every task again, later ones don't
+        """
+        cursor = self.changes()['cursor']
+        b_id = self.b.id
+        self.b.delete()
+        later = self.changes()['cursor']
+        self.assertEqual(sync.prune_tombstones(now=timezone.now() + datetime.timedelta(days=91)), 1)
+        self.assertEqual(sync.prune_tombstones(now=timezone.now() + datetime.timedelta(days=91)), 0)
+
+        changes = self.changes(cursor)
+        self.assertTrue(changes['reset'])
+        self.assertEqual(([task['id'] for task in changes['tasks']], changes['deleted']), ([self.a.id], []))
+        changes = self.changes(later)
+        self.assertFalse(changes['reset'])
+        self.assertNotIn(b_id, changes['deleted'])
+
+    def test_delete_task_leaves_tombstone(self):
+        """
+        Deleting a task through the view leaves a tombstone
+        """
+        task = create_task('testuser', 'uncompleted')
+        self.client.post(reverse('tasks:delete_task', args=(task.id,)))
+
+        self.assertTrue(TaskTombstone.objects.filter(task_id=task.id).exists())
+
+    def test_paged_changes(self):
+        """
+        Small limits walk all changes, task updates and deletions interleaved
+        """
+        cursor = self.changes()['cursor']
+        a_id, b_id = self.a.id, self.b.id
+        self.a.delete()
+        c = create_task('c', 'uncompleted')
+        self.b.delete()
+
+        seen = []
+        while True:
+            changes = self.changes(cursor, limit=1)
+            seen += [('task', task['id']) for task in changes['tasks']]
+            seen += [('deleted', pk) for pk in changes['deleted']]
+            cursor = changes['cursor']
+            if not changes['has_more']:
+                break
+
+        self.assertEqual(seen, [('deleted', a_id), ('task', c.id), ('deleted', b_id)])
+
+    def test_query_count_independent_of_table_size(self):
+        """
+        Sync reads tasks and tombstones with one bounded query each
+        """
+        for caption in 'cdefgh':
+            create_task(caption, 'uncompleted')
+        cursor = self.changes()['cursor']
+        Task.objects.complete(self.a.id, self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            changes = self.changes(cursor)
+
+        self.assertEqual(len(changes['tasks']), 1)
+        sync_queries = [q['sql'] for q in queries
+                        if 'FROM "tasks_task"' in q['sql'] or 'FROM "tasks_tasktombstone"' in q['sql']]
+        self.assertEqual(len(sync_queries), 2)
+        for sql in sync_queries:
+            self.assertIn('LIMIT', sql)
+
+
+# export_tasks tests
+class ExportTasksTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+        create_task('a', 'completed')
+        create_task('b', 'uncompleted')
+        create_task('c', 'expired')
+
+    def export(self, **params):
+        response = self.client.get(reverse('tasks:export_tasks'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_not_logged_user_export(self):
+        """
+        Not logged user cannot export tasks
+        """
+        self.client.logout()
+        response = self.client.get(reverse('tasks:export_tasks'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_csv(self):
+        """
+        CSV export has a header and one row per task in due date order
+        """
+        response, content = self.export()
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'id,caption,task_giver,task_done_by,pub_date,due_date,task_done_date,status')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['a', 'c', 'b'])
+        self.assertEqual(lines[1].split(',')[-1], 'done')
+
+    def test_export_ndjson_with_status(self):
+        """
+        NDJSON export can be limited to a status
+        """
+        response, content = self.export(format='ndjson', status='expired')
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([(row['caption'], row['status']) for row in rows], [('c', 'expired')])
+        self.assertIsNone(rows[0]['task_done_by'])
+
+    def test_export_date_range(self):
+        """
+        Export can be limited to a due date range
+        """
+        today = timezone.localtime(timezone.now()).date()
+        since = (today - datetime.timedelta(days=6)).isoformat()
+        until = (today + datetime.timedelta(days=1)).isoformat()
+        response, content = self.export(format='ndjson', since=since, until=until)
+
+        self.assertEqual([json.loads(line)['caption'] for line in content.splitlines()], ['c'])
+
+    def test_export_archived(self):
+        """
+        Archived tasks are exported along with the live ones, in due date order
+        """
+        self.assertEqual(archiving.archive_batch(timezone.now()), 2)
+        response, content = self.export(format='ndjson')
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([(row['caption'], row['status']) for row in rows],
+                         [('a', 'done'), ('c', 'expired'), ('b', 'open')])
+        response, content = self.export(format='ndjson', status='expired')
+        self.assertEqual([json.loads(line)['caption'] for line in content.splitlines()], ['c'])
+
+    def test_invalid_filter(self):
+        """
+        Invalid filters are rejected
+        """
+        response = self.client.get(reverse('tasks:export_tasks'), {'status': 'foo'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_command(self):
+        """
+        export_tasks command writes the export to a file
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tasks.ndjson')
+            call_command('export_tasks', format='ndjson', status='open', output=path)
+            with open(path, encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f]
+
+        self.assertEqual([row['caption'] for row in rows], ['b'])
+
+
+# create_task tests
+class CreateTaskViewTests(TestCase):
+    def test_not_logged_user_create_task(self):
+        """
+        Not logged user cannot create tasks.
+        """
+        caption = 'a'
+        date = timezone.now()
+        self.client.post(reverse('tasks:create_task'), {'caption': caption, 'due_date': date})
+
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_logged_user_create_task(self):
+        """
+        Logged user can create tasks.
+        """
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        caption = 'a'
+        # date = timezone.now()
+        date = timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M')
+
+        self.client.post(reverse('tasks:create_task'), {'caption': caption, 'due_date': date})
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_native_date_picker(self):
+        """
+        Due date comes from the browser's own picker, in its format
+        """
+        create_user()
+        self.client.login(username='testuser', password='12345')
+        response = self.client.get(reverse('tasks:create_task'))
+        self.assertContains(response, 'type="datetime-local"')
+
+        self.client.post(reverse('tasks:create_task'), {'caption': 'a', 'due_date': '2030-05-01T18:30'})
+        task = Task.objects.get()
+        self.assertEqual(timezone.localtime(task.due_date).strftime('%d/%m/%Y %H:%M'), '01/05/2030 18:30')
+
+
+# bulk_create_task tests
+class BulkCreateTaskViewTests(TestCase):
+    def test_not_logged_user_bulk_create_task(self):
+        """
+        Not logged user cannot create tasks in bulk.
+        """
+        self.client.post(reverse('tasks:bulk_create_task'), {'tasks': 'a, 01/01/2030 10:00'})
+
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_logged_user_bulk_create_task(self):
+        """
+        Logged user creates one task per line.
+        """
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        self.client.post(reverse('tasks:bulk_create_task'),
+                         {'tasks': 'a, 01/01/2030 10:00\n\nb, 02/01/2030 11:30\n'})
+
+        self.assertQuerysetEqual(Task.objects.order_by('due_date'),
+                                 ['<Task: a by testuser>', '<Task: b by testuser>'])
+        task = Task.objects.get(caption='b')
+        self.assertEqual(timezone.localtime(task.due_date).strftime('%d/%m/%Y %H:%M'),
+                         '02/01/2030 11:30')
+
+    def test_invalid_line_creates_nothing(self):
+        """
+        A single invalid line is reported and no task is created.
+        """
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+
+        response = self.client.post(reverse('tasks:bulk_create_task'),
+                                    {'tasks': 'a, 01/01/2030 10:00\nb, tomorrow'})
+
+        self.assertContains(response, 'Line 2:')
+        self.assertEqual(Task.objects.count(), 0)
+
+
+# import_tasks command tests
+class ImportTasksCommandTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+
+    def import_file(self, name, content, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            out, err = io.StringIO(), io.StringIO()
+            call_command('import_tasks', path, giver='testuser', stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_csv(self):
+        """
+        CSV rows are imported in chunks, invalid rows are skipped and reported.
+        """
+        content = 'caption,due_date\na,01/01/2030 10:00\nb,bad date\nc,03/01/2030 10:00\n'
+        out, err = self.import_file('tasks.csv', content, chunk_size=1)
+
+        self.assertIn('Imported 2 tasks (1 invalid rows skipped)', out)
+        self.assertIn('Line 3:', err)
+        self.assertQuerysetEqual(Task.objects.order_by('due_date'),
+                                 ['<Task: a by testuser>', '<Task: c by testuser>'])
+
+    def test_import_ndjson(self):
+        """
+        NDJSON records are imported, malformed lines are skipped.
+        """
+        content = ('{"caption": "a", "due_date": "01/01/2030 10:00"}\n'
+                   'not json\n'
+                   '{"caption": "b", "due_date": "02/01/2030 10:00"}\n')
+        out, err = self.import_file('tasks.ndjson', content)
+
+        self.assertIn('Imported 2 tasks (1 invalid rows skipped)', out)
+        self.assertIn('Line 2: Malformed record.', err)
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_unknown_giver(self):
+        """
+        Import fails when the task giver does not exist.
+        """
+        with self.assertRaises(CommandError):
+            call_command('import_tasks', 'tasks.csv', giver='nobody')
+
+
+# async views tests
+@override_settings(ROOT_URLCONF='housechores.async_urls')
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.async_client.force_login(self.user)
+
+    def request(self, method, *args, **kwargs):
+        async def send():
+            return await getattr(self.async_client, method)(*args, **kwargs)
+        return async_to_sync(send)()
+
+    def get(self, url, **extra):
+        return self.request('get', url, **extra)
+
+    def post(self, url, data=None):
+        return self.request('post', url, urlencode(data or {}),
+                            content_type='application/x-www-form-urlencoded')
+
+    def test_async_views_routed(self):
+        """
+        ASGI URLconf serves coroutine views for the hot paths
+        """
+        for name, args in (('index', ()), ('complete_task', (1,)),
+                           ('delete_task', (1,)), ('create_task', ())):
+            func = resolve(reverse('tasks:' + name, args=args)).func
+            self.assertTrue(asyncio.iscoroutinefunction(func), name)
+
+    def test_middleware_not_adapted(self):
+        """
+        ASGI awaits every middleware, none is run in a thread by sync_to_async
+        """
+        with self.settings(PROFILING_DIR=tempfile.gettempdir()):
+            handler = ASGIHandler()
+        chain, get_response = [], handler._middleware_chain
+        while get_response is not None:
+            self.assertNotIsInstance(get_response, SyncToAsync, chain[-1:])
+            chain.append(get_response)
+            # convert_exception_to_response() wraps every middleware
+            get_response = getattr(get_response, '__wrapped__', None) or getattr(get_response, 'get_response', None)
+        middleware = [type(mw).__module__ + '.' + type(mw).__name__ for mw in chain
+                      if hasattr(mw, 'get_response') and not inspect.isfunction(mw)]
+        self.assertEqual(middleware, settings.MIDDLEWARE)
+
+    def test_export_streamed_off_the_loop(self):
+        """
+        ASGI export reads its rows in a worker thread and sends every one of them
+        """
+        for caption in 'abc':
+            create_task(caption, 'uncompleted')
+        cookie = '{}={}'.format(settings.SESSION_COOKIE_NAME,
+                                self.async_client.cookies[settings.SESSION_COOKIE_NAME].value)
+        with self.settings(PROFILING_DIR=tempfile.gettempdir()):
+            handler = StreamingASGIHandler()
+        sent = []
+
+        async def run():
+            received = asyncio.Queue()
+            await received.put({'type': 'http.request'})
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'http', 'method': 'GET', 'path': reverse('tasks:export_tasks'),
+                     'query_string': b'', 'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())]}
+            await handler(scope, received.get, send)
+
+        # as the test client does, keep the test's transaction open
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            async_to_sync(run)()
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        self.assertEqual(sent[0]['status'], 200)
+        lines = b''.join(message.get('body', b'') for message in sent[1:]).decode().splitlines()
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['a', 'b', 'c'])
+        self.assertFalse(sent[-1].get('more_body'))
+
+    def test_index(self):
+        """
+        Async index renders the board and answers unchanged polls with 304
+        """
+        create_task('a', 'uncompleted')
+        response = self.get(reverse('tasks:index'))
+        self.assertContains(response, 'Welcome testuser')
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: a by a>'])
+
+        # AsyncClient takes raw header names
+        response = self.get(reverse('tasks:index'), **{'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_complete_task(self):
+        """
+        Async complete_task completes uncompleted tasks only
+        """
+        task = create_task('a', 'uncompleted')
+        expired = create_task('b', 'expired')
+        self.post(reverse('tasks:complete_task', args=(task.id,)))
+        self.post(reverse('tasks:complete_task', args=(expired.id,)))
+
+        self.assertEqual(Task.objects.get(pk=task.id).task_done_by, self.user)
+        self.assertIsNone(Task.objects.get(pk=expired.id).task_done_by)
+
+    def test_delete_task(self):
+        """
+        Async delete_task deletes owned tasks only
+        """
+        owned = create_task('testuser', 'uncompleted')
+        other = create_task('a', 'uncompleted')
+        self.post(reverse('tasks:delete_task', args=(owned.id,)))
+        self.post(reverse('tasks:delete_task', args=(other.id,)))
+
+        self.assertQuerysetEqual(Task.objects.all(), ['<Task: a by a>'])
+
+    def test_create_task(self):
+        """
+        Async create_task shows the form and creates tasks
+        """
+        self.assertContains(self.get(reverse('tasks:create_task')), 'id_due_date')
+
+        date = timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M')
+        self.post(reverse('tasks:create_task'), {'caption': 'a', 'due_date': date})
+        self.assertQuerysetEqual(Task.objects.all(), ['<Task: a by testuser>'])
+
+    def test_not_logged_user(self):
+        """
+        Not logged user cannot use the async views
+        """
+        task = create_task('a', 'uncompleted')
+        self.async_client.logout()
+        self.post(reverse('tasks:complete_task', args=(task.id,)))
+        self.post(reverse('tasks:create_task'), {'caption': 'b', 'due_date': '01/01/2030 10:00'})
+
+        self.assertIsNone(Task.objects.get(pk=task.id).task_done_by)
+        self.assertEqual(Task.objects.count(), 1)
+
+
+# events are published on commit, which TestCase never does
+class TaskEventsTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.subscription = events.get_backend().subscribe()
+
+    def tearDown(self):
+        self.subscription.close()
+
+    def published(self):
+        return [(event['type'], event['ids']) for event in self.subscription.get(0)]
+
+    def test_task_changes_published(self):
+        """
+        Creating, completing and deleting tasks publishes an event each
+        """
+        task = create_task('a', 'uncompleted')
+        other = create_task('b', 'uncompleted')
+        Task.objects.complete(task.id, self.user)
+        Task.objects.complete_many([task.id, other.id], self.user)
+        task_id = task.id
+        task.delete()
+
+        self.assertEqual(self.published(), [
+            ('created', [task_id]), ('created', [other.id]), ('completed', [task_id]),
+            ('completed', [other.id]), ('deleted', [task_id])])
+
+    def test_nothing_published_on_rollback(self):
+        """
+        Changes rolled back are never published
+        """
+        with self.assertRaises(ValueError), transaction.atomic():
+            create_task('a', 'uncompleted')
+            raise ValueError
+        self.assertEqual(self.published(), [])
+
+    def test_slow_subscriber_told_to_reload(self):
+        """
+        Subscriber falling too far behind gets a single reload event
+        """
+        for i in range(events.MAX_PENDING + 1):
+            events.get_backend().publish({'type': 'created', 'ids': [i]})
+
+        chunks = list(events.stream(self.subscription))
+        self.assertEqual(len(chunks), 2)
+        self.assertIn('"type": "reload"', chunks[1])
+
+    def test_board_follows_events_over_asgi(self):
+        """
+        Board opens the event stream when served over ASGI, over WSGI only when enabled
+        """
+        self.client.force_login(self.user)
+        self.assertNotContains(self.client.get(reverse('tasks:index')), 'EventSource')
+        with self.settings(TASK_EVENTS_OVER_WSGI=True):
+            self.assertContains(self.client.get(reverse('tasks:index')), 'EventSource')
+
+        self.async_client.force_login(self.user)
+
+        async def get():
+            return await self.async_client.get(reverse('tasks:index'))
+        self.assertContains(async_to_sync(get)(), 'EventSource')
+
+    def test_task_rows(self):
+        """
+        Board refetches the rows of changed tasks, tasks gone since have none
+        """
+        self.client.force_login(self.user)
+        task = create_task('testuser', 'uncompleted')
+        other = create_task('a', 'uncompleted')
+        Task.objects.complete(task.id, self.user)
+        other_id = other.id
+        other.delete()
+
+        response = self.client.get(reverse('tasks:task_rows'), {'task_ids': [task.id, other_id]})
+        self.assertContains(response, '<tr data-task-id="{}">'.format(task.id))
+        self.assertContains(response, 'done by testuser')
+        self.assertContains(response, reverse('tasks:delete_task', args=(task.id,)))
+        self.assertNotContains(response, 'data-task-id="{}"'.format(other_id))
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('tasks:task_rows'), {'task_ids': task.id}).status_code, 403)
+
+    def test_not_logged_user(self):
+        """
+        Not logged user cannot open the event stream
+        """
+        with self.settings(TASK_EVENTS_OVER_WSGI=True):
+            response = self.client.get(reverse('tasks:task_events'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_no_event_stream_over_wsgi(self):
+        """
+        Event stream isn't served over WSGI unless enabled, it would hold a worker thread
+        """
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('tasks:task_events')).status_code, 404)
+
+    @override_settings(TASK_EVENTS_OVER_WSGI=True)
+    @mock.patch.object(events, 'HEARTBEAT', 0.01)
+    def test_event_stream(self):
+        """
+        Event stream sends published events and keep-alive comments
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('tasks:task_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = iter(response.streaming_content)
+        self.assertEqual(next(chunks), b'retry: 2000\n\n')
+
+        self.assertEqual(next(chunks), b': keep-alive\n\n')
+        create_task('a', 'uncompleted')
+        event = next(chunks).decode()
+        self.assertTrue(event.startswith('id: {}\n'.format(board_cache.get_version())))
+        self.assertIn('"type": "created"', event)
+        response.close()
+
+    def test_event_stream_middleware(self):
+        """
+        ASGI event stream is served on the event loop until the client disconnects
+        """
+        self.client.force_login(self.user)
+        cookie = '{}={}'.format(settings.SESSION_COOKIE_NAME,
+                                self.client.cookies[settings.SESSION_COOKIE_NAME].value)
+        sent = []
+
+        async def app(scope, receive, send):
+            raise AssertionError('event stream passed on to Django')
+
+        async def run():
+            received = asyncio.Queue()
+
+            async def send(message):
+                sent.append(message)
+                if len(sent) == 2:
+                    # the stream is open, publish from another thread
+                    await sync_to_async(events.get_backend().publish)({'type': 'created', 'ids': [1]})
+                elif len(sent) == 3:
+                    await received.put({'type': 'http.disconnect'})
+
+            scope = {'type': 'http', 'method': 'GET', 'path': reverse('tasks:task_events'),
+                     'query_string': b'', 'headers': [(b'cookie', cookie.encode())]}
+            await EventStreamMiddleware(app)(scope, received.get, send)
+
+        async_to_sync(run)()
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'Content-Type', b'text/event-stream'), sent[0]['headers'])
+        self.assertIn(b'"ids": [1]', sent[2]['body'])
+        self.assertEqual(len(sent), 3)
+
+
+# transactions are only begun outside of TestCase's own atomic block
+class DatabaseProfileTests(TransactionTestCase):
+    def test_pragmas_set(self):
+        """
+        Tuned SQLite profile sets its pragmas on every connection
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_transactions_begin_immediate(self):
+        """
+        Transactions take the write lock when they begin
+        """
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            Task.objects.count()
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+def replicate(*models):
+    """
+    Copy rows missing on the replica over from the primary database
+    """
+    for model in models:
+        model.objects.using('replica').bulk_create(
+            list(model.objects.using('default').all()), ignore_conflicts=True)
+
+
+# the replica is a database of its own, rows are copied to it by replicate()
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client.force_login(self.user)
+        replicate(User, Session)
+
+    def test_reads_from_replica(self):
+        """
+        Board is read from the replica, which may lag behind the primary
+        """
+        create_task('a', 'uncompleted')
+        response = self.client.get(reverse('tasks:index'))
+        self.assertQuerysetEqual(response.context['task_list'], [])
+
+        replicate(User, Task)
+        response = self.client.get(reverse('tasks:index'))
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: a by a>'])
+
+    def test_read_your_writes(self):
+        """
+        User reads from the primary for a while after writing
+        """
+        date = timezone.localtime(timezone.now() + datetime.timedelta(days=1)).strftime('%d/%m/%Y %H:%M')
+        response = self.client.post(reverse('tasks:create_task'), {'caption': 'a', 'due_date': date})
+        self.assertIn(COOKIE_NAME, response.cookies)
+
+        response = self.client.get(reverse('tasks:index'))
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: a by testuser>'])
+
+        self.client.cookies[COOKIE_NAME] = '0'
+        response = self.client.get(reverse('tasks:index'))
+        self.assertQuerysetEqual(response.context['task_list'], [])
+
+    def test_read_your_writes_async(self):
+        """
+        Middleware pins reads to the primary when awaited under ASGI too
+        """
+        self.async_client.force_login(self.user)
+        replicate(Session)
+
+        async def send(method, *args, **kwargs):
+            return await getattr(self.async_client, method)(*args, **kwargs)
+        date = timezone.localtime(timezone.now() + datetime.timedelta(days=1)).strftime('%d/%m/%Y %H:%M')
+        response = async_to_sync(send)('post', reverse('tasks:create_task'),
+                                       urlencode({'caption': 'a', 'due_date': date}),
+                                       content_type='application/x-www-form-urlencoded')
+        self.assertIn(COOKIE_NAME, response.cookies)
+
+        self.async_client.cookies[COOKIE_NAME] = response.cookies[COOKIE_NAME].value
+        response = async_to_sync(send)('get', reverse('tasks:index'))
+        self.assertQuerysetEqual(response.context['task_list'], ['<Task: a by testuser>'])
+
+    def test_writes_go_to_primary(self):
+        """
+        Completing a task writes to the primary only
+        """
+        task = create_task('a', 'uncompleted')
+        replicate(User, Task)
+        response = self.client.get(reverse('tasks:complete_task', args=(task.id,)))
+
+        self.assertIn(COOKIE_NAME, response.cookies)
+        self.assertEqual(Task.objects.using('default').get(pk=task.id).task_done_by, self.user)
+        self.assertIsNone(Task.objects.using('replica').get(pk=task.id).task_done_by)
+
+    def test_bulk_delete_writes_to_primary(self):
+        """
+        Deleting tasks outside of a request, e.g. when archiving, writes to the primary only
+        """
+        task = create_task('a', 'expired')
+        replicate(User, Task)
+        self.assertEqual(archiving.archive_batch(timezone.now()), 1)
+
+        self.assertFalse(Task.objects.using('default').exists())
+        self.assertTrue(ArchivedTask.objects.using('default').filter(pk=task.pk).exists())
+        self.assertTrue(TaskTombstone.objects.using('default').filter(task_id=task.pk).exists())
+        self.assertTrue(Task.objects.using('replica').filter(pk=task.pk).exists())
+        self.assertFalse(TaskTombstone.objects.using('replica').exists())
+
+    def test_tombstone_left_with_the_delete(self):
+        """
+        A task deleted from a given database leaves its tombstone in that database
+        """
+        task = create_task('a', 'expired')
+        replicate(User, Task)
+        Task.objects.using('replica').get(pk=task.pk).delete(using='replica')
+
+        self.assertTrue(TaskTombstone.objects.using('replica').filter(task_id=task.pk).exists())
+        self.assertFalse(TaskTombstone.objects.using('default').exists())
+
+    def test_stats_written_to_primary(self):
+        """
+        Completing tasks updates the stats in the primary, with the task, in or out of a request
+        """
+        tasks = [create_task('testuser', 'uncompleted') for i in range(3)]
+        replicate(User, Task, UserStats)
+
+        self.client.get(reverse('tasks:complete_task', args=(tasks[0].id,)))
+        self.assertEqual(Task.objects.complete_many([tasks[1].id], self.user), {tasks[1].id: RESULT_COMPLETED})
+        self.assertTrue(Task.objects.complete(tasks[2].id, self.user))
+        Task.objects.bulk_create([Task(caption='b', pub_date=timezone.now(), due_date=timezone.now(),
+                                       task_giver=self.user)])
+
+        primary = UserStats.objects.using('default').get(user=self.user)
+        self.assertEqual((primary.given, primary.completed), (4, 3))
+        replica = UserStats.objects.using('replica').get(user=self.user)
+        self.assertEqual((replica.given, replica.completed), (3, 0))
+
+    def test_no_conditional_get_while_replica_lags(self):
+        """
+        Board read from a replica gets no validators until the replica caught up
+        """
+        create_task('a', 'uncompleted')
+        replicate(User, Task)
+        response = self.client.get(reverse('tasks:index'))
+        self.assertFalse(response.has_header('ETag'))
+
+        with mock.patch('time.time', return_value=time.time() + settings.DATABASE_REPLICA_LAG):
+            response = self.client.get(reverse('tasks:index'))
+        self.assertTrue(response.has_header('ETag'))
+
+
+class BenchmarkingTests(TestCase):
+    def test_seed(self):
+        """
+        Seeding spreads tasks evenly over users and statuses
+        """
+        givers = benchmarking.seed(30, 3, chunk_size=7)
+        self.assertEqual(len(givers), 3)
+        for status in (STATUS_OPEN, STATUS_EXPIRED, STATUS_DONE):
+            self.assertEqual(Task.objects.filter_status(status).count(), 10)
+        self.assertEqual(Task.objects.filter(task_giver=givers[0]).count(), 10)
+
+    def test_percentile(self):
+        """
+        Percentiles use the nearest rank
+        """
+        values = list(range(100, 0, -1))
+        self.assertEqual(benchmarking.percentile(values, 50), 50)
+        self.assertEqual(benchmarking.percentile(values, 99), 99)
+        self.assertEqual(benchmarking.percentile([5], 99), 5)
+
+    def test_measure(self):
+        """
+        Measuring counts the queries of every request
+        """
+        create_user()
+        self.client.login(username='testuser', password='12345')
+        result = benchmarking.measure(lambda i: self.client.get(reverse('tasks:create_task')), 3)
+        self.assertEqual(result['requests'], 3)
+        self.assertEqual(result['max_queries'], 2)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def counter(self, name, *labels):
+        return metrics.collect()[0].get((name, labels), 0)
+
+    def test_request_metrics(self):
+        """
+        Requests are counted by URL name with their SQL queries
+        """
+        user = create_user()
+        self.client.force_login(user)
+        responses = self.counter('housechores_responses_total', ('view', 'tasks:index'), ('status', 200))
+        queries = self.counter('housechores_db_queries_total', ('view', 'tasks:index'))
+        misses = self.counter('housechores_cache_requests_total', ('cache', 'board'), ('result', 'miss'))
+        hits = self.counter('housechores_cache_requests_total', ('cache', 'board'), ('result', 'hit'))
+
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('tasks:index'))
+        self.client.get(reverse('tasks:index'))
+
+        self.assertEqual(self.counter('housechores_responses_total', ('view', 'tasks:index'),
+                                      ('status', 200)), responses + 2)
+        self.assertGreaterEqual(self.counter('housechores_db_queries_total', ('view', 'tasks:index')),
+                                queries + len(captured))
+        self.assertEqual(self.counter('housechores_cache_requests_total', ('cache', 'board'),
+                                      ('result', 'miss')), misses + 1)
+        self.assertEqual(self.counter('housechores_cache_requests_total', ('cache', 'board'),
+                                      ('result', 'hit')), hits + 1)
+
+    def test_async_request_metrics(self):
+        """
+        Requests served through ASGI count the queries their views run in a worker thread
+        """
+        self.async_client.force_login(create_user())
+        responses = self.counter('housechores_responses_total', ('view', 'tasks:index'), ('status', 200))
+        queries = self.counter('housechores_db_queries_total', ('view', 'tasks:index'))
+
+        async def get():
+            return await self.async_client.get(reverse('tasks:index'))
+        with CaptureQueriesContext(connection) as captured:
+            async_to_sync(get)()
+
+        self.assertEqual(self.counter('housechores_responses_total', ('view', 'tasks:index'),
+                                      ('status', 200)), responses + 1)
+        self.assertEqual(self.counter('housechores_db_queries_total', ('view', 'tasks:index')),
+                         queries + len(captured))
+
+    def test_threads_summed(self):
+        """
+        Metrics recorded by other threads are included
+        """
+        before = self.counter('housechores_cache_requests_total', ('cache', 'test'), ('result', 'hit'))
+        threads = [threading.Thread(target=metrics.count_cache, args=('test', 'hit')) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.counter('housechores_cache_requests_total', ('cache', 'test'),
+                                      ('result', 'hit')), before + 3)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_endpoint(self):
+        """
+        Metrics are served in the Prometheus text format to the holder of the token
+        """
+        self.client.get(reverse('accounts:login'))
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertContains(response, '# TYPE housechores_request_duration_seconds histogram')
+        self.assertContains(response, 'housechores_request_duration_seconds_bucket'
+                                      '{view="accounts:login",le="+Inf"}')
+
+        for authorization in ('', 'Bearer wrong', 'Basic s3cret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION=authorization)
+            self.assertEqual(response.status_code, 403)
+        # the address of a local proxy proves nothing
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_for_staff(self):
+        """
+        Staff read metrics without a token, nobody reads them with an empty one
+        """
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+        self.client.force_login(create_user(superuser=True))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.user = create_user(superuser=True)
+        self.client.force_login(self.user)
+
+    def test_profile_saved(self):
+        """
+        Staff request with the profile flag saves its profile, stacks and SQL
+        """
+        create_task('a', 'uncompleted')
+        with self.settings(PROFILING_DIR=self.directory):
+            response = self.client.get(reverse('tasks:index'), {'_profile': 1})
+        name = response['X-Profile']
+        self.assertIn('tasks_index', name)
+
+        path = os.path.join(self.directory, name)
+        functions = [name for filename, line, name in pstats.Stats(path + '.prof').stats]
+        self.assertIn('get_queryset', functions)
+        self.assertTrue(os.path.exists(path + '.collapsed'))
+        with open(path + '.sql') as file:
+            sql = file.read()
+        self.assertIn('FROM "tasks_task"', sql)
+        self.assertIn(' ms\n', sql)
+
+    def test_header_flag(self):
+        """
+        Profiling can be asked for with a header too
+        """
+        with self.settings(PROFILING_DIR=self.directory):
+            response = self.client.get(reverse('tasks:create_task'), HTTP_X_PROFILE='1')
+        self.assertTrue(response.has_header('X-Profile'))
+
+    def test_async_profile_saved(self):
+        """
+        Requests served through ASGI are profiled with the SQL their views run in a worker thread
+        """
+        create_task('a', 'uncompleted')
+        self.async_client.force_login(self.user)
+
+        async def get():
+            # AsyncClient takes raw header names
+            return await self.async_client.get(reverse('tasks:index'), **{'x-profile': '1'})
+        with self.settings(PROFILING_DIR=self.directory):
+            response = async_to_sync(get)()
+        name = response['X-Profile']
+        self.assertIn('tasks_index', name)
+        with open(os.path.join(self.directory, name + '.sql')) as file:
+            self.assertIn('FROM "tasks_task"', file.read())
+
+    def test_not_staff(self):
+        """
+        Requests of other users and unflagged requests are not profiled
+        """
+        with self.settings(PROFILING_DIR=self.directory):
+            response = self.client.get(reverse('tasks:index'))
+            self.assertFalse(response.has_header('X-Profile'))
+
+            self.client.force_login(get_user('other'))
+            response = self.client.get(reverse('tasks:index'), {'_profile': 1})
+            self.assertFalse(response.has_header('X-Profile'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+@override_settings(STATICFILES_STORAGE='housechores.staticfiles.CompressedManifestStaticFilesStorage',
+                   STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'])
+class StaticFilesTests(TestCase):
+    CSS = 'vendor/bootstrap/4.1.3/css/bootstrap.min.css'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        static_root = self.settings(STATIC_ROOT=self.directory)
+        static_root.enable()
+        self.addCleanup(static_root.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_no_third_party_assets(self):
+        """
+        Pages link the hashed copies of the vendored files, nothing from other hosts
+        """
+        create_user()
+        self.client.login(username='testuser', password='12345')
+        response = self.client.get(reverse('tasks:create_task'))
+        self.assertContains(response, staticfiles_storage.url(self.CSS))
+        self.assertRegex(staticfiles_storage.url(self.CSS), r'bootstrap\.min\.[0-9a-f]{12}\.css$')
+        self.assertNotRegex(response.content.decode(), r'(src|href)="(https?:)?//')
+
+    def test_precompressed(self):
+        """
+        collectstatic writes gzip and brotli versions of the hashed files
+        """
+        path = staticfiles_storage.path(staticfiles_storage.stored_name(self.CSS))
+        with open(path, 'rb') as file:
+            content = file.read()
+        with gzip.open(path + '.gz') as file:
+            self.assertEqual(file.read(), content)
+        if staticfiles.brotli is not None:
+            with open(path + '.br', 'rb') as file:
+                self.assertEqual(staticfiles.brotli.decompress(file.read()), content)
+
+    def test_serve_hashed(self):
+        """
+        Hashed files are cached for a year, in the best encoding the browser accepts
+        """
+        url = staticfiles_storage.url(self.CSS)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Cache-Control'], staticfiles.CACHE_FOREVER)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content))[:3], b'/*!')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_serve_unhashed(self):
+        """
+        Files under their original name are cached briefly, paths outside STATIC_ROOT are not served
+        """
+        response = self.client.get(settings.STATIC_URL + self.CSS)
+        self.assertEqual(response['Cache-Control'], staticfiles.CACHE_BRIEFLY)
+        response = self.client.get(settings.STATIC_URL + 'missing.css')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(settings.STATIC_URL + '../manage.py')
+        self.assertEqual(response.status_code, 400)
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client.login(username='testuser', password='12345')
+        for i in range(20):
+            create_task('user{}'.format(i), 'uncompleted')
+
+    def test_board_compressed(self):
+        """
+        Large pages are sent gzipped to browsers that accept it, with a weak ETag still revalidating
+        """
+        plain = self.client.get(reverse('tasks:index'), HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get(reverse('tasks:index'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content) / 3)
+        self.assertIn(b'<h1 class="mt-2">Welcome testuser</h1>', gzip.decompress(response.content))
+
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        response = self.client.get(reverse('tasks:index'), HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_async_compressed(self):
+        """
+        Pages served through ASGI are compressed too
+        """
+        self.async_client.force_login(self.user)
+
+        async def get():
+            # AsyncClient takes raw header names
+            return await self.async_client.get(reverse('tasks:index'), **{'accept-encoding': 'gzip'})
+        response = async_to_sync(get)()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'Welcome testuser', gzip.decompress(response.content))
+
+    @skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli_preferred(self):
+        """
+        Brotli is used when accepted, unless refused with q=0
+        """
+        response = self.client.get(reverse('tasks:index'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn(b'Welcome testuser', compression.brotli.decompress(response.content))
+
+        response = self.client.get(reverse('tasks:index'), HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_small_response_not_compressed(self):
+        """
+        Responses under COMPRESSION_MIN_SIZE are sent as they are
+        """
+        with self.settings(COMPRESSION_MIN_SIZE=10 ** 6):
+            response = self.client.get(reverse('tasks:index'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertContains(response, 'Welcome testuser')
+
+    def test_streaming_compressed(self):
+        """
+        Exports are compressed as they stream
+        """
+        response = self.client.get(reverse('tasks:export_tasks'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(len(content.splitlines()), 21)
+
+    def test_event_stream_not_compressed(self):
+        """
+        Event streams are passed through untouched
+        """
+        def get_response(request):
+            return StreamingHttpResponse(iter([b'data: {}\n\n']), content_type='text/event-stream')
+
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        response = compression.CompressionMiddleware(get_response)(request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), b'data: {}\n\n')
+
+
+class MinifyTests(TestCase):
+    def test_indentation_collapsed(self):
+        """
+        Whitespace across line breaks collapses to one line break, except in pre and textarea
+        """
+        source = '<ul>\n    <li>a</li> <li>b</li>\n\n    <script>\n  // c\n  d();\n</script>\n' \
+                 '<pre>\n  e\n</pre>  \n  <textarea>\n  f</textarea>\n</ul>\n'
+        self.assertEqual(minify(source), '<ul>\n<li>a</li> <li>b</li>\n<script>\n// c\nd();\n</script>\n'
+                                         '<pre>\n  e\n</pre>\n<textarea>\n  f</textarea>\n</ul>\n')
+
+    def test_templates_minified(self):
+        """
+        Our HTML templates are minified as they are loaded, other apps' are not
+        """
+        self.assertNotIn('\n ', get_template('tasks/index.html').template.source)
+        self.assertNotIn('\n ', get_template('tasks/task_rows.html').template.source)
+        self.assertIn('\n\n', get_template('registration/password_reset_email.html').template.source)
+
+
+# every view in tasks.views gets a query budget that holds however many tasks there are
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client.force_login(self.user)
+        self.add_tasks(6)
+
+    def add_tasks(self, count, status=None, username=None):
+        statuses = ('completed', 'uncompleted', 'expired')
+        return [create_task(username or 'user{}'.format(i % 4), status or statuses[i % 3])
+                for i in range(count)]
+
+    def test_full_scan_detected(self):
+        """
+        Full table scans fail the budget unless they are declared
+        """
+        with self.assertRaisesMessage(AssertionError, 'Full table scans'):
+            with self.assertQueryBudget(1):
+                list(Task.objects.filter(caption='a'))
+        with self.assertQueryBudget(1, scans=('tasks_task',)):
+            list(Task.objects.filter(caption='a'))
+        with self.assertRaisesMessage(AssertionError, 'Query budget of 1 exceeded by 1 queries'):
+            with self.assertQueryBudget(1):
+                list(Task.objects.filter(pk=1))
+                list(Task.objects.filter(pk=2))
+
+    def get_board(self, **params):
+        # nothing cached, so the board is queried every time
+        cache.clear()
+        return self.client.get(reverse('tasks:index'), params)
+
+    def test_index(self):
+        """
+        Board is rendered within its query budget
+        """
+        with self.assertQueryBudget(4):
+            self.get_board()
+        self.assertConstantQueries(self.get_board, lambda: self.add_tasks(30))
+
+    def test_index_search(self):
+        """
+        Search results are found through the full-text index, within the board's budget plus one
+        """
+        with self.assertQueryBudget(5):
+            self.get_board(q='user1')
+        self.assertConstantQueries(lambda: self.get_board(q='user1'), lambda: self.add_tasks(30))
+
+    def test_index_filtered(self):
+        """
+        Filtered boards are rendered within their query budget
+        """
+        for params in ({'status': STATUS_OPEN}, {'status': STATUS_EXPIRED}, {'status': STATUS_DONE},
+                       {'mine': 'created'}, {'mine': 'completed'}):
+            with self.assertQueryBudget(4):
+                self.get_board(**params)
+        self.assertConstantQueries(lambda: self.get_board(status=STATUS_DONE, mine='created'),
+                                   lambda: self.add_tasks(30, username='testuser'))
+
+    def test_index_poll(self):
+        """
+        Unchanged board is answered within its query budget
+        """
+        etag = self.client.get(reverse('tasks:index'))['ETag']
+        with self.assertQueryBudget(3):
+            response = self.client.get(reverse('tasks:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_complete_task(self):
+        """
+        Task is completed within its query budget
+        """
+        tasks = self.add_tasks(3, status='uncompleted')
+        with self.assertQueryBudget(4):
+            self.client.get(reverse('tasks:complete_task', args=(tasks.pop().id,)))
+        self.assertConstantQueries(
+            lambda: self.client.get(reverse('tasks:complete_task', args=(tasks.pop().id,))),
+            lambda: self.add_tasks(30))
+
+    def test_delete_task(self):
+        """
+        Task is deleted within its query budget
+        """
+        # done tasks take the most queries, their completions are uncounted too,
+        # and any reminder marker is dropped
+        tasks = self.add_tasks(3, status='completed', username='testuser')
+        with self.assertQueryBudget(8):
+            self.client.get(reverse('tasks:delete_task', args=(tasks.pop().id,)))
+        self.assertConstantQueries(
+            lambda: self.client.get(reverse('tasks:delete_task', args=(tasks.pop().id,))),
+            lambda: self.add_tasks(30))
+
+    def test_bulk_complete_task(self):
+        """
+        Tasks are completed in bulk within a budget independent of their number
+        """
+        def bulk_complete():
+            task_ids = Task.objects.filter_status(STATUS_OPEN).values_list('pk', flat=True)
+            return self.client.post(reverse('tasks:bulk_complete_task'), {'task_ids': list(task_ids)})
+
+        with self.assertQueryBudget(6):
+            bulk_complete()
+        self.add_tasks(2, status='uncompleted')
+        self.assertConstantQueries(bulk_complete, lambda: self.add_tasks(30, status='uncompleted'))
+
+    def test_bulk_delete_task(self):
+        """
+        Tasks are deleted in bulk within a budget independent of their number
+        """
+        def bulk_delete():
+            task_ids = Task.objects.filter(task_giver=self.user).values_list('pk', flat=True)
+            return self.client.post(reverse('tasks:bulk_delete_task'), {'task_ids': list(task_ids)})
+
+        self.add_tasks(2, username='testuser')
+        with self.assertQueryBudget(9):
+            bulk_delete()
+        self.add_tasks(2, username='testuser')
+        self.assertConstantQueries(bulk_delete, lambda: self.add_tasks(30, username='testuser'))
+
+    def test_task_changes(self):
+        """
+        Change feed page is read within its query budget
+        """
+        request = lambda: self.client.get(reverse('tasks:task_changes'), {'limit': 5})
+        with self.assertQueryBudget(4):
+            request()
+        self.assertConstantQueries(request, lambda: self.add_tasks(30))
+
+    def test_task_rows(self):
+        """
+        Changed rows are refetched within their query budget
+        """
+        task_ids = [task.id for task in Task.objects.all()[:3]]
+        request = lambda: self.client.get(reverse('tasks:task_rows'), {'task_ids': task_ids})
+        with self.assertQueryBudget(3):
+            request()
+
+    def test_task_events(self):
+        """
+        Event stream opens within its query budget
+        """
+        with self.settings(TASK_EVENTS_OVER_WSGI=True), self.assertQueryBudget(2):
+            self.client.get(reverse('tasks:task_events')).close()
+
+    def test_export_tasks(self):
+        """
+        Export streams every live and archived task within its query budget
+        """
+        def export():
+            return b''.join(self.client.get(reverse('tasks:export_tasks')).streaming_content)
+
+        with self.assertQueryBudget(4):
+            export()
+        self.assertConstantQueries(export, lambda: self.add_tasks(30))
+
+    def test_history(self):
+        """
+        History page is read within its query budget
+        """
+        def archive():
+            archiving.archive_batch(timezone.now(), batch_size=100)
+
+        archive()
+        with self.assertQueryBudget(3):
+            self.client.get(reverse('tasks:history'))
+        self.assertConstantQueries(lambda: self.client.get(reverse('tasks:history')),
+                                   lambda: (self.add_tasks(30, status='expired'), archive()))
+
+    def test_archive_batch(self):
+        """
+        A batch of any size is archived in a constant number of queries
+        """
+        self.add_tasks(30, status='expired')
+        with self.assertQueryBudget(6):
+            archiving.archive_batch(timezone.now(), batch_size=10)
+        self.assertConstantQueries(lambda: archiving.archive_batch(timezone.now(), batch_size=10),
+                                   lambda: self.add_tasks(30, status='expired'))
+
+    def test_send_reminders(self):
+        """
+        A batch of reminders of any size is sent in a constant number of queries
+        """
+        def add_due_soon():
+            for task in self.add_tasks(30, status='uncompleted'):
+                Task.objects.filter(pk=task.pk).update(due_date=timezone.now() + datetime.timedelta(hours=1))
+            User.objects.update(email='chores@example.com')
+
+        def send():
+            batches = reminders.send_reminders(batch_size=10)
+            next(batches)
+            batches.close()
+            TaskReminder.objects.all().delete()
+
+        add_due_soon()
+        with self.assertQueryBudget(7):
+            send()
+        self.assertConstantQueries(send, add_due_soon)
+
+    def test_leaderboard(self):
+        """
+        Leaderboard reads one row per user whatever the number of tasks
+        """
+        with self.assertQueryBudget(3):
+            self.client.get(reverse('tasks:leaderboard'))
+        self.assertConstantQueries(lambda: self.client.get(reverse('tasks:leaderboard')),
+                                   lambda: self.add_tasks(30))
+
+    def test_create_task(self):
+        """
+        Task form is shown and posted within its query budget
+        """
+        date = timezone.localtime(timezone.now() + datetime.timedelta(days=1)).strftime('%d/%m/%Y %H:%M')
+        with self.assertQueryBudget(2):
+            self.client.get(reverse('tasks:create_task'))
+        with self.assertQueryBudget(4):
+            self.client.post(reverse('tasks:create_task'), {'caption': 'a', 'due_date': date})
+
+    def test_bulk_create_task(self):
+        """
+        Tasks are added in bulk within a budget independent of their number
+        """
+        date = timezone.localtime(timezone.now() + datetime.timedelta(days=1)).strftime('%d/%m/%Y %H:%M')
+
+        def bulk_create(count):
+            lines = '\n'.join('task {},{}'.format(i, date) for i in range(count))
+            return lambda: self.client.post(reverse('tasks:bulk_create_task'), {'tasks': lines})
+
+        with self.assertQueryBudget(2):
+            self.client.get(reverse('tasks:bulk_create_task'))
+        request = bulk_create(2)
+        with self.assertQueryBudget(5):
+            request()
+        self.assertSameQueries(bulk_create(2), bulk_create(30))
+
+    def test_stop_repeating(self):
+        """
+        A chore stops repeating within a budget independent of its occurrences
+        """
+        def repeating():
+            self.client.post(reverse('tasks:create_task'),
+                             {'caption': 'Water plants', 'due_date': '2030-05-01T18:30', 'repeat': FREQUENCY_DAILY})
+            return Task.objects.latest('pk')
+
+        def stop(task):
+            return lambda: self.client.get(reverse('tasks:stop_repeating', args=(task.id,)))
+
+        request = stop(repeating())
+        with self.assertQueryBudget(7):
+            request()
+        small = repeating()
+        large = repeating()
+        Task.objects.bulk_create(Task(caption=large.caption, pub_date=large.pub_date, due_date=large.due_date,
+                                      task_giver=self.user, recurrence=large.recurrence) for i in range(30))
+        self.assertSameQueries(stop(small), stop(large))
+
+
+# Task model tests
+class TaskModelTests(TestCase):
+    def test_completed_task(self):
+        """
+        Completed task is not expired.
+        """
+        due_date = timezone.now() - datetime.timedelta(days=10)
+        task = Task.objects.create(caption='a', pub_date=timezone.now(),
+                                   due_date=due_date, task_giver=get_user('a'),
+                                   task_done_by=get_user('a'), task_done_date=timezone.now())
+        self.assertIs(task.is_expired(), False)
+
+        due_date = timezone.now() + datetime.timedelta(days=10)
+        task = Task.objects.create(caption='a', pub_date=timezone.now(),
+                                   due_date=due_date, task_giver=get_user('a'),
+                                   task_done_by=get_user('a'), task_done_date=timezone.now())
+        self.assertIs(task.is_expired(), False)
+
+        due_date = timezone.now()
+        task = Task.objects.create(caption='a', pub_date=timezone.now(),
+                                   due_date=due_date, task_giver=get_user('a'),
+                                   task_done_by=get_user('a'), task_done_date=timezone.now())
+        self.assertIs(task.is_expired(), False)
+
+    def test_due_date_after_now(self):
+        """
+        Task with 'due_date' after 'timezone.now()' is not expired
+        """
+        due_date = timezone.now() + datetime.timedelta(days=10)
+        task = Task.objects.create(caption='a', pub_date=timezone.now(),
+                                   due_date=due_date, task_giver=get_user('a'))
+        self.assertIs(task.is_expired(), False)
+
+    def test_due_date_before_now(self):
+        """
+        Task with 'due_date' before 'timezone.now()' is expired
+        """
+        due_date = timezone.now() - datetime.timedelta(days=10)
+        task = Task.objects.create(caption='a', pub_date=timezone.now(),
+                                   due_date=due_date, task_giver=get_user('a'))
+        self.assertIs(task.is_expired(), True)
+
+    def test_due_date_is_now(self):
+        """
+        Task with 'due_date' equal to 'timezone.now()' is expired
+        """
+        task = Task.objects.create(caption='a', pub_date=timezone.now(),
+                                   due_date=timezone.now(), task_giver=get_user('a'))
+        self.assertIs(task.is_expired(), True)
+
+    def test_status_matches_is_expired(self):
+        """
+        Status annotation agrees with 'is_expired' for every kind of task
+        """
+        for status in ('completed', 'uncompleted', 'expired'):
+            create_task(status, status)
+
+        for task in Task.objects.with_status():
+            self.assertEqual(task.status == STATUS_EXPIRED, task.is_expired())
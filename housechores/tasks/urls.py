@@ -6,5 +6,15 @@ urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
     path('<int:task_id>/complete_task/', views.complete_task, name='complete_task'),
     path('<int:task_id>/delete_task/', views.delete_task, name='delete_task'),
+    path('<int:task_id>/stop_repeating/', views.stop_repeating, name='stop_repeating'),
+    path('bulk_complete_task/', views.bulk_complete_task, name='bulk_complete_task'),
+    path('bulk_delete_task/', views.bulk_delete_task, name='bulk_delete_task'),
     path('create_task/', views.create_task, name='create_task'),
+    path('bulk_create_task/', views.bulk_create_task, name='bulk_create_task'),
+    path('api/changes/', views.task_changes, name='task_changes'),
+    path('rows/', views.task_rows, name='task_rows'),
+    path('events/', views.task_events, name='task_events'),
+    path('export/', views.export_tasks, name='export_tasks'),
+    path('history/', views.history, name='history'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
 ]
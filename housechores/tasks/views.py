@@ -1,35 +1,239 @@
+import hashlib
+import math
+import re
+import time
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.contrib import messages
 from django.views import generic
-from .models import Task
+from .models import (ArchivedTask, RecurrenceRule, Task, STATUSES, STATUS_OPEN, STATUS_EXPIRED,
+                     RESULT_COMPLETED, RESULT_DELETED)
+from .cache import BOARD_TIMEOUT, get_or_build, get_version, get_changed_at
+from django.db import transaction
 from django.utils import timezone
-from django.http import HttpResponseRedirect
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (HttpResponse, HttpResponseRedirect, HttpResponseBadRequest, HttpResponseForbidden,
+                         Http404, JsonResponse, StreamingHttpResponse)
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_POST, condition
+from django.middleware.csrf import get_token
 from django.urls import reverse, reverse_lazy
-from .forms import CreateTaskForm
-import pytz
+from .forms import CreateTaskForm, BulkCreateTaskForm, ExportTasksForm
+from .exporting import export_rows, stream_export, CONTENT_TYPES
+from .importing import read_rows, clean_rows, create_tasks, format_error
+from .pagination import paginate
+from .search import SEARCH_LIMIT, search
+from .stats import leaderboard as top_stats
+from .sync import changes_since, CHANGES_LIMIT, MAX_CHANGES_LIMIT
+from . import events
+from housechores.routers import reads_from_replica
+
+# most tasks a single bulk request may touch, keeps the IN (...) list bounded
+BULK_LIMIT = 500
+
+HISTORY_PAGE_SIZE = 50
+
+DELETE_PLACEHOLDER = re.compile(r'<!--delete:(\d+):(\d+)(?::([01]))?-->')
+
+
+def replica_lag_left():
+    # seconds a replica read may still miss the latest change to tasks
+    changed_at = get_changed_at()
+    if not reads_from_replica() or changed_at is None:
+        return 0
+    return max(settings.DATABASE_REPLICA_LAG - (time.time() - changed_at.timestamp()), 0)
+
+
+def board_state(request):
+    """
+    Return a cheap snapshot of everything the board depends on, or None.
+
+    Any write bumps the cached table version; the only change without a write
+    is an open task expiring, caught by the due date of the latest expired
+    task (one seek on the pending tasks index). None disables conditional
+    responses, e.g. while a flash message is waiting to be shown or while
+    the replica may still be catching up with the latest change.
+    """
+    if not hasattr(request, '_board_state'):
+        request._board_state = None
+        if request.user.is_authenticated and not len(messages.get_messages(request)) \
+                and not replica_lag_left():
+            last_expired = (Task.objects.filter_status(STATUS_EXPIRED)
+                            .order_by('-due_date').values_list('due_date', flat=True).first())
+            request._board_state = (get_version(), get_changed_at(), last_expired)
+    return request._board_state
+
+
+def board_etag(request, *args, **kwargs):
+    state = board_state(request)
+    if state is None:
+        return None
+    version, changed_at, last_expired = state
+    user = request.user
+    # the board's forms carry the CSRF token, which login rotates along with
+    # the session, so a page from before can't be revalidated after; the
+    # secret is made now on a first visit, so the page is rendered with it
+    get_token(request)
+    validator = (version, last_expired, user.pk, user.username, user.is_superuser,
+                 request.get_full_path(), live_updates(request),
+                 request.session.session_key, request.META['CSRF_COOKIE'])
+    return hashlib.md5(repr(validator).encode()).hexdigest()
+
+
+def board_last_modified(request, *args, **kwargs):
+    state = board_state(request)
+    if state is None or state[1] is None:
+        return None
+    version, changed_at, last_expired = state
+    return max(changed_at, last_expired) if last_expired else changed_at
+
+
+def live_updates(request):
+    # an open event stream holds a WSGI worker thread for STREAM_DURATION,
+    # the board only opens one when served over ASGI unless told otherwise
+    return isinstance(request, ASGIRequest) or getattr(settings, 'TASK_EVENTS_OVER_WSGI', False)
 
 
 # Create your views here.
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(condition(etag_func=board_etag, last_modified_func=board_last_modified),
+                  name='dispatch')
 class IndexView(generic.ListView):
     template_name = 'tasks/index.html'
+    context_object_name = 'task_list'
+    page_size = 50
 
     def get_queryset(self):
-        return Task.objects.order_by('due_date')
+        # status is computed in SQL against one `now` shared by the whole page
+        now = timezone.now()
+        self.status = self.request.GET.get('status')
+        if self.status not in STATUSES:
+            self.status = None
+        queryset = Task.objects.filter_status(self.status, now)
 
+        # tasks created or completed by the current user, both indexed foreign keys
+        self.mine = self.request.GET.get('mine')
+        if self.mine == 'created' and self.request.user.is_authenticated:
+            queryset = queryset.filter(task_giver=self.request.user)
+        elif self.mine == 'completed' and self.request.user.is_authenticated:
+            queryset = queryset.filter(task_done_by=self.request.user)
+        else:
+            self.mine = None
 
-def complete_task(request, task_id):
-    try:
-        task = Task.objects.get(pk=task_id)
-    except Task.DoesNotExist:
+        # full-text search, ranked instead of ordered by due date
+        self.query = self.request.GET.get('q', '').strip()
+
+        # users are joined in so the whole page is still a single query
+        return (queryset.select_related('task_giver', 'task_done_by')
+                .with_status(now).order_by('due_date', 'id'))
+
+    def get_context_data(self, **kwargs):
+        kwargs['status'] = self.status
+        kwargs['mine'] = self.mine
+        kwargs['query'] = self.query
+        kwargs['statuses'] = STATUSES
+        kwargs['live_updates'] = live_updates(self.request)
+        if not self.request.user.is_authenticated:
+            return super().get_context_data(object_list=[], **kwargs)
+
+        # the rendered rows are shared by every user looking at the same page,
+        # only the delete buttons are filled in per user
+        page, rows = get_or_build(self.get_board_key(), self.build_board, name='board')
+        kwargs['page'] = page
+        kwargs['task_rows'] = fill_delete_cells(rows, self.request.user)
+        return super().get_context_data(object_list=page.object_list, **kwargs)
+
+    def get_board_key(self):
+        # cached boards are invalidated by bumping the task table version,
+        # boards read from a replica are kept apart from the primary's
+        mine_user = self.request.user.pk if self.mine else None
+        params = (reads_from_replica(), self.status, self.mine, mine_user,
+                  self.request.GET.get('after'), self.request.GET.get('before'),
+                  self.query, self.get_search_page())
+        digest = hashlib.md5(repr(params).encode()).hexdigest()
+        return 'tasks:board:{}:{}'.format(get_version(), digest)
+
+    def get_search_page(self):
+        # numbered pages of search results, as far as SEARCH_LIMIT reaches
+        try:
+            number = int(self.request.GET.get('page', 1))
+        except ValueError:
+            return 1
+        return min(max(number, 1), math.ceil(SEARCH_LIMIT / self.page_size))
+
+    def build_board(self):
+        # show a single page instead of the whole table, a keyset page or one of search results
+        if self.query:
+            page = search(self.object_list, self.query, self.page_size, self.get_search_page())
+        else:
+            page = paginate(self.object_list, self.page_size,
+                            after=self.request.GET.get('after'),
+                            before=self.request.GET.get('before'))
+        rows = render_to_string('tasks/task_rows.html', {'task_list': page.object_list})
+
+        # open tasks turn into expired ones without any write, keep the board
+        # only until the first task on it expires
+        timeout = BOARD_TIMEOUT
+        now = timezone.now()
+        for task in page.object_list:
+            if task.status == STATUS_OPEN:
+                timeout = min(timeout, (task.due_date - now).total_seconds())
+
+        # a board read from a lagging replica is kept only until it caught up
+        lag_left = replica_lag_left()
+        if lag_left:
+            timeout = min(timeout, lag_left)
+        return (page, rows), timeout
+
+
+def fill_delete_cells(rows, user):
+    return mark_safe(DELETE_PLACEHOLDER.sub(lambda match: delete_cell(match, user), rows))
+
+
+def delete_cell(match, user):
+    task_id, task_giver_id, repeats = int(match.group(1)), int(match.group(2)), match.group(3) == '1'
+    if user.is_superuser or task_giver_id == user.pk:
+        cell = '<a href="{}" class="btn btn-danger my-2">Delete</a>'.format(
+            reverse('tasks:delete_task', args=(task_id,)))
+        if repeats:
+            cell += ' <a href="{}" class="btn btn-outline-secondary my-2">Stop repeating</a>'.format(
+                reverse('tasks:stop_repeating', args=(task_id,)))
+        return '<td>{}</td>'.format(cell)
+    return '<td><a  class="btn btn-secondary my-2">Delete</a></td>'
+
+
+def history(request):
+    # redirect to index when user is not logged in
+    if not request.user.is_authenticated:
         return HttpResponseRedirect(reverse('tasks:index'))
 
-    # redirect to index when task can't be completed
-    if task.task_done_by or not request.user.is_authenticated or task.is_expired():
+    # archived tasks, latest first; read-only, they can't be completed or deleted
+    page = paginate(ArchivedTask.objects.select_related('task_giver', 'task_done_by'),
+                    HISTORY_PAGE_SIZE, after=request.GET.get('after'),
+                    before=request.GET.get('before'), descending=True)
+    return render(request, 'tasks/history.html', {'page': page, 'task_list': page.object_list})
+
+
+def leaderboard(request):
+    # redirect to index when user is not logged in
+    if not request.user.is_authenticated:
+        return HttpResponseRedirect(reverse('tasks:index'))
+
+    # the precomputed rows of the users who completed most chores, no task is counted
+    return render(request, 'tasks/leaderboard.html', {'stats_list': top_stats()})
+
+
+def complete_task(request, task_id):
+    # redirect to index when user is not logged in
+    if not request.user.is_authenticated:
         return HttpResponseRedirect(reverse('tasks:index'))
 
-    # mark task as completed and redirect to index
-    task.task_done_by = request.user.username
-    task.task_done_date = timezone.now()
-    task.save()
+    # mark task as completed; missing, completed and expired tasks are not claimed
+    if not Task.objects.complete(task_id, request.user):
+        messages.warning(request, 'This task can no longer be completed.')
 
     return HttpResponseRedirect(reverse('tasks:index'))
 
@@ -39,7 +243,7 @@ def delete_task(request, task_id):
 
     # redirect to index when user is not logged in or user does not own this task
     if not request.user.is_authenticated or \
-            (not request.user.is_superuser and task.task_giver != request.user.username):
+            (not request.user.is_superuser and task.task_giver_id != request.user.pk):
         return HttpResponseRedirect(reverse('tasks:index'))
 
     # delete task
@@ -48,6 +252,155 @@ def delete_task(request, task_id):
     return HttpResponseRedirect(reverse('tasks:index'))
 
 
+def stop_repeating(request, task_id):
+    task = get_object_or_404(Task, pk=task_id)
+
+    # redirect to index when user is not logged in or user does not own this task
+    if not request.user.is_authenticated or \
+            (not request.user.is_superuser and task.task_giver_id != request.user.pk):
+        return HttpResponseRedirect(reverse('tasks:index'))
+
+    # the rule goes, the occurrences created so far stay as one-off tasks
+    if task.recurrence_id is not None:
+        with transaction.atomic():
+            Task.objects.filter(recurrence_id=task.recurrence_id).update(recurrence=None)
+            RecurrenceRule.objects.filter(pk=task.recurrence_id).delete()
+        messages.info(request, '{} no longer repeats.'.format(task.caption))
+
+    return HttpResponseRedirect(reverse('tasks:index'))
+
+
+def _bulk_task_ids(request, data=None):
+    # unique integer ids posted as `task_ids`, or None when there are too many
+    task_ids = []
+    for value in (request.POST if data is None else data).getlist('task_ids'):
+        try:
+            task_id = int(value)
+        except ValueError:
+            continue
+        if task_id not in task_ids:
+            task_ids.append(task_id)
+    if len(task_ids) > BULK_LIMIT:
+        return None
+    return task_ids
+
+
+def _bulk_response(request, results, done_result, done_message):
+    # JSON clients get per-id results, browsers get a summary on the index page
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({'results': {str(pk): result for pk, result in results.items()}})
+
+    done = sum(1 for result in results.values() if result == done_result)
+    messages.info(request, done_message.format(done, len(results)))
+    return HttpResponseRedirect(reverse('tasks:index'))
+
+
+@require_POST
+def bulk_complete_task(request):
+    # redirect to index when user is not logged in
+    if not request.user.is_authenticated:
+        return HttpResponseRedirect(reverse('tasks:index'))
+
+    task_ids = _bulk_task_ids(request)
+    if task_ids is None:
+        return HttpResponseBadRequest('Too many tasks selected.')
+
+    results = Task.objects.complete_many(task_ids, request.user)
+    return _bulk_response(request, results, RESULT_COMPLETED, 'Completed {} of {} tasks.')
+
+
+@require_POST
+def bulk_delete_task(request):
+    # redirect to index when user is not logged in
+    if not request.user.is_authenticated:
+        return HttpResponseRedirect(reverse('tasks:index'))
+
+    task_ids = _bulk_task_ids(request)
+    if task_ids is None:
+        return HttpResponseBadRequest('Too many tasks selected.')
+
+    results = Task.objects.delete_many(task_ids, request.user)
+    return _bulk_response(request, results, RESULT_DELETED, 'Deleted {} of {} tasks.')
+
+
+def task_changes(request):
+    # JSON only, so no redirect to the login page
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=403)
+
+    try:
+        limit = min(int(request.GET.get('limit', CHANGES_LIMIT)), MAX_CHANGES_LIMIT)
+    except ValueError:
+        limit = CHANGES_LIMIT
+    return JsonResponse(changes_since(request.GET.get('cursor'), max(limit, 1)))
+
+
+def task_rows(request):
+    # the board refetches the rows of tasks changed since it was rendered,
+    # a task gone since then has no row
+    if not request.user.is_authenticated:
+        return HttpResponseForbidden()
+
+    task_ids = _bulk_task_ids(request, request.GET)
+    if task_ids is None:
+        return HttpResponseBadRequest('Too many tasks selected.')
+    now = timezone.now()
+    tasks = (Task.objects.filter(pk__in=task_ids).select_related('task_giver', 'task_done_by')
+             .with_status(now).order_by('due_date', 'id'))
+    rows = render_to_string('tasks/task_rows.html', {'task_list': tasks})
+    return HttpResponse(fill_delete_cells(rows, request.user))
+
+
+def event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx would otherwise buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def task_events(request):
+    # a WSGI deployment doesn't stream unless told to, a few open boards
+    # would take up every worker thread
+    if not live_updates(request):
+        raise Http404('Live updates are served over ASGI.')
+
+    # EventSource can't follow a redirect to the login page
+    if not request.user.is_authenticated:
+        return HttpResponseForbidden()
+
+    # subscribe before responding so no event is missed, the stream holds
+    # this worker thread until the client goes away or the stream times out
+    return event_stream_response(events.stream(events.get_backend().subscribe()))
+
+
+def export_tasks(request):
+    # redirect to index if user is not logged in
+    if not request.user.is_authenticated:
+        return HttpResponseRedirect(reverse('tasks:index'))
+
+    form = ExportTasksForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+
+    format = form.cleaned_data['format'] or 'csv'
+    rows = export_rows(form.cleaned_data['status'] or None,
+                       form.cleaned_data['since'], form.cleaned_data['until'])
+    response = StreamingHttpResponse(stream_export(rows, format),
+                                     content_type=CONTENT_TYPES[format])
+    response['Content-Disposition'] = 'attachment; filename="tasks.{}"'.format(format)
+    return response
+
+
+def save_task(task, repeat=None):
+    # a repeating task is saved with its rule or not at all; later
+    # occurrences are created by `manage.py schedule_recurring`
+    with transaction.atomic():
+        if repeat:
+            task.recurrence = RecurrenceRule.start(task, repeat)
+        task.save()
+
+
 def create_task(request):
     # redirect to index if user is not logged in
     if not request.user.is_authenticated:
@@ -56,23 +409,44 @@ def create_task(request):
     if request.method == 'POST':
         form = CreateTaskForm(request.POST)
         if form.is_valid():
-            # create convenient format for date
-            date, time = request.POST['due_date'].split(' ')
-            day, month, year = date.split('/')
-            hour, minute = time.split(':')
-
-            # create new task
+            # create new task from the validated form data
             task = Task()
-            task.caption = request.POST['caption']
+            task.caption = form.cleaned_data['caption']
             task.pub_date = timezone.now()
-            task.due_date = timezone.datetime(year=int(year), month=int(month),
-                                              day=int(day), hour=int(hour),
-                                              minute=int(minute),
-                                              tzinfo=pytz.timezone('Europe/Warsaw'))
-            task.task_giver = request.user.username
+            task.due_date = form.cleaned_data['due_date']
+            task.task_giver = request.user
 
-            task.save()
+            save_task(task, form.cleaned_data['repeat'])
             return HttpResponseRedirect(reverse('tasks:index'))
 
     form = CreateTaskForm()
     return render(request, 'tasks/create_task.html', {'form': form})
+
+
+def bulk_create_task(request):
+    # redirect to index if user is not logged in
+    if not request.user.is_authenticated:
+        return HttpResponseRedirect(reverse('tasks:index'))
+
+    if request.method == 'POST':
+        form = BulkCreateTaskForm(request.POST)
+        if form.is_valid():
+            # validate every line before anything is inserted
+            errors = []
+            rows = read_rows(form.cleaned_data['tasks'].splitlines(), 'csv',
+                             fieldnames=('caption', 'due_date'))
+            cleaned_rows = list(clean_rows(
+                rows, on_error=lambda line_num, line_errors: errors.append(
+                    format_error(line_num, line_errors))))
+
+            if errors:
+                for error in errors:
+                    form.add_error('tasks', error)
+            else:
+                created = create_tasks(cleaned_rows, request.user)
+                messages.info(request, 'Added {} tasks.'.format(created))
+                return HttpResponseRedirect(reverse('tasks:index'))
+    else:
+        form = BulkCreateTaskForm()
+
+    return render(request, 'tasks/bulk_create_task.html', {'form': form})